@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=no-name-in-module, missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# ios_cfgのアクションプラグイン
+#
+# defer: trueのときはモジュールを実行せず、linesをホストのファクトに溜めておく
+# flush: trueのときは溜めておいたlinesとこのタスクのlinesをまとめて、一度のload_configで流し込む
+#
+# ansibleはタスクごとにワーカープロセスをforkするので、コントローラのメモリには溜めておけない
+# ファクトに入れておけばホストごとに分かれて、タスクをまたいで引き継がれる
+#
+
+from ansible.module_utils.six import string_types
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.plugins.action.normal import ActionModule as _ActionModule
+
+try:
+  # pylint: disable=unused-import
+  from __main__ import display
+except ImportError:
+  # pylint: disable=ungrouped-imports
+  from ansible.utils.display import Display
+  display = Display()
+
+# linesを溜めておくファクトの名前
+QUEUE_FACT = 'iida_local_ios_cfg_queue'
+
+# サブモードに入るコマンド
+CONTEXT_PREFIXES = (
+  'interface ',
+  'vlan ',
+  'ip access-list ',
+  'ipv6 access-list ',
+  'router ',
+  'line ',
+  'ip vrf ',
+  'vrf definition ',
+  'class-map ',
+  'policy-map ',
+  'route-map ',
+  'key chain '
+)
+
+
+class ActionModule(_ActionModule):
+
+  @staticmethod
+  def is_context(line):
+    return line.startswith(CONTEXT_PREFIXES)
+
+
+  @classmethod
+  def coalesce(cls, lines):
+    """連結したlinesから、同じサブモードに入り直すだけの行を取り除く
+
+    interface X / ... / exit / interface X / ... は、exitと2回目のinterface Xを取り除いてつなげる
+    interface X / interface X のように同じ行が続く場合は2回目を取り除く
+    """
+    result = []
+    context = None
+    for line in lines:
+      if cls.is_context(line):
+        if line == context and result and result[-1] == 'exit':
+          result.pop()
+          continue
+        if result and result[-1] == line:
+          continue
+        context = line
+      elif line != 'exit':
+        # exitの直後にサブモード以外のコマンドが来たら、その後のinterface Xは入り直す必要がある
+        if result and result[-1] == 'exit':
+          context = None
+      result.append(line)
+    return result
+
+
+  @staticmethod
+  def get_queue(task_vars):
+    task_vars = task_vars or {}
+    queue = task_vars.get('ansible_facts', {}).get(QUEUE_FACT)
+    if queue is None:
+      queue = task_vars.get(QUEUE_FACT)
+    return list(queue or [])
+
+
+  def run(self, tmp=None, task_vars=None):
+    del tmp  # tmp no longer has any effect
+
+    defer = boolean(self._task.args.get('defer', False), strict=False)
+    flush = boolean(self._task.args.get('flush', False), strict=False)
+    if defer and flush:
+      return dict(failed=True, msg='parameters are mutually exclusive: defer|flush')
+
+    lines = self._task.args.get('lines')
+    if lines is None:
+      lines = self._task.args.get('commands')
+    if isinstance(lines, string_types):
+      lines = [lines]
+    lines = list(lines or [])
+
+    queue = self.get_queue(task_vars)
+
+    # モジュールを実行せずにlinesを溜めておく
+    if defer:
+      queue.extend(lines)
+      return dict(
+        changed=False,
+        commands=lines,
+        queued=len(queue),
+        ansible_facts={QUEUE_FACT: queue})
+
+    if not flush:
+      return super(ActionModule, self).run(task_vars=task_vars)
+
+    # 溜めておいたlinesとこのタスクのlinesをまとめて、一度だけモジュールを実行する
+    merged = self.coalesce(queue + lines)
+    self._task.args.pop('commands', None)
+    self._task.args['lines'] = merged
+
+    result = super(ActionModule, self).run(task_vars=task_vars)
+    if result.get('failed'):
+      return result
+
+    result['queued'] = len(queue)
+    result['ansible_facts'] = {QUEUE_FACT: []}
+    return result
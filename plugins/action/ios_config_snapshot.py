@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=no-name-in-module, missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+
+from collections import OrderedDict
+
+from ansible.module_utils.six.moves.urllib.parse import urlsplit
+from ansible.plugins.action.normal import ActionModule as _ActionModule
+from ansible.module_utils._text import to_text
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible_collections.iida.local.plugins.module_utils.lazy_have import materialize
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import PARSE_CACHE, get_have_list
+from ansible_collections.iida.local.plugins.module_utils.path_loader import read_raw
+from ansible_collections.iida.local.plugins.module_utils.snapshot import SnapshotError, config_digest, dump_snapshot, load_snapshot
+from ansible_collections.iida.local.plugins.module_utils.template_cache import render_template
+from ansible_collections.iida.local.plugins.module_utils.validation import validate_args
+from ansible_collections.iida.local.plugins.modules.ios_config_snapshot import get_module_spec
+from ansible_collections.iida.local.plugins.action.ios_hsrp import ActionModule as HsrpAction
+from ansible_collections.iida.local.plugins.action.ios_interface import ActionModule as InterfaceAction
+from ansible_collections.iida.local.plugins.action.ios_interface_address import ActionModule as InterfaceAddressAction
+from ansible_collections.iida.local.plugins.action.ios_interface_trunk import ActionModule as InterfaceTrunkAction
+from ansible_collections.iida.local.plugins.action.ios_linkagg import ActionModule as LinkaggAction
+from ansible_collections.iida.local.plugins.action.ios_static_route import ActionModule as StaticRouteAction
+from ansible_collections.iida.local.plugins.action.ios_vlan import ActionModule as VlanAction
+
+try:
+  # pylint: disable=unused-import
+  from __main__ import display
+except ImportError:
+  # pylint: disable=ungrouped-imports
+  from ansible.utils.display import Display
+  display = Display()
+
+
+class ActionModule(_ActionModule):
+
+  # リソース名 -> そのリソースのアクションプラグイン
+  RESOURCES = OrderedDict([
+    ('ios_hsrp', HsrpAction),
+    ('ios_interface', InterfaceAction),
+    ('ios_interface_address', InterfaceAddressAction),
+    ('ios_interface_trunk', InterfaceTrunkAction),
+    ('ios_linkagg', LinkaggAction),
+    ('ios_static_route', StaticRouteAction),
+    ('ios_vlan', VlanAction)
+  ])
+
+
+  def resource_action(self, name):
+    # map_config_to_obj()を呼ぶためだけに、同じタスクの情報でリソースのアクションプラグインを作る
+    action_class = self.RESOURCES[name]
+    return action_class(
+      self._task, self._connection, self._play_context, self._loader, self._templar, self._shared_loader_obj)
+
+
+  @staticmethod
+  def is_up_to_date(path, digest, versions):
+    # 同じコンフィグ、同じパーサーのバージョンで作ったスナップショットがあれば作り直さない
+    if not os.path.exists(path):
+      return False
+    try:
+      snapshot = load_snapshot(path)
+    except SnapshotError:
+      return False
+    if snapshot.get('config_digest') != digest:
+      return False
+    have = snapshot.get('have', {})
+    if set(have) != set(versions):
+      return False
+    for name, version in versions.items():
+      if have[name][0] != version:
+        return False
+    return True
+
+
+  def _handle_template(self, key_path):
+    # pylint: disable=W0212
+    if not self._task.args.get(key_path):
+      return
+
+    src = self._task.args.get(key_path)
+
+    working_path = self._loader.get_basedir()
+    if self._task._role is not None:
+      working_path = self._task._role._role_path
+
+    if os.path.isabs(src) or urlsplit('src').scheme:
+      source = src
+    else:
+      source = self._loader.path_dwim_relative(working_path, 'templates', src)
+      if not source:
+        source = self._loader.path_dwim_relative(working_path, src)
+
+    if not os.path.exists(source):
+      raise ValueError('path specified in src not found')
+
+    # template: falseのときはJinja2を通さずにそのまま読み込む
+    # モジュールに転送しないように、中身はモジュールを実行した後で引数に展開する
+    if not boolean(self._task.args.get('template', True), strict=False):
+      try:
+        self._raw_contents[key_path] = read_raw(source)
+      except (IOError, OSError):
+        raise ValueError('unable to load file, {}'.format(src))
+      return
+
+    try:
+      with open(source, 'r') as f:
+        template_data = to_text(f.read())
+    except IOError:
+      return dict(failed=True, msg='unable to load file, {}'.format(src))
+
+    # Create a template search path in the following order:
+    # [working_path, self_role_path, dependent_role_paths, dirname(source)]
+    searchpath = [working_path]
+    if self._task._role is not None:
+      searchpath.append(self._task._role._role_path)
+      if hasattr(self._task, "_block:"):
+        dep_chain = self._task._block.get_dep_chain()
+        if dep_chain is not None:
+          for role in dep_chain:
+            searchpath.append(role._role_path)
+    searchpath.append(os.path.dirname(source))
+    self._templar.environment.loader.searchpath = searchpath
+
+    # テンプレートの記号がなければJinja2を通さず、テンプレートならコンパイル結果を使い回す
+    self._task.args[key_path] = render_template(
+      self._templar, source, template_data, cache_dir=self._task.args.get('cache_dir'))
+
+
+  def run(self, tmp=None, task_vars=None):
+    del tmp  # tmp no longer has any effect
+
+    # ファイルへのパスを指定されていたらファイルの中身に展開する
+    self._raw_contents = {}
+    try:
+      self._handle_template('running_config_path')
+    except ValueError as e:
+      return dict(failed=True, msg=to_text(e))
+
+    # モジュールを実行する
+    # ただし、このモジュールは何もしない
+    # controller_onlyのときはモジュールを転送せず、引数の検査だけをここで行う
+    if boolean(self._task.args.get('controller_only', False), strict=False):
+      msg = validate_args(self._task.action, self._task.args, **get_module_spec())
+      if msg:
+        return dict(failed=True, msg=msg)
+      result = dict(changed=False)
+    else:
+      result = super(ActionModule, self).run(task_vars=task_vars)
+
+    if result.get('failed'):
+      return result
+
+    # template: falseで読み込んだファイルの中身を引数に展開する
+    self._task.args.update(self._raw_contents)
+
+    #
+    # モジュール実行後の後工程処理
+    #
+
+    if self._task.args.get('running_config_path'):
+      config = self._task.args.get('running_config_path')
+    else:
+      config = self._task.args.get('running_config')
+
+    if not config:
+      return dict(failed=True, msg="running_config is required but not set")
+
+    names = self._task.args.get('resources') or list(self.RESOURCES)
+    unknown = [name for name in names if name not in self.RESOURCES]
+    if unknown:
+      return dict(failed=True, msg='unknown resources: {}'.format(', '.join(unknown)))
+
+    snapshot_path = self._loader.path_dwim(self._task.args.get('snapshot_path'))
+    digest = config_digest(config)
+    actions = OrderedDict((name, self.resource_action(name)) for name in names)
+    versions = dict((name, action.parser_version) for name, action in actions.items())
+
+    result['snapshot_path'] = snapshot_path
+    result['config_digest'] = digest
+    result['resources'] = names
+
+    if self.is_up_to_date(snapshot_path, digest, versions):
+      return result
+
+    # コンフィグは一度だけパースして、すべてのリソースで同じConfigIndexを使う
+    index = PARSE_CACHE.get_index(config)
+    index.find('interface')
+
+    have = {}
+    for name, action in actions.items():
+      have_list, _ = get_have_list(
+        name, config, action.map_config_to_obj,
+        cache_dir=self._task.args.get('cache_dir'), version=action.parser_version)
+      have[name] = (action.parser_version, have_list)
+
+    if self._task.args.get('debug'):
+      # LazyHaveは全パラメータをパースした普通のdictにして出力する
+      result['have'] = dict((name, materialize(have_list)) for name, (_, have_list) in have.items())
+      result['parse_cache'] = PARSE_CACHE.stats()
+
+    result['changed'] = True
+    if self._play_context.check_mode:
+      return result
+
+    try:
+      result['size'] = dump_snapshot(snapshot_path, config, index, have)
+    except (IOError, OSError) as e:
+      return dict(failed=True, msg='unable to write snapshot {}: {}'.format(snapshot_path, to_text(e)))
+
+    return result
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=no-name-in-module, missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import copy
+import io
+import multiprocessing
+import os
+import re
+
+from collections import OrderedDict
+
+from ansible.module_utils.six import string_types
+from ansible.module_utils.six.moves.urllib.parse import urlsplit
+from ansible.plugins.action.normal import ActionModule as _ActionModule
+from ansible.module_utils._text import to_text
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.parsing.dataloader import DataLoader
+from ansible.playbook.task import Task
+from ansible_collections.iida.local.plugins.module_utils.path_loader import read_raw
+from ansible_collections.iida.local.plugins.module_utils.profiler import monotonic
+from ansible_collections.iida.local.plugins.module_utils.validation import validate_args
+from ansible_collections.iida.local.plugins.modules.ios_fleet_diff import get_module_spec
+from ansible_collections.iida.local.plugins.action.ios_intent import ActionModule as IntentAction
+
+try:
+  # pylint: disable=unused-import
+  from __main__ import display
+except ImportError:
+  # pylint: disable=ungrouped-imports
+  from ansible.utils.display import Display
+  display = Display()
+
+# 中身を読み込まずにパスのまま渡す引数
+KEEP_PATHS = ('snapshot_path',)
+
+# output_dirに<装置名>.txtを書くので、装置名に使える文字を限る
+# '/'や'..'でoutput_dirの外に書かれないようにする
+HOST_NAME_RE = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_.\-]*$')
+
+
+def path_keys(args):
+  # 装置の引数とintentの各リソースの引数にある*_pathを列挙する
+  # (引数のdict, キー)の組を返すので、呼び出し側で書き換えられる
+  if not isinstance(args, dict):
+    return
+  for key in list(args):
+    if key.endswith('_path'):
+      yield args, key
+  intent = args.get('intent')
+  if not isinstance(intent, dict):
+    return
+  for params_list in intent.values():
+    for params in (params_list if isinstance(params_list, list) else [params_list]):
+      if isinstance(params, dict):
+        for key in list(params):
+          if key.endswith('_path'):
+            yield params, key
+
+
+def load_paths(args):
+  # *_pathのファイルを読み込んで、パスのない方の名前で引数に入れる
+  for params, key in path_keys(args):
+    if key in KEEP_PATHS or not params.get(key):
+      continue
+    try:
+      params[key[:-len('_path')]] = read_raw(params.pop(key))
+    except (IOError, OSError) as e:
+      raise ValueError('unable to load file, {}'.format(to_text(e)))
+
+
+def run_intent(args):
+  # 装置に接続しないので、タスクとローダー以外は使わない
+  # 各リソースはsnapshot_pathをローダーのpath_dwim()に通すので、ローダーは必要
+  # パスはmake_jobs()で絶対パスにしてあるので、そのまま返る
+  task = Task()
+  task.action = 'iida.local.ios_intent'
+  task.args = args
+  action = IntentAction(task, None, None, DataLoader(), None, None)
+  return action.run(task_vars={})
+
+
+def diff_host(job):
+  # ワーカープロセスで一台分の差分を計算する
+  # 戻り値は親プロセスに送られるので、必要なものだけを返す
+  host, args, options = job
+  start = monotonic()
+
+  try:
+    args = dict(args)
+    load_paths(args)
+    for key in ('cache_dir', 'profile'):
+      if options.get(key) is not None:
+        args.setdefault(key, options[key])
+    args['controller_only'] = True
+    r = run_intent(args)
+  except Exception as e:  # pylint: disable=broad-except
+    r = dict(failed=True, msg='{}: {}'.format(type(e).__name__, to_text(e)))
+
+  commands = r.get('commands') or []
+  result = OrderedDict()
+
+  if options.get('output_dir'):
+    path = os.path.join(options['output_dir'], host + '.txt')
+    with io.open(path, 'w', encoding='utf-8') as f:
+      for line in commands:
+        f.write(u'{}\n'.format(line))
+    result['path'] = path
+    result['num_commands'] = len(commands)
+  else:
+    result['commands'] = commands
+
+  if r.get('failed'):
+    result['failed'] = True
+    result['msg'] = r.get('msg')
+
+  if options.get('profile'):
+    result['timings'] = r.get('timings')
+    result['resources'] = dict((name, res.get('profile')) for name, res in (r.get('resources') or {}).items())
+
+  result['elapsed'] = monotonic() - start
+  return host, result
+
+
+class ActionModule(_ActionModule):
+
+  def find_path(self, src):
+    # pylint: disable=W0212
+    working_path = self._loader.get_basedir()
+    if self._task._role is not None:
+      working_path = self._task._role._role_path
+
+    if os.path.isabs(src) or urlsplit(src).scheme:
+      source = src
+    else:
+      source = self._loader.path_dwim_relative(working_path, 'templates', src)
+      if not source:
+        source = self._loader.path_dwim_relative(working_path, src)
+
+    if not os.path.exists(source):
+      raise ValueError('path specified in {} not found'.format(src))
+    return source
+
+
+  def make_jobs(self, hosts, options):
+    # *_pathはプレイブックからの相対パスになっているので、ここで絶対パスにしておく
+    # ファイルの中身はワーカーで読み込むので、このプロセスには全装置のコンフィグを持たない
+    jobs = []
+    errors = OrderedDict()
+    for host, args in hosts.items():
+      if not isinstance(args, dict):
+        errors[host] = 'value of hosts.{} must be of type dict'.format(host)
+        continue
+      if options.get('output_dir') and not HOST_NAME_RE.match(to_text(host)):
+        errors[host] = 'device name {} can not be used as a file name in output_dir'.format(host)
+        continue
+      # パスを書き換えるので、タスクの引数とは別のものにする
+      args = copy.deepcopy(args)
+      try:
+        for params, key in path_keys(args):
+          if isinstance(params.get(key), string_types) and params.get(key):
+            params[key] = self.find_path(params[key])
+      except ValueError as e:
+        errors[host] = to_text(e)
+        continue
+      jobs.append((to_text(host), args, options))
+
+    # 大きなコンフィグから先に始めて、最後に一台だけ残るのを避ける
+    def size(job):
+      path = job[1].get('running_config_path') or job[1].get('snapshot_path')
+      if path:
+        return os.path.getsize(path)
+      return len(job[1].get('running_config') or '')
+    jobs.sort(key=size, reverse=True)
+
+    return jobs, errors
+
+
+  def run(self, tmp=None, task_vars=None):
+    del tmp  # tmp no longer has any effect
+
+    start = monotonic()
+
+    # モジュールを実行する
+    # ただし、このモジュールは何もしない
+    # controller_onlyのときはモジュールを転送せず、引数の検査だけをここで行う
+    if boolean(self._task.args.get('controller_only', False), strict=False):
+      msg = validate_args(self._task.action, self._task.args, **get_module_spec())
+      if msg:
+        return dict(failed=True, msg=msg)
+      result = dict(changed=False)
+    else:
+      result = super(ActionModule, self).run(task_vars=task_vars)
+
+    if result.get('failed'):
+      return result
+
+    #
+    # モジュール実行後の後工程処理
+    #
+
+    workers = int(self._task.args.get('workers') or 0)
+    max_tasks = int(self._task.args.get('max_tasks_per_worker') or 0)
+    if workers < 0 or max_tasks < 0:
+      return dict(failed=True, msg='workers and max_tasks_per_worker must not be negative')
+
+    options = {
+      'output_dir': self._task.args.get('output_dir'),
+      'cache_dir': self._task.args.get('cache_dir'),
+      'profile': boolean(self._task.args.get('profile', False), strict=False)
+    }
+    if options['output_dir'] and not os.path.isdir(options['output_dir']):
+      os.makedirs(options['output_dir'])
+
+    jobs, errors = self.make_jobs(self._task.args.get('hosts') or {}, options)
+
+    workers = min(workers or multiprocessing.cpu_count(), len(jobs)) or 1
+
+    # ワーカーから届いた順に受け取り、返すときは装置名の順に並べる
+    results = {}
+    if workers == 1:
+      # 一つしか使わないならforkしない
+      for job in jobs:
+        host, r = diff_host(job)
+        results[host] = r
+    else:
+      pool = multiprocessing.Pool(processes=workers, maxtasksperchild=max_tasks or None)
+      try:
+        for host, r in pool.imap_unordered(diff_host, jobs):
+          results[host] = r
+      finally:
+        pool.close()
+        pool.join()
+
+    for host, msg in errors.items():
+      results[host] = dict(failed=True, msg=msg)
+
+    hosts = OrderedDict((host, results[host]) for host in sorted(results))
+    failed = [host for host, r in hosts.items() if r.get('failed')]
+
+    result['hosts'] = hosts
+    result['counts'] = {
+      'hosts': len(hosts),
+      'failed': len(failed),
+      'commands': sum(r.get('num_commands', len(r.get('commands') or [])) for r in hosts.values()),
+      'workers': workers
+    }
+    result['timings'] = {'total': monotonic() - start}
+
+    if failed:
+      result['failed'] = True
+      result['msg'] = '\n'.join('{}: {}'.format(host, to_text(hosts[host].get('msg'))) for host in failed)
+
+    return result
@@ -10,7 +10,16 @@ import re
 from ansible.plugins.action.normal import ActionModule as _ActionModule
 from ansible.module_utils._text import to_text
 from ansible.module_utils.six.moves.urllib.parse import urlsplit
-from ansible.module_utils.network.common.config import NetworkConfig
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible_collections.iida.local.plugins.module_utils.attribute_matcher import AttributeMatcher
+from ansible_collections.iida.local.plugins.module_utils.obj_index import index_obj_list
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import PARSE_CACHE, get_have_list, get_scoped_index
+from ansible_collections.iida.local.plugins.module_utils.path_loader import read_raw
+from ansible_collections.iida.local.plugins.module_utils.profiler import phase_timer
+from ansible_collections.iida.local.plugins.module_utils.snapshot import SnapshotError, get_snapshot_have_list
+from ansible_collections.iida.local.plugins.module_utils.template_cache import render_template
+from ansible_collections.iida.local.plugins.module_utils.validation import validate_args
+from ansible_collections.iida.local.plugins.modules.ios_hsrp import get_module_spec
 
 try:
   # pylint: disable=unused-import
@@ -46,6 +55,23 @@ class ActionModule(_ActionModule):
 
   supported_params = HSRP_ID_PARAMS + HSRP_OPTION_PARAMS
 
+  # パース処理を変更したら上げる(ディスクキャッシュのキーに使う)
+  parser_version = 2
+
+  # standby <group> に続く行 -> パラメータ
+  # authenticationはmd5 key-stringのほうが長いので優先される
+  STANDBY_GROUP_ATTRIBUTES = AttributeMatcher([
+    ('ip', 'ip', 'all'),
+    ('priority', 'priority', 'rest'),
+    ('authentication md5 key-string', 'md5_key_string', 'rest'),
+    ('authentication', 'authentication', 'rest'),
+    ('preempt', 'preempt', 'flag'),
+    ('preempt', 'preempt_config', 'rest'),
+    ('track', 'track', 'rest')
+  ])
+
+  IPV4_ADDRESS = re.compile(r'^\d+\.\d+\.\d+\.\d+$')
+
   # 指定がないときはこれらで補正する
   DEFAULT_PARAMS = {
     'version': '1',
@@ -68,25 +94,6 @@ class ActionModule(_ActionModule):
         return '{} must be number: {}'.format(key, value)
 
 
-  @staticmethod
-  def search_obj_in_list(want, have_list):
-    want_name = want.get('name')
-    want_group = want.get('group')
-    for have in have_list:
-      have_name = have.get('name')
-      have_group = have.get('group')
-      if want_name == have_name and want_group == have_group:
-        return have
-    return None
-
-
-  @staticmethod
-  def parse_argument(cfg, arg=None):
-    match = re.search(r'{} (.+)$'.format(arg), cfg, re.M)
-    if match:
-      return match.group(1)
-
-
   @staticmethod
   def normalize_name(name):
 
@@ -257,57 +264,53 @@ class ActionModule(_ActionModule):
 
     obj = {}
 
-    group_config = '\n'.join(group_config_list)
+    # グループ配下の行を一度だけ走査する
+    attrs = self.STANDBY_GROUP_ATTRIBUTES.match(group_config_list)
 
     # vip
-    m = re.search(r'ip\s+(\d+\.\d+\.\d+\.\d+)\s*$', group_config, re.M)
-    if m:
-      obj['vip'] = m.group(1)
-    else:
-      obj['vip'] = None
-
     # secondary vip
-    m = re.findall(r'ip\s+(\d+\.\d+\.\d+\.\d+)\s+secondary\s*$', group_config, re.M)
-    if m:
-      obj['secondary'] = m
-    else:
-      obj['secondary'] = None  # []にする？
+    vip = None
+    secondary = []
+    for ip_config in attrs.get('ip'):
+      tokens = ip_config.split()
+      if not self.IPV4_ADDRESS.match(tokens[0]):
+        continue
+      if len(tokens) == 1:
+        if vip is None:
+          vip = tokens[0]
+      elif len(tokens) == 2 and tokens[1] == 'secondary':
+        secondary.append(tokens[0])
+    obj['vip'] = vip
+    obj['secondary'] = secondary if secondary else None  # []にする？
 
     # priority
-    m = re.search(r'priority\s+(\d+)\s*$', group_config, re.M)
-    if m:
-      obj['priority'] = m.group(1)
-    else:
-      obj['priority'] = None  # 100にする？
+    priority = attrs.get('priority')
+    if priority is not None:
+      priority = priority.strip()
+    obj['priority'] = priority if priority and priority.isdigit() else None  # 100にする？
 
     # authentication md5 key-string
-    md5_key_string = self.parse_argument(group_config, 'authentication md5 key-string')
+    md5_key_string = attrs.get('md5_key_string')
     obj['auth_type'] = 'md5' if md5_key_string else 'text'
 
     if md5_key_string:
       auth_string = md5_key_string
     else:
-      auth_string = self.parse_argument(group_config, 'authentication')
+      auth_string = attrs.get('authentication')
     obj['auth_string'] = auth_string
 
     # preempt
     # preempt delay minimum 60 reload 180 sync 60
-    PREEMPT_DELAY = r'''
-      ^delay
-      (?:\s+(?:minimum\s+(?P<delay_minimum>\d+)))?
-      (?:\s+(?:reload\s+(?P<delay_reload>\d+)))?
-      (?:\s+(?:sync\s+(?P<delay_sync>\d+)))?
-    '''
-    m = re.search(r'^preempt', group_config, re.M)
-    if m:
+    if attrs.get('preempt'):
       obj['preempt'] = 'enabled'
-      preempt_config = self.parse_argument(group_config, 'preempt')
+      preempt_config = attrs.get('preempt_config')
       if preempt_config:
-        m = re.search(PREEMPT_DELAY, preempt_config, re.VERBOSE)
-        if m:
-          obj['delay_minimum'] = m.group('delay_minimum')
-          obj['delay_reload'] = m.group('delay_reload')
-          obj['delay_sync'] = m.group('delay_sync')
+        tokens = preempt_config.split()
+        if tokens[0] == 'delay':
+          delay = dict(zip(tokens[1::2], tokens[2::2]))
+          for key in ('minimum', 'reload', 'sync'):
+            value = delay.get(key)
+            obj['delay_{}'.format(key)] = value if value and value.isdigit() else None
     else:
       obj['preempt'] = 'disabled'
       obj['delay_minimum'] = None
@@ -317,18 +320,19 @@ class ActionModule(_ActionModule):
     # track 1
     # track 1 decrement 10
     # track 1 shutdown
-    TRACK = r'''
-      ^track\s+(?P<track>\d+)
-      (?:\s+(?:decrement\s+(?P<decrement>\d+)))?
-      (?:\s+(?P<shutdown>shutdown))?
-    '''
-    track_config = self.parse_argument(group_config, 'track')
+    track_config = attrs.get('track')
     if track_config:
-      m = re.search(TRACK, 'track {}'.format(track_config), re.VERBOSE)
-      if m:
-        obj['track'] = m.group('track')
-        obj['track_decrement'] = m.group('decrement')
-        obj['track_shutdown'] = bool(m.group('shutdown'))
+      tokens = track_config.split()
+      if tokens[0].isdigit():
+        obj['track'] = tokens[0]
+        obj['track_decrement'] = None
+        obj['track_shutdown'] = False
+        rest = tokens[1:]
+        if len(rest) >= 2 and rest[0] == 'decrement' and rest[1].isdigit():
+          obj['track_decrement'] = rest[1]
+          rest = rest[2:]
+        if rest and rest[0] == 'shutdown':
+          obj['track_shutdown'] = True
     else:
       obj['track'] = None
       obj['track_decrement'] = None
@@ -343,59 +347,66 @@ class ActionModule(_ActionModule):
   def standby_config_to_obj(self, intf_name, standby_config_list):
     results = []
 
-    cfg = '\n'.join(standby_config_list)
-
     # 先頭のstandbyが取れた状態
     # version 2
     # 1 ip 3.3.3.1
     # 1 preempt
     # 1 track 1
 
-    # HSRPバージョンはインタフェース内で共通
-    version = self.parse_argument(cfg, 'version')
-
-    # HSRPグループはインタフェース内に複数存在する可能性があるので、グループごとに分離する
-    # 行頭の数字がグループ番号
-    match = re.findall(r'^(\d+)\s+\S+', cfg, re.M)
-    if match:
-      group_list = list(set(match))
-      for group in group_list:
-        match = re.findall(r'^{}\s+(.+)'.format(group), cfg, re.M)
-        if match:
-          obj = self.standby_group_config_to_obj(match)
-
-          # インタフェース共通のパラメータを追加
-          obj['state'] = 'present'
-          obj['name'] = intf_name
-          obj['version'] = version
-          obj['group'] = group
-
-          results.append(obj)
+    # 一度だけ走査して、行頭の数字(グループ番号)ごとに残りの部分を振り分ける
+    # グループ番号のないversion行はインタフェース内で共通
+    version = None
+    group_list = []
+    group_config = {}
+    for line in standby_config_list:
+      first, _, rest = line.partition(' ')
+      rest = rest.strip()
+      if first.isdigit():
+        if not rest:
+          continue
+        if first not in group_config:
+          group_list.append(first)
+          group_config[first] = []
+        group_config[first].append(rest)
+      elif first == 'version' and version is None and rest:
+        version = rest
+
+    for group in group_list:
+      obj = self.standby_group_config_to_obj(group_config[group])
+
+      # インタフェース共通のパラメータを追加
+      obj['state'] = 'present'
+      obj['name'] = intf_name
+      obj['version'] = version
+      obj['group'] = group
+
+      results.append(obj)
 
     return results
 
 
-  def map_config_to_obj(self, config):
+  def map_config_to_obj(self, config, scope=None):
     results = []
 
-    configobj = NetworkConfig(indent=1, contents=config)
-
-    # インタフェース名の一覧を取り出す
-    match = re.findall(r'^interface (\S+)', config, re.M)
-    if not match:
+    # コンフィグを一度だけ走査してインタフェース名の一覧を取り出す
+    # scopeを指定されたときは、そのインタフェースのセクションだけを読む
+    if scope is None:
+      index = PARSE_CACHE.get_index(config)
+      names = index.find('interface')
+    else:
+      index = get_scoped_index(config, 'interface', scope)
+      names = [n for n in index.find('interface') if n in scope]
+    if not names:
       return list()
 
-    for intf_name in set(match):
+    for intf_name in names:
       # インタフェース内にstandbyで始まる設定があるか確認する
-      parent = 'interface {}'.format(intf_name)
-      cfg = configobj[parent]
-      cfg = '\n'.join(cfg.children)
-      match = re.findall(r'^standby\s+(.+)', cfg, re.M)
-      if not match:
+      children = index.children('interface {}'.format(intf_name))
+      standby_config_list = [line[len('standby '):].lstrip() for line in children if line.startswith('standby ')]
+      if not standby_config_list:
         continue
 
       # standbyで始まるコンフィグコマンドのリストを渡してオブジェクトに変換する
-      standby_config_list = list(match)
       objs = self.standby_config_to_obj(intf_name, standby_config_list)
       if objs:
         results.extend(objs)
@@ -801,12 +812,12 @@ class ActionModule(_ActionModule):
     return commands
 
 
-  def to_commands(self, want, have_list):
+  def to_commands(self, want, have_index):
     commands = []
 
     # nameとgroupが一致するものを探す
     # 存在しなければhaveはNoneになる
-    have = self.search_obj_in_list(want, have_list)
+    have = have_index.get((want.get('name'), want.get('group')))
 
     state = want.get('state')
 
@@ -829,8 +840,11 @@ class ActionModule(_ActionModule):
   def to_commands_list(self, want_list, have_list):
     commands = []
 
+    # (インタフェース名, グループ番号)で引けるようにしておく
+    have_index = index_obj_list(have_list, lambda o: (o.get('name'), o.get('group')))
+
     for want in want_list:
-      cmds = self.to_commands(want, have_list)
+      cmds = self.to_commands(want, have_index)
       if cmds:
         commands.extend(cmds)
 
@@ -858,6 +872,15 @@ class ActionModule(_ActionModule):
     if not os.path.exists(source):
       raise ValueError('path specified in src not found')
 
+    # template: falseのときはJinja2を通さずにそのまま読み込む
+    # モジュールに転送しないように、中身はモジュールを実行した後で引数に展開する
+    if not boolean(self._task.args.get('template', True), strict=False):
+      try:
+        self._raw_contents[key_path] = read_raw(source)
+      except (IOError, OSError):
+        raise ValueError('unable to load file, {}'.format(src))
+      return
+
     try:
       with open(source, 'r') as f:
         template_data = to_text(f.read())
@@ -876,46 +899,93 @@ class ActionModule(_ActionModule):
             searchpath.append(role._role_path)
     searchpath.append(os.path.dirname(source))
     self._templar.environment.loader.searchpath = searchpath
-    self._task.args[key_path] = self._templar.template(template_data)
+
+    # テンプレートの記号がなければJinja2を通さず、テンプレートならコンパイル結果を使い回す
+    self._task.args[key_path] = render_template(
+      self._templar, source, template_data, cache_dir=self._task.args.get('cache_dir'))
 
 
   def run(self, tmp=None, task_vars=None):
     del tmp  # tmp no longer has any effect
 
+    # profile: trueのときはフェーズごとの所要時間と件数を記録する
+    timer = phase_timer(boolean(self._task.args.get('profile', False), strict=False))
+
     # ファイルへのパスを指定されていたらファイルの中身に展開する
+    self._raw_contents = {}
     try:
       self._handle_template('running_config_path')
     except ValueError as e:
       return dict(failed=True, msg=to_text(e))
+    timer.lap('template')
 
     # モジュールを実行する
     # ただし、このモジュールは何もしない
-    result = super(ActionModule, self).run(task_vars=task_vars)
+    # controller_onlyのときはモジュールを転送せず、引数の検査だけをここで行う
+    if boolean(self._task.args.get('controller_only', False), strict=False):
+      msg = validate_args(self._task.action, self._task.args, **get_module_spec())
+      if msg:
+        return dict(failed=True, msg=msg)
+      result = dict(changed=False)
+    else:
+      result = super(ActionModule, self).run(task_vars=task_vars)
+
+    # template: falseで読み込んだファイルの中身を引数に展開する
+    self._task.args.update(self._raw_contents)
+    timer.lap('module')
 
     #
     # モジュール実行後の後工程処理
     #
 
-    if self._task.args.get('running_config_path'):
-      config = self._task.args.get('running_config_path')
-    else:
-      config = self._task.args.get('running_config')
-
-    have_list = self.map_config_to_obj(config)
-    if self._task.args.get('debug'):
-      result['have'] = have_list
-
     want_list = self.map_params_to_obj()
+    timer.lap('map_params_to_obj')
     if self._task.args.get('debug'):
       result['want'] = want_list
 
     msg = self.validate(want_list)
+    timer.lap('validate')
     if msg:
       result['failed'] = True
       result['msg'] = msg
-      return result
+      return timer.update_result(result)
+
+    # コンフィグ情報をオブジェクトにしてhave_listにする
+    # scoped: trueのときはwantのインタフェース名(正規化済み)が分かってからパースする
+    if self._task.args.get('running_config_path'):
+      config = self._task.args.get('running_config_path')
+    else:
+      config = self._task.args.get('running_config')
+    scoped = boolean(self._task.args.get('scoped', False), strict=False)
+
+    # snapshot_pathが指定されていたら、ios_config_snapshotでパース済みのhave_listを使う
+    if self._task.args.get('snapshot_path'):
+      try:
+        have_list, cache_stats = get_snapshot_have_list(
+          self._loader.path_dwim(self._task.args.get('snapshot_path')), 'ios_hsrp', self.map_config_to_obj,
+          version=self.parser_version)
+      except SnapshotError as e:
+        return dict(failed=True, msg=to_text(e))
+    elif scoped:
+      # wantにあるインタフェースのセクションだけを読む、ディスクキャッシュは使わない
+      have_list = self.map_config_to_obj(config, scope=set(want.get('name') for want in want_list))
+      cache_stats = PARSE_CACHE.stats()
+    else:
+      # パース結果はキャッシュを使い回す(cache_dirがあればディスクにも保存する)
+      have_list, cache_stats = get_have_list(
+        'ios_hsrp', config, self.map_config_to_obj,
+        cache_dir=self._task.args.get('cache_dir'), version=self.parser_version)
+    timer.lap('map_config_to_obj')
+    if self._task.args.get('debug'):
+      result['have'] = have_list
+      result['parse_cache'] = cache_stats
 
     commands = self.to_commands_list(want_list, have_list)
+    timer.lap('to_commands_list')
     result['commands'] = commands
 
-    return result
+    timer.count_config(self._task.args.get('running_config_path') or self._task.args.get('running_config'))
+    timer.count('haves', len(have_list))
+    timer.count('wants', len(want_list))
+    timer.count('commands', len(commands))
+    return timer.update_result(result)
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=no-name-in-module, missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+
+from collections import OrderedDict
+
+from ansible.module_utils.six import string_types
+from ansible.module_utils.six.moves.urllib.parse import urlsplit
+from ansible.plugins.action.normal import ActionModule as _ActionModule
+from ansible.module_utils._text import to_text
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import PARSE_CACHE
+from ansible_collections.iida.local.plugins.module_utils.path_loader import read_raw
+from ansible_collections.iida.local.plugins.module_utils.profiler import monotonic
+from ansible_collections.iida.local.plugins.module_utils.template_cache import render_template
+from ansible_collections.iida.local.plugins.module_utils.validation import validate_args
+from ansible_collections.iida.local.plugins.modules.ios_intent import get_module_spec
+from ansible_collections.iida.local.plugins.modules import ios_hsrp
+from ansible_collections.iida.local.plugins.modules import ios_interface
+from ansible_collections.iida.local.plugins.modules import ios_interface_address
+from ansible_collections.iida.local.plugins.modules import ios_interface_trunk
+from ansible_collections.iida.local.plugins.modules import ios_ip_acl
+from ansible_collections.iida.local.plugins.modules import ios_linkagg
+from ansible_collections.iida.local.plugins.modules import ios_static_route
+from ansible_collections.iida.local.plugins.modules import ios_vlan
+from ansible_collections.iida.local.plugins.action.ios_hsrp import ActionModule as HsrpAction
+from ansible_collections.iida.local.plugins.action.ios_interface import ActionModule as InterfaceAction
+from ansible_collections.iida.local.plugins.action.ios_interface_address import ActionModule as InterfaceAddressAction
+from ansible_collections.iida.local.plugins.action.ios_interface_trunk import ActionModule as InterfaceTrunkAction
+from ansible_collections.iida.local.plugins.action.ios_ip_acl import ActionModule as IpAclAction
+from ansible_collections.iida.local.plugins.action.ios_linkagg import ActionModule as LinkaggAction
+from ansible_collections.iida.local.plugins.action.ios_static_route import ActionModule as StaticRouteAction
+from ansible_collections.iida.local.plugins.action.ios_vlan import ActionModule as VlanAction
+
+try:
+  # pylint: disable=unused-import
+  from __main__ import display
+except ImportError:
+  # pylint: disable=ungrouped-imports
+  from ansible.utils.display import Display
+  display = Display()
+
+
+class ActionModule(_ActionModule):
+
+  # intentのキー -> (モジュール名, アクションプラグイン, モジュールの引数仕様)
+  # この順番でコマンドを並べる
+  RESOURCES = OrderedDict([
+    ('vlan', ('iida.local.ios_vlan', VlanAction, ios_vlan.get_module_spec)),
+    ('interface', ('iida.local.ios_interface', InterfaceAction, ios_interface.get_module_spec)),
+    ('linkagg', ('iida.local.ios_linkagg', LinkaggAction, ios_linkagg.get_module_spec)),
+    ('interface_trunk', ('iida.local.ios_interface_trunk', InterfaceTrunkAction, ios_interface_trunk.get_module_spec)),
+    ('interface_address', ('iida.local.ios_interface_address', InterfaceAddressAction, ios_interface_address.get_module_spec)),
+    ('hsrp', ('iida.local.ios_hsrp', HsrpAction, ios_hsrp.get_module_spec)),
+    ('static_route', ('iida.local.ios_static_route', StaticRouteAction, ios_static_route.get_module_spec)),
+    ('ip_acl', ('iida.local.ios_ip_acl', IpAclAction, ios_ip_acl.get_module_spec))
+  ])
+
+  # 各リソースに引き継ぐ共通の引数
+  # *_pathはこのアクションプラグインで読み込み済みなので、中身をパスのない方の名前で渡す
+  SHARED_ARGS = ['running_config', 'snapshot_path', 'show_vlan', 'show_interfaces_switchport', 'cache_dir', 'template', 'scoped', 'profile', 'debug']
+
+
+  def resource_action(self, name, args):
+    # 同じタスクのコピーに引数だけ差し替えて、リソースのアクションプラグインを作る
+    action, action_class, _ = self.RESOURCES[name]
+    task = self._task.copy()
+    task.action = action
+    task.args = args
+    return action_class(task, self._connection, self._play_context, self._loader, self._templar, self._shared_loader_obj)
+
+
+  def shared_args(self):
+    shared = {}
+    for key in self.SHARED_ARGS:
+      key_path = key + '_path'
+      if self._task.args.get(key_path):
+        shared[key] = self._task.args.get(key_path)
+      elif self._task.args.get(key) is not None:
+        shared[key] = self._task.args.get(key)
+    return shared
+
+
+  def resource_args(self, name, params, shared):
+    # リソースの引数に、そのモジュールが受け付ける共通の引数を足す
+    # 同じ引数(またはその*_path版)がリソース側にあればそちらを優先する
+    argument_spec = self.RESOURCES[name][2]()['argument_spec']
+    args = dict(params)
+    for key, value in shared.items():
+      if key not in argument_spec or key in args or key + '_path' in args:
+        continue
+      # snapshot_pathとrunning_configは排他
+      if key == 'running_config' and 'snapshot_path' in args:
+        continue
+      if key == 'snapshot_path' and ('running_config' in args or 'running_config_path' in args):
+        continue
+      args[key] = value
+    args['controller_only'] = True
+    return args
+
+
+  def run_resource(self, name, params, shared, task_vars):
+    if not isinstance(params, dict):
+      return dict(failed=True, msg='value of intent.{} must be of type dict or list of dict'.format(name))
+
+    params = dict(params)
+    parents = params.pop('parents', None)
+    if isinstance(parents, string_types):
+      parents = [parents]
+
+    action = self.resource_action(name, self.resource_args(name, params, shared))
+    result = action.run(task_vars=task_vars)
+
+    # parentsがあれば、コマンドがあるときだけ前に置く
+    if parents and result.get('commands'):
+      result['commands'] = list(parents) + result['commands']
+    return result
+
+
+  def _handle_template(self, key_path):
+    # pylint: disable=W0212
+    if not self._task.args.get(key_path):
+      return
+
+    src = self._task.args.get(key_path)
+
+    working_path = self._loader.get_basedir()
+    if self._task._role is not None:
+      working_path = self._task._role._role_path
+
+    if os.path.isabs(src) or urlsplit('src').scheme:
+      source = src
+    else:
+      source = self._loader.path_dwim_relative(working_path, 'templates', src)
+      if not source:
+        source = self._loader.path_dwim_relative(working_path, src)
+
+    if not os.path.exists(source):
+      raise ValueError('path specified in src not found')
+
+    # template: falseのときはJinja2を通さずにそのまま読み込む
+    # モジュールに転送しないように、中身はモジュールを実行した後で引数に展開する
+    if not boolean(self._task.args.get('template', True), strict=False):
+      try:
+        self._raw_contents[key_path] = read_raw(source)
+      except (IOError, OSError):
+        raise ValueError('unable to load file, {}'.format(src))
+      return
+
+    try:
+      with open(source, 'r') as f:
+        template_data = to_text(f.read())
+    except IOError:
+      return dict(failed=True, msg='unable to load file, {}'.format(src))
+
+    # Create a template search path in the following order:
+    # [working_path, self_role_path, dependent_role_paths, dirname(source)]
+    searchpath = [working_path]
+    if self._task._role is not None:
+      searchpath.append(self._task._role._role_path)
+      if hasattr(self._task, "_block:"):
+        dep_chain = self._task._block.get_dep_chain()
+        if dep_chain is not None:
+          for role in dep_chain:
+            searchpath.append(role._role_path)
+    searchpath.append(os.path.dirname(source))
+    self._templar.environment.loader.searchpath = searchpath
+
+    # テンプレートの記号がなければJinja2を通さず、テンプレートならコンパイル結果を使い回す
+    self._task.args[key_path] = render_template(
+      self._templar, source, template_data, cache_dir=self._task.args.get('cache_dir'))
+
+
+  def run(self, tmp=None, task_vars=None):
+    del tmp  # tmp no longer has any effect
+
+    start = monotonic()
+
+    # ファイルへのパスを指定されていたらファイルの中身に展開する
+    self._raw_contents = {}
+    try:
+      self._handle_template('running_config_path')
+      self._handle_template('show_vlan_path')
+      self._handle_template('show_interfaces_switchport_path')
+    except ValueError as e:
+      return dict(failed=True, msg=to_text(e))
+
+    # モジュールを実行する
+    # ただし、このモジュールは何もしない
+    # controller_onlyのときはモジュールを転送せず、引数の検査だけをここで行う
+    if boolean(self._task.args.get('controller_only', False), strict=False):
+      msg = validate_args(self._task.action, self._task.args, **get_module_spec())
+      if msg:
+        return dict(failed=True, msg=msg)
+      result = dict(changed=False)
+    else:
+      result = super(ActionModule, self).run(task_vars=task_vars)
+
+    if result.get('failed'):
+      return result
+
+    # template: falseで読み込んだファイルの中身を引数に展開する
+    self._task.args.update(self._raw_contents)
+
+    #
+    # モジュール実行後の後工程処理
+    #
+
+    intent = self._task.args.get('intent') or {}
+    unknown = [name for name in intent if name not in self.RESOURCES]
+    if unknown:
+      return dict(failed=True, msg='unknown resources in intent: {}'.format(', '.join(sorted(unknown))))
+
+    shared = self.shared_args()
+    timings = OrderedDict()
+
+    # running-configは一度だけパースして、すべてのリソースで同じConfigIndexを使う
+    # 各リソースのhave_listはプロセス内のPARSE_CACHEを通して作られる
+    if shared.get('running_config') and not shared.get('snapshot_path'):
+      t = monotonic()
+      PARSE_CACHE.get_index(shared['running_config']).find('interface')
+      timings['parse'] = monotonic() - t
+
+    commands = []
+    resources = OrderedDict()
+    errors = []
+    for name in self.RESOURCES:
+      params_list = intent.get(name)
+      if params_list is None:
+        continue
+      if not isinstance(params_list, list):
+        params_list = [params_list]
+
+      t = monotonic()
+      resource_commands = []
+      resource_result = {}
+      for params in params_list:
+        r = self.run_resource(name, params, shared, task_vars)
+        resource_commands.extend(r.get('commands') or [])
+        if r.get('failed'):
+          resource_result['failed'] = True
+          resource_result.setdefault('msg', []).append(to_text(r.get('msg')))
+          errors.append('{}: {}'.format(name, to_text(r.get('msg'))))
+        if 'timings' in r:
+          resource_result.setdefault('profile', []).append({'timings': r['timings'], 'counts': r.get('counts')})
+        if self._task.args.get('debug'):
+          resource_result.setdefault('results', []).append(r)
+      timings[name] = monotonic() - t
+
+      resource_result['commands'] = resource_commands
+      resource_result['elapsed'] = timings[name]
+      resources[name] = resource_result
+      commands.extend(resource_commands)
+
+    timings['total'] = monotonic() - start
+
+    result['commands'] = commands
+    result['resources'] = resources
+    result['timings'] = timings
+
+    if self._task.args.get('debug'):
+      result['parse_cache'] = PARSE_CACHE.stats()
+
+    if errors:
+      result['failed'] = True
+      result['msg'] = '\n'.join(errors)
+
+    return result
@@ -4,13 +4,24 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import functools
 import os
 import re
 
 from ansible.plugins.action.normal import ActionModule as _ActionModule
 from ansible.module_utils._text import to_text
 from ansible.module_utils.six.moves.urllib.parse import urlsplit
-from ansible.module_utils.network.common.config import NetworkConfig
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible_collections.iida.local.plugins.module_utils.attribute_matcher import AttributeMatcher
+from ansible_collections.iida.local.plugins.module_utils.lazy_have import LazyHave, materialize
+from ansible_collections.iida.local.plugins.module_utils.obj_index import index_obj_list
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import PARSE_CACHE, get_have_list, get_scoped_index
+from ansible_collections.iida.local.plugins.module_utils.path_loader import read_raw
+from ansible_collections.iida.local.plugins.module_utils.profiler import phase_timer
+from ansible_collections.iida.local.plugins.module_utils.snapshot import SnapshotError, get_snapshot_have_list
+from ansible_collections.iida.local.plugins.module_utils.template_cache import render_template
+from ansible_collections.iida.local.plugins.module_utils.validation import validate_args
+from ansible_collections.iida.local.plugins.modules.ios_interface import get_module_spec
 
 try:
   # pylint: disable=unused-import
@@ -32,13 +43,20 @@ class ActionModule(_ActionModule):
     'shutdown'
   ]
 
+  # パース処理を変更したら上げる(ディスクキャッシュのキーに使う)
+  parser_version = 1
 
-  @staticmethod
-  def search_obj_in_list(name, lst):
-    for o in lst:
-      if o['name'] == name:
-        return o
-    return None
+  # running-configの子の行 -> パラメータ
+  # negotiation autoは否定するとno negotiation autoが表示されるという変わった作り
+  # shutdownは引数を取らないので有無だけを見る
+  CONFIG_ATTRIBUTES = AttributeMatcher([
+    ('description', 'description', 'rest'),
+    ('negotiation auto', 'negotiation', 'flag'),
+    ('speed', 'speed', 'rest'),
+    ('duplex', 'duplex', 'rest'),
+    ('mtu', 'mtu', 'rest'),
+    ('shutdown', 'shutdown', 'flag')
+  ])
 
 
   @staticmethod
@@ -159,70 +177,27 @@ class ActionModule(_ActionModule):
             return msg
 
 
-  def parse_config_argument(self, configobj, name, arg=None):
-
-    # nameで指定したインタフェース配下のコンフィグを取り出す
-    parent = 'interface {}'.format(name)
-    cfg = configobj[parent]
-    cfg = '\n'.join(cfg.children)
-
-    # 正規表現argに一致し、その後ろに続く文字列を返す
-    match = re.search(r'{} (.+)$'.format(arg), cfg, re.M)
-    if match:
-      return match.group(1)
-
-
-  def parse_description(self, configobj, name):
-    return self.parse_config_argument(configobj, name, 'description')
-
-
-  # negotiation autoは否定するとno negotiation autoが表示されるという変わった作り
-  def parse_negotiation(self, configobj, name):
-    cfg = configobj['interface {}'.format(name)]
-    cfg = '\n'.join(cfg.children)
-    match = re.search(r'^negotiation auto', cfg, re.M)
-    return bool(match)
-
-
-  def parse_speed(self, configobj, name):
-    return self.parse_config_argument(configobj, name, 'speed')
-
+  def map_config_to_obj(self, config, scope=None):
 
-  def parse_duplex(self, configobj, name):
-    return self.parse_config_argument(configobj, name, 'duplex')
-
-
-  def parse_mtu(self, configobj, name):
-    return self.parse_config_argument(configobj, name, 'mtu')
-
-
-  # shutdownは引数を取らないので特殊
-  def parse_shutdown(self, configobj, name):
-    cfg = configobj['interface {}'.format(name)]
-    cfg = '\n'.join(cfg.children)
-    match = re.search(r'^shutdown', cfg, re.M)
-    return bool(match)
-
-
-  def map_config_to_obj(self, config):
-
-    # コンフィグからインタフェース名の一覧を取り出す
-    match = re.findall(r'^interface (\S+)', config, re.M)
-    if not match:
+    # コンフィグを一度だけ走査してインタフェース名の一覧を取り出す
+    # scopeを指定されたときは、そのインタフェースのセクションだけを読む
+    if scope is None:
+      index = PARSE_CACHE.get_index(config)
+      names = index.find('interface')
+    else:
+      index = get_scoped_index(config, 'interface', scope)
+      names = [n for n in index.find('interface') if n in scope]
+    if not names:
       return list()
 
-    configobj = NetworkConfig(indent=1, contents=config)
-
     results = []
-    for intf_name in set(match):
-      obj = {}
-      obj['name'] = intf_name
-      obj['state'] = 'present'
-
-      for param in self.supported_params:
-        func = getattr(self, 'parse_%s' % param, None)
-        if callable(func):
-          obj[param] = func(configobj, intf_name)
+    for intf_name in names:
+      # 各パラメータはpresent_XXX()などで読まれたときに、インタフェース配下の行から取り出す
+      children = index.children('interface {}'.format(intf_name))
+      obj = LazyHave(
+        {'name': intf_name, 'state': 'present'},
+        functools.partial(self.CONFIG_ATTRIBUTES.match_one, children),
+        self.supported_params)
 
       results.append(obj)
 
@@ -652,9 +627,12 @@ class ActionModule(_ActionModule):
   def to_commands_list(self, want_list, have_list):
     commands = []
 
+    # インタフェース名で引けるようにしておく
+    have_index = index_obj_list(have_list, lambda o: o.get('name'))
+
     for want in want_list:
       intf_name = want.get('name')
-      have = self.search_obj_in_list(intf_name, have_list)
+      have = have_index.get(intf_name)
       cmds = self.to_commands(want, have)
       if cmds:
         commands.extend(cmds)
@@ -683,6 +661,15 @@ class ActionModule(_ActionModule):
     if not os.path.exists(source):
       raise ValueError('path specified in src not found')
 
+    # template: falseのときはJinja2を通さずにそのまま読み込む
+    # モジュールに転送しないように、中身はモジュールを実行した後で引数に展開する
+    if not boolean(self._task.args.get('template', True), strict=False):
+      try:
+        self._raw_contents[key_path] = read_raw(source)
+      except (IOError, OSError):
+        raise ValueError('unable to load file, {}'.format(src))
+      return
+
     try:
       with open(source, 'r') as f:
         template_data = to_text(f.read())
@@ -701,46 +688,93 @@ class ActionModule(_ActionModule):
             searchpath.append(role._role_path)
     searchpath.append(os.path.dirname(source))
     self._templar.environment.loader.searchpath = searchpath
-    self._task.args[key_path] = self._templar.template(template_data)
+
+    # テンプレートの記号がなければJinja2を通さず、テンプレートならコンパイル結果を使い回す
+    self._task.args[key_path] = render_template(
+      self._templar, source, template_data, cache_dir=self._task.args.get('cache_dir'))
 
 
   def run(self, tmp=None, task_vars=None):
     del tmp  # tmp no longer has any effect
 
+    # profile: trueのときはフェーズごとの所要時間と件数を記録する
+    timer = phase_timer(boolean(self._task.args.get('profile', False), strict=False))
+
     # ファイルへのパスを指定されていたらファイルの中身に展開する
+    self._raw_contents = {}
     try:
       self._handle_template('running_config_path')
     except ValueError as e:
       return dict(failed=True, msg=to_text(e))
+    timer.lap('template')
 
     # モジュールを実行する
     # ただし、このモジュールは何もしない
-    result = super(ActionModule, self).run(task_vars=task_vars)
+    # controller_onlyのときはモジュールを転送せず、引数の検査だけをここで行う
+    if boolean(self._task.args.get('controller_only', False), strict=False):
+      msg = validate_args(self._task.action, self._task.args, **get_module_spec())
+      if msg:
+        return dict(failed=True, msg=msg)
+      result = dict(changed=False)
+    else:
+      result = super(ActionModule, self).run(task_vars=task_vars)
+
+    # template: falseで読み込んだファイルの中身を引数に展開する
+    self._task.args.update(self._raw_contents)
+    timer.lap('module')
 
     #
     # モジュール実行後の後工程処理
     #
 
-    if self._task.args.get('running_config_path'):
-      config = self._task.args.get('running_config_path')
-    else:
-      config = self._task.args.get('running_config')
-
-    have_list = self.map_config_to_obj(config)
-    if self._task.args.get('debug'):
-      result['have'] = have_list
-
     want_list = self.map_params_to_obj()
+    timer.lap('map_params_to_obj')
     if self._task.args.get('debug'):
       result['want'] = want_list
 
     msg = self.validate(want_list)
+    timer.lap('validate')
     if msg:
       result['failed'] = True
       result['msg'] = msg
-      return result
+      return timer.update_result(result)
+
+    # コンフィグ情報をオブジェクトにしてhave_listにする
+    # scoped: trueのときはwantのインタフェース名(正規化済み)が分かってからパースする
+    if self._task.args.get('running_config_path'):
+      config = self._task.args.get('running_config_path')
+    else:
+      config = self._task.args.get('running_config')
+    scoped = boolean(self._task.args.get('scoped', False), strict=False)
+
+    # snapshot_pathが指定されていたら、ios_config_snapshotでパース済みのhave_listを使う
+    if self._task.args.get('snapshot_path'):
+      try:
+        have_list, cache_stats = get_snapshot_have_list(
+          self._loader.path_dwim(self._task.args.get('snapshot_path')), 'ios_interface', self.map_config_to_obj,
+          version=self.parser_version)
+      except SnapshotError as e:
+        return dict(failed=True, msg=to_text(e))
+    elif scoped:
+      # wantにあるインタフェースのセクションだけを読む、ディスクキャッシュは使わない
+      have_list = self.map_config_to_obj(config, scope=set(want.get('name') for want in want_list))
+      cache_stats = PARSE_CACHE.stats()
+    else:
+      # パース結果はキャッシュを使い回す(cache_dirがあればディスクにも保存する)
+      have_list, cache_stats = get_have_list(
+        'ios_interface', config, self.map_config_to_obj,
+        cache_dir=self._task.args.get('cache_dir'), version=self.parser_version)
+    timer.lap('map_config_to_obj')
+    if self._task.args.get('debug'):
+      result['have'] = materialize(have_list)
+      result['parse_cache'] = cache_stats
 
     commands = self.to_commands_list(want_list=want_list, have_list=have_list)
+    timer.lap('to_commands_list')
     result['commands'] = commands
 
-    return result
+    timer.count_config(self._task.args.get('running_config_path') or self._task.args.get('running_config'))
+    timer.count('haves', len(have_list))
+    timer.count('wants', len(want_list))
+    timer.count('commands', len(commands))
+    return timer.update_result(result)
@@ -4,13 +4,25 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import functools
 import os
 import re
 
 from ansible.plugins.action.normal import ActionModule as _ActionModule
 from ansible.module_utils._text import to_text
 from ansible.module_utils.six.moves.urllib.parse import urlsplit
-from ansible.module_utils.network.common.config import NetworkConfig
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible_collections.iida.local.plugins.module_utils.attribute_matcher import AttributeMatcher
+from ansible_collections.iida.local.plugins.module_utils.lazy_have import LazyHave, materialize
+from ansible_collections.iida.local.plugins.module_utils.obj_index import index_obj_list
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import PARSE_CACHE, get_have_list
+from ansible_collections.iida.local.plugins.module_utils.path_loader import read_raw
+from ansible_collections.iida.local.plugins.module_utils.profiler import phase_timer
+from ansible_collections.iida.local.plugins.module_utils.snapshot import SnapshotError, get_snapshot_have_list
+from ansible_collections.iida.local.plugins.module_utils.template_cache import render_template
+from ansible_collections.iida.local.plugins.module_utils.validation import validate_args
+from ansible_collections.iida.local.plugins.module_utils.vlan_set import MAX_VLAN_ID, VlanSet
+from ansible_collections.iida.local.plugins.modules.ios_interface_trunk import get_module_spec
 
 try:
   # pylint: disable=unused-import
@@ -25,6 +37,14 @@ class ActionModule(_ActionModule):
 
   supported_params = ('mode', 'access_vlan', 'native_vlan', 'trunk_vlans', 'nonegotiate')
 
+  # パース処理を変更したら上げる(ディスクキャッシュのキーに使う)
+  parser_version = 1
+
+  # running-configの子の行 -> パラメータ
+  CONFIG_ATTRIBUTES = AttributeMatcher([
+    ('channel-group', 'channel_group', 'rest')
+  ])
+
 
   @staticmethod
   def get_value(want, key, none_is='', converter=str):
@@ -46,14 +66,6 @@ class ActionModule(_ActionModule):
     return want.get(key)
 
 
-  @staticmethod
-  def search_obj_in_list(name, lst):
-    for o in lst:
-      if o['name'] == name:
-        return o
-    return None
-
-
   @staticmethod
   def normalize_name(name):
 
@@ -84,199 +96,112 @@ class ActionModule(_ActionModule):
     return name
 
 
-  @staticmethod
-  def vlan_str_to_list(vlan_str):
-    if vlan_str is None:
-      return None
-
-    # ensure vlan_str is string type
-    if not isinstance(vlan_str, str):
-      vlan_str = str(vlan_str)
-
-    # convert 'ALL' to 1-4094
-    if vlan_str.lower() == 'all':
-      vlan_str = '1-4094'
-
-    result = []
-    if vlan_str:
-      for part in vlan_str.split(','):
-        if part.lower() == 'none':
-          break
-        if '-' in part:
-          start, stop = (int(i) for i in part.split('-'))
-          result.extend(range(start, stop + 1))
-        else:
-          result.append(int(part))
-
-    return sorted(result)
-
-
-  @staticmethod
-  def vlan_list_to_str(vlan_list):
-    vlan_list = sorted(vlan_list)
-    results = []
-    start = None
-    stop = None
-
-    for item in vlan_list:
-      if not start:
-        start = item
-      else:
-        if not stop:
-          if item == start + 1:
-            stop = item
-          else:
-            results.append(str(start))
-            start = item
-        else:
-          if item == stop + 1:
-            stop = item
-          else:
-            results.append(str(start) + '-' + str(stop))
-            start = item
-            stop = None
-
-    if start and stop:
-      results.append(str(start) + '-' + str(stop))
-    elif start:
-      results.append(str(start))
-
-    return ','.join(results)
-
-
-  @staticmethod
-  def parse_config_argument(configobj, name, arg=None):
-
-    # nameで指定したインタフェース配下のコンフィグを取り出す
-    parent = 'interface {}'.format(name)
-    cfg = configobj[parent]
-    cfg = '\n'.join(cfg.children)
-
-    # 正規表現argに一致し、その後ろに続く文字列を返す
-    match = re.search(r'{} (.+)$'.format(arg), cfg, re.M)
-    if match:
-      return match.group(1)
-
-
-  @staticmethod
-  def parse_config_argument_all(configobj, name, arg=None):
-
-    # nameで指定したインタフェース配下のコンフィグを取り出す
-    parent = 'interface {}'.format(name)
-    cfg = configobj[parent]
-    cfg = '\n'.join(cfg.children)
-
-    values = []
-    matches = re.finditer(r'{} (.+)$'.format(arg), cfg, re.M)
-    for match in matches:
-      match_str = match.group(1).strip()
-      values.append(match_str)
-
-    return values
-
-
   @staticmethod
   def map_show_vlan_to_obj(show_vlan):
-    vlans = set()
+    vlans = []
     lines = show_vlan.splitlines()
     for line in lines:
       match = re.search(r'^(\d+)\s', line)
       if match:
-        # vlan id is stored as int
-        vlans.add(int(match.group(1)))
-
-    return sorted(list(vlans))
-
-
-  @staticmethod
-  def parse_show_interfaces_switchport(show_interfaces_switchport):
-    # インタフェースごとに分割したリストを返す
-
+        vlan_id = int(match.group(1))
+        if vlan_id <= MAX_VLAN_ID:
+          vlans.append(vlan_id)
+
+    return VlanSet(vlans)
+
+
+  # show interfaces switchportの'項目: 値' -> (パラメータ名, 値の変換)
+  SWITCHPORT_FIELDS = {
+    'Switchport': ('switchport', lambda v: v),
+    # 'dynamic auto'のような値は最後の単語を使う
+    'Administrative Mode': ('mode', lambda v: v.rsplit(' ', 1)[-1]),
+    # '1 (default)'のような値は先頭の数字を使う
+    'Access Mode VLAN': ('access_vlan', lambda v: v.split(' ', 1)[0]),
+    'Trunking Native Mode VLAN': ('native_vlan', lambda v: v.split(' ', 1)[0]),
+    'Trunking VLANs Enabled': ('trunk_vlans', lambda v: v),
+    # negotiationはboolに変換
+    'Negotiation of Trunking': ('nonegotiate', lambda v: v == 'Off')
+  }
+
+  # 長いVLANのリストは折り返されて、次の行に数字とカンマだけが続く
+  RE_VLAN_CONTINUATION = re.compile(r'^\s*[\d,-]+$')
+
+  @classmethod
+  def iter_show_interfaces_switchport(cls, show_interfaces_switchport):
+    """show interfaces switchportの出力を1行ずつ読んで、インタフェースごとにdictを返す"""
     if not show_interfaces_switchport:
-      return []
+      return
 
-    results = []
-    sections = []
-    lines = show_interfaces_switchport.splitlines()
-    for line in lines:
-      if line.strip() == '':
+    if isinstance(show_interfaces_switchport, str):
+      show_interfaces_switchport = show_interfaces_switchport.splitlines()
+
+    fields = cls.SWITCHPORT_FIELDS
+    continuation = cls.RE_VLAN_CONTINUATION
+
+    obj = None
+    # 折り返しを受け付ける直前の項目
+    wrapped = None
+    for line in show_interfaces_switchport:
+      key, sep, value = line.partition(': ')
+      if not sep:
+        # 'Trunking VLANs Enabled: 1,3,5,...,'の続きの行
+        if wrapped and continuation.match(line):
+          obj[wrapped] += line.strip()
+        else:
+          wrapped = None
         continue
 
-      match = re.search(r'^Name:', line)
-      if match:
-        if sections:
-          section = '\n'.join(sections)
-          results.append(section)
-          sections = []
-      sections.append(line)
+      wrapped = None
+
+      # 対象外の項目が大半なので、先に項目名で振り分ける
+      field = fields.get(key)
+      if field is None:
+        key = key.strip()
+        if key != 'Name':
+          field = fields.get(key)
+          if field is None:
+            continue
+
+      if key == 'Name':
+        if obj:
+          yield obj
+        obj = {
+          'name': value.strip(),
+          'mode': None,
+          'switchport': None,
+          'nonegotiate': None,  # bool
+          'access_vlan': None,
+          'native_vlan': None,
+          'trunk_vlans': None
+        }
+        continue
+
+      if obj is None:
+        continue
 
-    if sections:
-      section = '\n'.join(sections)
-      results.append(section)
+      param, converter = field
+      obj[param] = converter(value.strip())
+      if param == 'trunk_vlans':
+        wrapped = param
 
-    return results
+    if obj:
+      yield obj
 
 
   def map_show_interfaces_switchport_to_obj(self, show_interfaces_switchport):
-    if not show_interfaces_switchport:
-      return list()
-
     results = []
-
-    sections = self.parse_show_interfaces_switchport(show_interfaces_switchport)
-    for section in sections:
-
+    for obj in self.iter_show_interfaces_switchport(show_interfaces_switchport):
       # show interface switchportの出力ではインタフェース名が省略語になっているので変換する
       # Gi0/1 -> GigabitEthernet0/1
-      m = re.search(r'Name: (.*)$', section, re.M)
-      if m:
-        name = m.group(1)
-        name = self.normalize_name(name)
-      else:
-        continue
-
-      m = re.search(r'Administrative Mode: (?:.* )?(\w+)$', section, re.M)
-      if m:
-        mode = m.group(1)
-
-      m = re.search(r'Switchport: (\S+)$', section, re.M)
-      if m:
-        switchport = m.group(1)
-
-      m = re.search(r'Access Mode VLAN: (\d+)', section)
-      if m:
-        access = m.group(1)
-
-      m = re.search(r'Trunking Native Mode VLAN: (\d+)', section)
-      if m:
-        native = m.group(1)
-
-      m = re.search(r'Trunking VLANs Enabled: (.+)$', section, re.M)
-      if m:
-        trunk = m.group(1)
-
-      # negotiationはboolに変換
-      m = re.search(r'Negotiation of Trunking: (\S+)$', section, re.M)
-      if m:
-        negotiation = m.group(1)
-        nonegotiate = bool(negotiation == 'Off')
-
-      results.append({
-        'name': name,
-        'mode': mode,
-        'switchport': switchport,
-        'nonegotiate': nonegotiate,  # bool
-        'access_vlan': access,
-        'native_vlan': native,
-        'trunk_vlans': trunk
-      })
+      obj['name'] = self.normalize_name(obj['name'])
+      results.append(obj)
 
       # {
       #     "access_vlan": "2",
       #     "mode": "access",
       #     "name": "GigabitEthernet0/1",
       #     "native_vlan": "1",
-      #     "negotiation": "False",
+      #     "nonegotiate": false,
       #     "switchport": "Enabled",
       #     "trunk_vlans": "1-4094"
       # },
@@ -290,19 +215,14 @@ class ActionModule(_ActionModule):
     # ほとんどの情報はshow interfaces switchportから読み取るので、
     # running-configはチャネルが設定されているかどうか、しか見ない
 
-    match = re.findall(r'^interface (\S+)', config, re.M)
-
-    configobj = NetworkConfig(indent=1, contents=config)
-
-    for item in set(match):
-      # 'channel-group'で始まるコマンドのオプションを取り出す。コマンドがなければNone
-      channel_group = self.parse_config_argument(configobj, item, 'channel-group')
+    index = PARSE_CACHE.get_index(config)
 
-      obj = {
-        'name': item,
-        'channel_group': channel_group,
-        'state': 'present'
-      }
+    for item in index.find('interface'):
+      # 'channel-group'で始まるコマンドのオプションは読まれたときに取り出す。コマンドがなければNone
+      obj = LazyHave(
+        {'name': item, 'state': 'present'},
+        functools.partial(self.CONFIG_ATTRIBUTES.match_one, index.children('interface {}'.format(item))),
+        ('channel_group',))
       results.append(obj)
 
     return results
@@ -404,8 +324,8 @@ class ActionModule(_ActionModule):
     # trunk_vlans
     want_trunk_vlans = self.get_value(want, 'trunk_vlans')
     have_trunk_vlans = self.get_value(have, 'trunk_vlans')
-    want_trunk_list = self.vlan_str_to_list(want_trunk_vlans)
-    have_trunk_list = self.vlan_str_to_list(have_trunk_vlans)
+    want_trunk_set = VlanSet.parse(want_trunk_vlans)
+    have_trunk_set = VlanSet.parse(have_trunk_vlans)
 
     # (0) want, have = None, 2-3     --> do nothing
     # (1) want, have = '', 2-3       --> no switchport trunk allowed vlan
@@ -429,9 +349,8 @@ class ActionModule(_ActionModule):
       cmds.append('no switchport trunk allowed vlan')
     else:
       # (4)
-      vlans_to_del = set(want_trunk_list).intersection(have_trunk_list)
+      vlans_to_del = want_trunk_set & have_trunk_set
       if vlans_to_del:
-        vlans_to_del = self.vlan_list_to_str(vlans_to_del)
         cmd = 'switchport trunk allowed vlan remove {0}'.format(vlans_to_del)
         cmds.append(cmd)
 
@@ -500,8 +419,8 @@ class ActionModule(_ActionModule):
     # switchport trunk allowed vlan
     want_trunk_vlans = self.get_value(want, 'trunk_vlans')
     have_trunk_vlans = self.get_value(have, 'trunk_vlans')
-    want_trunk_list = self.vlan_str_to_list(want_trunk_vlans)
-    have_trunk_list = self.vlan_str_to_list(have_trunk_vlans)
+    want_trunk_set = VlanSet.parse(want_trunk_vlans)
+    have_trunk_set = VlanSet.parse(have_trunk_vlans)
 
     # (0) want, have = None, 2-3     --> do nothing
     # (1) want, have = '', 2-3       --> no switchport trunk allowed vlan
@@ -516,7 +435,7 @@ class ActionModule(_ActionModule):
       # (1)
       if have_trunk_vlans != 'ALL':
         cmds.append('no switchport trunk allowed vlan')
-    elif want_trunk_list != have_trunk_list:
+    elif want_trunk_set != have_trunk_set:
       if want_trunk_vlans == 'ALL':
         # (2)
         cmds.append('no switchport trunk allowed vlan')
@@ -526,13 +445,11 @@ class ActionModule(_ActionModule):
           cmds.append('switchport trunk allowed vlan {0}'.format(want_trunk_vlans))
         else:
           # (4)
-          vlans_to_add = set(want_trunk_list).difference(have_trunk_list)
+          vlans_to_add = want_trunk_set - have_trunk_set
           if vlans_to_add:
-            vlans_to_add = self.vlan_list_to_str(vlans_to_add)
             cmds.append('switchport trunk allowed vlan add {0}'.format(vlans_to_add))
-          vlans_to_del = set(have_trunk_list).difference(want_trunk_list)
+          vlans_to_del = have_trunk_set - want_trunk_set
           if vlans_to_del:
-            vlans_to_del = self.vlan_list_to_str(vlans_to_del)
             cmds.append('switchport trunk allowed vlan remove {0}'.format(vlans_to_del))
 
     # switchport trunk native vlan
@@ -597,9 +514,12 @@ class ActionModule(_ActionModule):
   def to_commands_list(self, want_list, have_list):
     commands = []
 
+    # インタフェース名で引けるようにしておく
+    have_index = index_obj_list(have_list, lambda o: o.get('name'))
+
     for want in want_list:
       name = want.get('name')
-      have = self.search_obj_in_list(name, have_list)
+      have = have_index.get(name)
       # 対象となるインタフェースが存在するときだけ実行
       if have:
         cmds = self.to_commands(want, have)
@@ -661,6 +581,9 @@ class ActionModule(_ActionModule):
     if not have_list:
       return 'failed to investigate existing interfaces.'
 
+    # インタフェース名で引けるようにしておく
+    have_index = index_obj_list(have_list, lambda o: o.get('name'))
+
     for want in want_list:
 
       # nameが省略表記されていても大丈夫なように正規化する
@@ -671,12 +594,18 @@ class ActionModule(_ActionModule):
         want['name'] = norm_name
         name = norm_name
 
+      # trunk_vlansはpresentでもabsentでも範囲表記を読み込むので、ここで確かめておく
+      try:
+        VlanSet.parse(want.get('trunk_vlans'))
+      except ValueError as e:
+        return 'invalid vlan in trunk_vlans, {}'.format(to_text(e))
+
       state = want.get('state')
       # presentのときのみ検証する
       if state != 'present':
         continue
 
-      have = self.search_obj_in_list(name, have_list)
+      have = have_index.get(name)
       if have:
         msg = self.validate(want, have, vlan_list)
         if msg:
@@ -704,6 +633,15 @@ class ActionModule(_ActionModule):
     if not os.path.exists(source):
       raise ValueError('path specified in src not found')
 
+    # template: falseのときはJinja2を通さずにそのまま読み込む
+    # モジュールに転送しないように、中身はモジュールを実行した後で引数に展開する
+    if not boolean(self._task.args.get('template', True), strict=False):
+      try:
+        self._raw_contents[key_path] = read_raw(source)
+      except (IOError, OSError):
+        raise ValueError('unable to load file, {}'.format(src))
+      return
+
     try:
       with open(source, 'r') as f:
         template_data = to_text(f.read())
@@ -722,23 +660,42 @@ class ActionModule(_ActionModule):
             searchpath.append(role._role_path)
     searchpath.append(os.path.dirname(source))
     self._templar.environment.loader.searchpath = searchpath
-    self._task.args[key_path] = self._templar.template(template_data)
+
+    # テンプレートの記号がなければJinja2を通さず、テンプレートならコンパイル結果を使い回す
+    self._task.args[key_path] = render_template(
+      self._templar, source, template_data, cache_dir=self._task.args.get('cache_dir'))
 
 
   def run(self, tmp=None, task_vars=None):
     del tmp  # tmp no longer has any effect
 
+    # profile: trueのときはフェーズごとの所要時間と件数を記録する
+    timer = phase_timer(boolean(self._task.args.get('profile', False), strict=False))
+
     # ファイルへのパスを指定されていたらファイルの中身に展開する
+    self._raw_contents = {}
     try:
       self._handle_template('running_config_path')
       self._handle_template('show_vlan_path')
       self._handle_template('show_interfaces_switchport_path')
     except ValueError as e:
       return dict(failed=True, msg=to_text(e))
+    timer.lap('template')
 
     # モジュールを実行する
     # ただし、このモジュールは何もしない
-    result = super(ActionModule, self).run(task_vars=task_vars)
+    # controller_onlyのときはモジュールを転送せず、引数の検査だけをここで行う
+    if boolean(self._task.args.get('controller_only', False), strict=False):
+      msg = validate_args(self._task.action, self._task.args, **get_module_spec())
+      if msg:
+        return dict(failed=True, msg=msg)
+      result = dict(changed=False)
+    else:
+      result = super(ActionModule, self).run(task_vars=task_vars)
+
+    # template: falseで読み込んだファイルの中身を引数に展開する
+    self._task.args.update(self._raw_contents)
+    timer.lap('module')
 
     #
     # モジュール実行後の後工程処理
@@ -746,19 +703,35 @@ class ActionModule(_ActionModule):
 
     # モジュールに渡されたパラメータ情報をオブジェクトにする
     want_list = self.map_params_to_obj()
+    timer.lap('map_params_to_obj')
     if self._task.args.get('debug'):
       result['want'] = want_list
 
     # コンフィグ情報をオブジェクトにしてhave_listにする
-    if self._task.args.get('running_config_path'):
-      config = self._task.args.get('running_config_path')
+    # snapshot_pathが指定されていたら、ios_config_snapshotでパース済みのhave_listを使う
+    if self._task.args.get('snapshot_path'):
+      try:
+        have_list, cache_stats = get_snapshot_have_list(
+          self._loader.path_dwim(self._task.args.get('snapshot_path')), 'ios_interface_trunk', self.map_config_to_obj,
+          version=self.parser_version)
+      except SnapshotError as e:
+        return dict(failed=True, msg=to_text(e))
     else:
-      config = self._task.args.get('running_config')
+      if self._task.args.get('running_config_path'):
+        config = self._task.args.get('running_config_path')
+      else:
+        config = self._task.args.get('running_config')
 
-    if not config:
-      return dict(failed=True, msg="running_config is required but not set")
+      if not config:
+        return dict(failed=True, msg="running_config is required but not set")
 
-    have_list = self.map_config_to_obj(config)
+      # パース結果はキャッシュを使い回す(cache_dirがあればディスクにも保存する)
+      have_list, cache_stats = get_have_list(
+        'ios_interface_trunk', config, self.map_config_to_obj,
+        cache_dir=self._task.args.get('cache_dir'), version=self.parser_version)
+    timer.lap('map_config_to_obj')
+    if self._task.args.get('debug'):
+      result['parse_cache'] = cache_stats
 
     # show interfaces switchportの出力をオブジェクトにしてswitchport_listにする
     if self._task.args.get('show_interfaces_switchport_path'):
@@ -772,13 +745,15 @@ class ActionModule(_ActionModule):
     switchport_list = self.map_show_interfaces_switchport_to_obj(show_interfaces_switchport)
 
     # switchport_listの情報をhave_listに追加する
+    switchport_index = index_obj_list(switchport_list, lambda o: o.get('name'))
     for item in have_list:
-      o = self.search_obj_in_list(item.get('name'), switchport_list)
+      o = switchport_index.get(item.get('name'))
       if o:
         item.update(o)
+    timer.lap('map_show_interfaces_switchport_to_obj')
 
     if self._task.args.get('debug'):
-      result['have'] = have_list
+      result['have'] = materialize(have_list)
 
     # show vlan briefの情報をオブジェクトにしてvlan_listにする
     if self._task.args.get('show_vlan_path'):
@@ -787,8 +762,9 @@ class ActionModule(_ActionModule):
       show_vlan = self._task.args.get('show_vlan')
 
     vlan_list = self.map_show_vlan_to_obj(show_vlan)
+    timer.lap('map_show_vlan_to_obj')
     if self._task.args.get('debug'):
-      result['vlan_list'] = vlan_list
+      result['vlan_list'] = list(vlan_list)
 
     #
     # ここまでの処理でhave_list, want_list, vlan_listが出揃った
@@ -799,15 +775,23 @@ class ActionModule(_ActionModule):
     #
 
     msg = self.validate_list(want_list, have_list, vlan_list)
+    timer.lap('validate')
     if msg:
       result['msg'] = msg
       result['failed'] = True
+      return timer.update_result(result)
 
     #
     # 差分のコンフィグを作成する
     #
 
     commands = self.to_commands_list(want_list, have_list)
+    timer.lap('to_commands_list')
     result['commands'] = commands
 
-    return result
+    timer.count_config(self._task.args.get('running_config_path') or self._task.args.get('running_config'))
+    timer.count('switchports', len(switchport_list))
+    timer.count('haves', len(have_list))
+    timer.count('wants', len(want_list))
+    timer.count('commands', len(commands))
+    return timer.update_result(result)
@@ -6,10 +6,17 @@ __metaclass__ = type
 
 import os
 import re
+from bisect import bisect_left
 
 from ansible.plugins.action.normal import ActionModule as _ActionModule
 from ansible.module_utils._text import to_text
 from ansible.module_utils.six.moves.urllib.parse import urlsplit
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible_collections.iida.local.plugins.module_utils.path_loader import read_raw
+from ansible_collections.iida.local.plugins.module_utils.profiler import phase_timer
+from ansible_collections.iida.local.plugins.module_utils.template_cache import render_template
+from ansible_collections.iida.local.plugins.module_utils.validation import validate_args
+from ansible_collections.iida.local.plugins.modules.ios_ip_acl import get_module_spec
 
 try:
   # pylint: disable=unused-import
@@ -109,6 +116,124 @@ class ActionModule(_ActionModule):
     return False
 
 
+  # show access-listsの出力にだけ付く装飾
+  RE_WILDCARD_BITS = re.compile(', wildcard bits')
+  RE_MATCHES = re.compile(' [(].{9,30}[)]')
+
+  # IOSのシーケンス番号の上限
+  MAX_SEQ = 2147483647
+
+  @classmethod
+  def parse_show_lines(cls, lines):
+    """show access-listsの出力を(シーケンス番号, 本体)のリストにする"""
+    entries = []
+    for line in lines:
+      line = cls.RE_WILDCARD_BITS.sub('', line)
+      line = cls.RE_MATCHES.sub('', line)
+      seq, _, body = line.partition(' ')
+      if seq.isdigit() and body:
+        entries.append((int(seq), body.strip()))
+      else:
+        # シーケンス番号がない行は位置を決められないので常に削除対象
+        entries.append((None, line))
+    return entries
+
+
+  @staticmethod
+  def longest_increasing(positions):
+    """positionsの最長増加部分列をなすインデックスの集合を返す O(N log N)"""
+    # ACEの本体は重複しないので、LCSは既存側の位置の最長増加部分列に帰着できる
+    tails = []
+    tails_index = []
+    prev = [-1] * len(positions)
+    for i, pos in enumerate(positions):
+      k = bisect_left(tails, pos)
+      if k == len(tails):
+        tails.append(pos)
+        tails_index.append(i)
+      else:
+        tails[k] = pos
+        tails_index[k] = i
+      prev[i] = tails_index[k - 1] if k > 0 else -1
+
+    result = set()
+    i = tails_index[-1] if tails_index else -1
+    while i >= 0:
+      result.add(i)
+      i = prev[i]
+    return result
+
+
+  @classmethod
+  def allocate_seq(cls, lo, hi, count):
+    """loとhiの間にcount個のシーケンス番号を割り当てる、入りきらなければNone"""
+    upper = cls.MAX_SEQ + 1 if hi is None else hi
+    if upper - lo - 1 < count:
+      return None
+    step = min(10, (upper - lo) // (count + 1))
+    return [lo + step * (i + 1) for i in range(count)]
+
+
+  @classmethod
+  def edit_script(cls, have_entries, want_bodies):
+    """既存のシーケンス番号を残したまま、最小限の削除と追加のコマンドを作る"""
+    # 本体 -> 既存側の位置、重複した本体は2つ目以降を削除する
+    have_pos = {}
+    removed = set()
+    for i, (seq, body) in enumerate(have_entries):
+      if seq is None or body in have_pos:
+        removed.add(i)
+      else:
+        have_pos[body] = i
+
+    # 希望側の重複は最初のものだけを使う
+    seen = set()
+    wants = []
+    for body in want_bodies:
+      body = body.strip()
+      if body and body not in seen:
+        seen.add(body)
+        wants.append(body)
+
+    # 両方にある本体の、既存側の位置を希望の順に並べる
+    common = [(w, have_pos[body]) for w, body in enumerate(wants) if body in have_pos]
+    kept = cls.longest_increasing([pos for _, pos in common])
+
+    # 動かさずに残すもの 希望側の位置 -> 既存側の位置
+    anchors = dict(common[i] for i in kept)
+    kept_have = set(anchors.values())
+    removed.update(i for i in range(len(have_entries)) if i not in kept_have)
+
+    # 残すもの同士の間に追加分を割り当てる
+    # 隙間が足りなければ次の残すものも削除して入れ直し、隙間を広げる
+    added = []
+    pending = []
+    lo = 0
+    for w, body in enumerate(wants + [None]):
+      if body is not None and w not in anchors:
+        pending.append(body)
+        continue
+
+      hi = None if body is None else have_entries[anchors[w]][0]
+      if pending:
+        seqs = cls.allocate_seq(lo, hi, len(pending))
+        if seqs is None:
+          removed.add(anchors[w])
+          pending.append(body)
+          continue
+        added.extend(zip(seqs, pending))
+        pending = []
+      lo = hi
+
+    commands = []
+    for i in sorted(removed):
+      seq, body = have_entries[i]
+      commands.append('no ' + body if seq is None else 'no {} {}'.format(seq, body))
+    for seq, body in added:
+      commands.append('{} {}'.format(seq, body))
+    return commands
+
+
   def _handle_template(self, key_path):
     # pylint: disable=W0212
     if not self._task.args.get(key_path):
@@ -130,6 +255,15 @@ class ActionModule(_ActionModule):
     if not os.path.exists(source):
       raise ValueError('path specified in src not found')
 
+    # template: falseのときはJinja2を通さずにそのまま読み込む
+    # モジュールに転送しないように、中身はモジュールを実行した後で引数に展開する
+    if not boolean(self._task.args.get('template', True), strict=False):
+      try:
+        self._raw_contents[key_path] = read_raw(source)
+      except (IOError, OSError):
+        raise ValueError('unable to load file, {}'.format(src))
+      return
+
     try:
       with open(source, 'r') as f:
         template_data = to_text(f.read())
@@ -148,21 +282,40 @@ class ActionModule(_ActionModule):
             searchpath.append(role._role_path)
     searchpath.append(os.path.dirname(source))
     self._templar.environment.loader.searchpath = searchpath
-    self._task.args[key_path] = self._templar.template(template_data)
+
+    # テンプレートの記号がなければJinja2を通さず、テンプレートならコンパイル結果を使い回す
+    self._task.args[key_path] = render_template(
+      self._templar, source, template_data, cache_dir=self._task.args.get('cache_dir'))
 
 
   def run(self, tmp=None, task_vars=None):
     del tmp  # tmp no longer has any effect
 
+    # profile: trueのときはフェーズごとの所要時間と件数を記録する
+    timer = phase_timer(boolean(self._task.args.get('profile', False), strict=False))
+
     # ファイルへのパスを指定されていたらファイルの中身に展開する
+    self._raw_contents = {}
     try:
       self._handle_template('show_access_list_path')
     except ValueError as e:
       return dict(failed=True, msg=to_text(e))
+    timer.lap('template')
 
     # モジュールを実行する
     # ただし、このモジュールは何もしない
-    result = super(ActionModule, self).run(task_vars=task_vars)
+    # controller_onlyのときはモジュールを転送せず、引数の検査だけをここで行う
+    if boolean(self._task.args.get('controller_only', False), strict=False):
+      msg = validate_args(self._task.action, self._task.args, **get_module_spec())
+      if msg:
+        return dict(failed=True, msg=msg)
+      result = dict(changed=False)
+    else:
+      result = super(ActionModule, self).run(task_vars=task_vars)
+
+    # template: falseで読み込んだファイルの中身を引数に展開する
+    self._task.args.update(self._raw_contents)
+    timer.lap('module')
 
     #
     # モジュール実行後の後工程処理
@@ -176,33 +329,24 @@ class ActionModule(_ActionModule):
 
     # remove white space
     show_access_list_lines = self.sanitize(show_access_list.splitlines())
+    timer.lap('map_config_to_obj')
 
     acl_cli = self._task.args.get('acl_cli')
     if self.check_remark(acl_cli):
       result['failed'] = True
       result['msg'] = 'remark line detected in acl_cli.\n{}'.format(acl_cli)
-      return result
-
-    # access list commands to be pushed
-    commands = []
+      return timer.update_result(result)
+    timer.lap('validate')
 
-    # create new config with sequence number
-    acl_seq_lines = []
-    for i, line in enumerate(acl_cli):
-      acl_seq_lines.append(str((i+1)*10) + ' ' + line)
-
-    # delete acl if not match
-    for line in show_access_list_lines:
-      line = re.sub(', wildcard bits', '', line)
-      line = re.sub(' [(].{9,30}[)]', '', line)
-      if line not in acl_seq_lines:
-        commands.append('no ' + line)
-
-    # add acl if not match
-    for line in acl_seq_lines:
-      if line not in show_access_list_lines:
-        commands.append(line)
+    # 本体(シーケンス番号を除いた部分)で突き合わせて、変更した分だけのコマンドを作る
+    have_entries = self.parse_show_lines(show_access_list_lines)
+    timer.lap('map_config_to_obj')
+    commands = self.edit_script(have_entries, acl_cli)
+    timer.lap('to_commands_list')
 
     result['commands'] = commands
 
-    return result
+    timer.count('haves', len(have_entries))
+    timer.count('wants', len(acl_cli))
+    timer.count('commands', len(commands))
+    return timer.update_result(result)
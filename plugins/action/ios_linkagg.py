@@ -10,7 +10,16 @@ import re
 from ansible.plugins.action.normal import ActionModule as _ActionModule
 from ansible.module_utils._text import to_text
 from ansible.module_utils.six.moves.urllib.parse import urlsplit
-from ansible.module_utils.network.common.config import NetworkConfig
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible_collections.iida.local.plugins.module_utils.attribute_matcher import AttributeMatcher
+from ansible_collections.iida.local.plugins.module_utils.obj_index import index_obj_list
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import PARSE_CACHE, get_have_list
+from ansible_collections.iida.local.plugins.module_utils.path_loader import read_raw
+from ansible_collections.iida.local.plugins.module_utils.profiler import phase_timer
+from ansible_collections.iida.local.plugins.module_utils.snapshot import SnapshotError, get_snapshot_have_list
+from ansible_collections.iida.local.plugins.module_utils.template_cache import render_template
+from ansible_collections.iida.local.plugins.module_utils.validation import validate_args
+from ansible_collections.iida.local.plugins.modules.ios_linkagg import get_module_spec
 
 try:
   # pylint: disable=unused-import
@@ -25,14 +34,13 @@ class ActionModule(_ActionModule):
 
   supported_params = ('group', 'mode', 'members')
 
+  # パース処理を変更したら上げる(ディスクキャッシュのキーに使う)
+  parser_version = 2
 
-  @staticmethod
-  def search_obj_in_list(want, have_list):
-    want_group = want.get('group')
-    for have in have_list:
-      if have.get('group') == want_group:
-        return have
-    return None
+  # running-configの子の行 -> パラメータ
+  CONFIG_ATTRIBUTES = AttributeMatcher([
+    ('channel-group', 'channel_group', 'rest')
+  ])
 
 
   @staticmethod
@@ -137,34 +145,48 @@ class ActionModule(_ActionModule):
 
   def map_config_to_obj(self, config):
 
-    configobj = NetworkConfig(indent=1, contents=config)
+    index = PARSE_CACHE.get_index(config)
+    intf_names = index.find('interface')
 
     # interface port-channel xxx を探す
-    match = re.findall(r'^interface Port-channel(\S+)', config, re.M)
+    match = [name[len('Port-channel'):] for name in intf_names if name.startswith('Port-channel')]
     if not match:
       return list()
 
+    # 全インタフェースを一度だけ走査して
+    # チャネルグループ番号 -> [(メンバー, モード), ...] の対応表を作る
+    channel_groups = {}
+    for intf_name in intf_names:
+      attrs = self.CONFIG_ATTRIBUTES.match(index.children('interface {}'.format(intf_name)))
+      channel_group = attrs.get('channel_group')
+      if not channel_group:
+        continue
+
+      # channel-group 1 mode active
+      tokens = channel_group.split()
+      if len(tokens) < 3 or tokens[1] != 'mode':
+        continue
+      channel_groups.setdefault(tokens[0], []).append((intf_name, tokens[2]))
+
     results = []
-    for po_number in set(match):
+    for po_number in match:
       obj = {}
       obj['state'] = 'present'
       obj['group'] = po_number
 
-      # channel-group xxx を設定しているインタフェースを捕まえる
-      members = []
-      mode = None
-      match = re.findall(r'^interface (\S+)', config, re.M)
-      if match:
-        for intf_name in set(match):
-          cfg = configobj['interface {}'.format(intf_name)]
-          cfg = '\n'.join(cfg.children)
-          m = re.search(r'^channel-group {} mode (\S+)'.format(po_number), cfg, re.M)
-          if m:
-            members.append(intf_name)
-            mode = m.group(1)
+      members = channel_groups.get(po_number, [])
+      modes = set(mode for _, mode in members)
 
-      obj['mode'] = mode
-      obj['members'] = members
+      # メンバーのモードが揃っていない場合はモードをNoneにする
+      # wantのモードと一致しなくなるので、全メンバーが作り直される
+      if len(modes) == 1:
+        obj['mode'] = modes.pop()
+      else:
+        obj['mode'] = None
+        if modes:
+          obj['mismatched_modes'] = dict(members)
+
+      obj['members'] = [name for name, _ in members]
 
       results.append(obj)
 
@@ -330,12 +352,12 @@ class ActionModule(_ActionModule):
     return commands
 
 
-  def to_commands(self, want, have_list):
+  def to_commands(self, want, have_index):
 
     commands = []
 
     state = want.get('state')
-    have = self.search_obj_in_list(want, have_list)
+    have = have_index.get(want.get('group'))
 
     if state == 'absent':
       # haveが存在するときのみ実行
@@ -356,8 +378,11 @@ class ActionModule(_ActionModule):
   def to_commands_list(self, want_list, have_list):
     commands = []
 
+    # チャネルグループ番号で引けるようにしておく
+    have_index = index_obj_list(have_list, lambda o: o.get('group'))
+
     for want in want_list:
-      cmds = self.to_commands(want, have_list)
+      cmds = self.to_commands(want, have_index)
       if cmds:
         commands.extend(cmds)
 
@@ -385,6 +410,15 @@ class ActionModule(_ActionModule):
     if not os.path.exists(source):
       raise ValueError('path specified in src not found')
 
+    # template: falseのときはJinja2を通さずにそのまま読み込む
+    # モジュールに転送しないように、中身はモジュールを実行した後で引数に展開する
+    if not boolean(self._task.args.get('template', True), strict=False):
+      try:
+        self._raw_contents[key_path] = read_raw(source)
+      except (IOError, OSError):
+        raise ValueError('unable to load file, {}'.format(src))
+      return
+
     try:
       with open(source, 'r') as f:
         template_data = to_text(f.read())
@@ -403,46 +437,94 @@ class ActionModule(_ActionModule):
             searchpath.append(role._role_path)
     searchpath.append(os.path.dirname(source))
     self._templar.environment.loader.searchpath = searchpath
-    self._task.args[key_path] = self._templar.template(template_data)
+
+    # テンプレートの記号がなければJinja2を通さず、テンプレートならコンパイル結果を使い回す
+    self._task.args[key_path] = render_template(
+      self._templar, source, template_data, cache_dir=self._task.args.get('cache_dir'))
 
 
   def run(self, tmp=None, task_vars=None):
     del tmp  # tmp no longer has any effect
 
+    # profile: trueのときはフェーズごとの所要時間と件数を記録する
+    timer = phase_timer(boolean(self._task.args.get('profile', False), strict=False))
+
     # ファイルへのパスを指定されていたらファイルの中身に展開する
+    self._raw_contents = {}
     try:
       self._handle_template('running_config_path')
     except ValueError as e:
       return dict(failed=True, msg=to_text(e))
+    timer.lap('template')
 
     # モジュールを実行する
     # ただし、このモジュールは何もしない
-    result = super(ActionModule, self).run(task_vars=task_vars)
+    # controller_onlyのときはモジュールを転送せず、引数の検査だけをここで行う
+    if boolean(self._task.args.get('controller_only', False), strict=False):
+      msg = validate_args(self._task.action, self._task.args, **get_module_spec())
+      if msg:
+        return dict(failed=True, msg=msg)
+      result = dict(changed=False)
+    else:
+      result = super(ActionModule, self).run(task_vars=task_vars)
+
+    # template: falseで読み込んだファイルの中身を引数に展開する
+    self._task.args.update(self._raw_contents)
+    timer.lap('module')
 
     #
     # モジュール実行後の後工程処理
     #
 
-    if self._task.args.get('running_config_path'):
-      config = self._task.args.get('running_config_path')
+    # snapshot_pathが指定されていたら、ios_config_snapshotでパース済みのhave_listを使う
+    if self._task.args.get('snapshot_path'):
+      try:
+        have_list, cache_stats = get_snapshot_have_list(
+          self._loader.path_dwim(self._task.args.get('snapshot_path')), 'ios_linkagg', self.map_config_to_obj,
+          version=self.parser_version)
+      except SnapshotError as e:
+        return dict(failed=True, msg=to_text(e))
     else:
-      config = self._task.args.get('running_config')
-
-    have_list = self.map_config_to_obj(config)
+      if self._task.args.get('running_config_path'):
+        config = self._task.args.get('running_config_path')
+      else:
+        config = self._task.args.get('running_config')
+
+      # パース結果はキャッシュを使い回す(cache_dirがあればディスクにも保存する)
+      have_list, cache_stats = get_have_list(
+        'ios_linkagg', config, self.map_config_to_obj,
+        cache_dir=self._task.args.get('cache_dir'), version=self.parser_version)
+    timer.lap('map_config_to_obj')
     if self._task.args.get('debug'):
       result['have'] = have_list
+      result['parse_cache'] = cache_stats
+
+    # メンバーごとにモードが異なるチャネルグループは警告する
+    for have in have_list:
+      mismatched_modes = have.get('mismatched_modes')
+      if mismatched_modes:
+        result.setdefault('warnings', []).append(
+          'channel-group {} has members with different modes: {}'.format(
+            have.get('group'), ', '.join('{} {}'.format(k, v) for k, v in sorted(mismatched_modes.items()))))
 
     want_list = self.map_params_to_obj()
+    timer.lap('map_params_to_obj')
     if self._task.args.get('debug'):
       result['want'] = want_list
 
     msg = self.validate(want_list)
+    timer.lap('validate')
     if msg:
       result['failed'] = True
       result['msg'] = msg
-      return result
+      return timer.update_result(result)
 
     commands = self.to_commands_list(want_list=want_list, have_list=have_list)
+    timer.lap('to_commands_list')
 
     result['commands'] = commands
-    return result
+    timer.count_config(self._task.args.get('running_config_path') or self._task.args.get('running_config'))
+    timer.count('haves', len(have_list))
+    timer.count('wants', len(want_list))
+    timer.count('commands', len(commands))
+    return timer.update_result(result)
@@ -10,6 +10,14 @@ import re
 from ansible.plugins.action.normal import ActionModule as _ActionModule
 from ansible.module_utils._text import to_text
 from ansible.module_utils.six.moves.urllib.parse import urlsplit
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import PARSE_CACHE, get_have_list
+from ansible_collections.iida.local.plugins.module_utils.path_loader import read_raw
+from ansible_collections.iida.local.plugins.module_utils.profiler import phase_timer
+from ansible_collections.iida.local.plugins.module_utils.snapshot import SnapshotError, get_snapshot_have_list
+from ansible_collections.iida.local.plugins.module_utils.template_cache import render_template
+from ansible_collections.iida.local.plugins.module_utils.validation import validate_args
+from ansible_collections.iida.local.plugins.modules.ios_static_route import get_module_spec
 
 try:
   # pylint: disable=unused-import
@@ -30,6 +38,9 @@ class ActionModule(_ActionModule):
 
   supported_params = ['vrf', 'prefix', 'netmask', 'nh_intf', 'nh_addr', 'dhcp', 'ad', 'tag', 'permanent', 'name', 'track']
 
+  # パース処理を変更したら上げる(ディスクキャッシュのキーに使う)
+  parser_version = 1
+
   # The order of regex is very important.
   #
   # example
@@ -62,6 +73,8 @@ class ActionModule(_ActionModule):
 
   RE_IP_ROUTE = re.compile(IP_ROUTE, re.VERBOSE)
 
+  RE_LEADING_ZERO = re.compile(r'(?:^|\.)0\d')
+
   # pylint: disable=C0301
   _IPV6_REGEX_STR_COMPRESSED1 = r"""(?!:::\S+?$)(?P<addr1>(?P<opt1_1>{0}(?::{0}){{7}})|(?P<opt1_2>(?:{0}:){{1}}(?::{0}){{1,6}})|(?P<opt1_3>(?:{0}:){{2}}(?::{0}){{1,5}})|(?P<opt1_4>(?:{0}:){{3}}(?::{0}){{1,4}})|(?P<opt1_5>(?:{0}:){{4}}(?::{0}){{1,3}})|(?P<opt1_6>(?:{0}:){{5}}(?::{0}){{1,2}})|(?P<opt1_7>(?:{0}:){{6}}(?::{0}){{1,1}})|(?P<opt1_8>:(?::{0}){{1,7}})|(?P<opt1_9>(?:{0}:){{1,7}}:)|(?P<opt1_10>(?:::)))""".format(r'[0-9a-fA-F]{1,4}')
   _IPV6_REGEX_STR_COMPRESSED2 = r"""(?!:::\S+?$)(?P<addr2>(?P<opt2_1>{0}(?::{0}){{7}})|(?P<opt2_2>(?:{0}:){{1}}(?::{0}){{1,6}})|(?P<opt2_3>(?:{0}:){{2}}(?::{0}){{1,5}})|(?P<opt2_4>(?:{0}:){{3}}(?::{0}){{1,4}})|(?P<opt2_5>(?:{0}:){{4}}(?::{0}){{1,3}})|(?P<opt2_6>(?:{0}:){{5}}(?::{0}){{1,2}})|(?P<opt2_7>(?:{0}:){{6}}(?::{0}){{1,1}})|(?P<opt2_8>:(?::{0}){{1,7}})|(?P<opt2_9>(?:{0}:){{1,7}}:)|(?P<opt2_10>(?:::)))""".format(r'[0-9a-fA-F]{1,4}')
@@ -232,29 +245,71 @@ class ActionModule(_ActionModule):
             return msg
 
 
-  def search_obj_in_list(self, want, have_list):
-    for have in have_list:
-      if self.equals_to(want, have):
-        return have
-    return None
+  @classmethod
+  def canonical_ipv4(cls, value):
+    if not value:
+      return ''
+    if not isinstance(value, str):
+      value = to_text(value)
+    value = value.strip()
 
+    # ほとんどの場合は先頭に0が付いていないので、そのまま返す
+    if not cls.RE_LEADING_ZERO.search(value):
+      return value
+    try:
+      return '.'.join(str(int(x)) for x in value.split('.'))
+    except ValueError:
+      return value
 
-  def equals_to(self, want, have):
-    # prefix, netmask, nh_intf, nh_addr, ad
 
-    for key in self.supported_params:
-      if want.get(key) != have.get(key):
-        return False
-    return True
+  @staticmethod
+  def canonical_number(value):
+    if value is None or value == '':
+      return ''
+    if not isinstance(value, str):
+      value = to_text(value)
+    value = value.strip()
+    if value.isdigit() and value[0] == '0':
+      return str(int(value))
+    return value
+
+
+  def route_key(self, obj):
+    # 経路を比較するためのキー
+    # (vrf, prefix, netmask, nh_intf, nh_addr, dhcp, ad, tag, permanent, name, track)
+    #
+    # 値の表記の揺れを吸収しておく
+    #   未指定(None)と空文字は同じ
+    #   dhcp, permanentはTrue/False
+    #   数値は先頭の0を取り除く
+    #   adの1はstatic routeの既定値なのでrunning-configには表示されない、未指定と同じにする
+    dhcp = bool(obj.get('dhcp'))
+    ad = self.canonical_number(obj.get('ad'))
+    if ad == '1' and not dhcp:
+      ad = ''
+
+    return (
+      to_text(obj.get('vrf') or ''),
+      self.canonical_ipv4(obj.get('prefix')),
+      self.canonical_ipv4(obj.get('netmask')),
+      to_text(self.normalize_name(obj.get('nh_intf')) or ''),
+      self.canonical_ipv4(obj.get('nh_addr')),
+      dhcp,
+      ad,
+      self.canonical_number(obj.get('tag')),
+      bool(obj.get('permanent')),
+      to_text(obj.get('name') or ''),
+      self.canonical_number(obj.get('track'))
+    )
 
 
   def map_config_to_obj(self, config):
     results = []
-    for line in config.splitlines():
-      if line.startswith('ip route'):
-        obj = self.cli_to_obj(line)
-        if obj:
-          results.append(obj)
+    index = PARSE_CACHE.get_index(config)
+    for line in index.lines('ip route'):
+      obj = self.cli_to_obj(line)
+      if obj:
+        results.append(obj)
     return results
 
 
@@ -367,35 +422,51 @@ class ActionModule(_ActionModule):
     return cmd.strip()
 
 
-  def to_commands(self, want_list, have_list):
-    commands = []
+  def iter_commands(self, want_list, have_list):
 
+    # 経路のキーで引けるようにしておく
+    # 同じキーは先に出てきたものを優先する
+    have_keys = [self.route_key(have) for have in have_list]
+    have_index = {}
+    for key, have in zip(have_keys, have_list):
+      have_index.setdefault(key, have)
+
+    # wantで触れた経路のキー
+    # present/absentのどちらも含む、purgeの対象外になる
+    want_keys = set()
+
+    # 追加と削除はwantの順に出力する
     for want in want_list:
+      key = self.route_key(want)
+      if key in want_keys:
+        continue
+      want_keys.add(key)
+
       state = want.get('state')
-      have = self.search_obj_in_list(want, have_list)
+      have = have_index.get(key)
+
       if state == 'present':
-        if have:
-          # すでにその経路は存在するので何もしない
-          have['action'] = 'keep'
-        else:
-          cli = self.obj_to_cli(want)
-          commands.append(cli)
+        # すでにその経路が存在するなら何もしない
+        if have is None:
+          yield self.obj_to_cli(want)
 
       if state == 'absent':
-        if have:
-          have['action'] = 'delete'
-          commands.append('no {}'.format(have.get('line')))
-        else:
-          # already deleted
-          pass
+        # すでに削除されているなら何もしない
+        if have is not None:
+          yield 'no {}'.format(have.get('line'))
 
+    # purgeする経路はrunning-configの順に出力する
     purge = self._task.args.get('purge', False)
-    for have in have_list:
-      action = have.get('action')
-      if purge and action is None:
-        commands.append('no {}'.format(have.get('line')))
+    if purge:
+      purge_keys = set(have_index).difference(want_keys)
+      for key, have in zip(have_keys, have_list):
+        if key in purge_keys:
+          purge_keys.discard(key)
+          yield 'no {}'.format(have.get('line'))
+
 
-    return commands
+  def to_commands(self, want_list, have_list):
+    return list(self.iter_commands(want_list, have_list))
 
 
   def _handle_template(self, key_path):
@@ -419,6 +490,15 @@ class ActionModule(_ActionModule):
     if not os.path.exists(source):
       raise ValueError('path specified in src not found')
 
+    # template: falseのときはJinja2を通さずにそのまま読み込む
+    # モジュールに転送しないように、中身はモジュールを実行した後で引数に展開する
+    if not boolean(self._task.args.get('template', True), strict=False):
+      try:
+        self._raw_contents[key_path] = read_raw(source)
+      except (IOError, OSError):
+        raise ValueError('unable to load file, {}'.format(src))
+      return
+
     try:
       with open(source, 'r') as f:
         template_data = to_text(f.read())
@@ -437,49 +517,85 @@ class ActionModule(_ActionModule):
             searchpath.append(role._role_path)
     searchpath.append(os.path.dirname(source))
     self._templar.environment.loader.searchpath = searchpath
-    self._task.args[key_path] = self._templar.template(template_data)
+
+    # テンプレートの記号がなければJinja2を通さず、テンプレートならコンパイル結果を使い回す
+    self._task.args[key_path] = render_template(
+      self._templar, source, template_data, cache_dir=self._task.args.get('cache_dir'))
 
 
   def run(self, tmp=None, task_vars=None):
     del tmp  # tmp no longer has any effect
 
+    # profile: trueのときはフェーズごとの所要時間と件数を記録する
+    timer = phase_timer(boolean(self._task.args.get('profile', False), strict=False))
+
     if not HAS_IPADDRESS:
       return dict(failed=True, msg='ipaddress python package is required')
 
     # ファイルへのパスを指定されていたらファイルの中身に展開する
+    self._raw_contents = {}
     try:
       self._handle_template('running_config_path')
     except ValueError as e:
       return dict(failed=True, msg=to_text(e))
+    timer.lap('template')
 
     # モジュールを実行する
     # ただし、このモジュールは何もしない
-    result = super(ActionModule, self).run(task_vars=task_vars)
+    # controller_onlyのときはモジュールを転送せず、引数の検査だけをここで行う
+    if boolean(self._task.args.get('controller_only', False), strict=False):
+      msg = validate_args(self._task.action, self._task.args, **get_module_spec())
+      if msg:
+        return dict(failed=True, msg=msg)
+      result = dict(changed=False)
+    else:
+      result = super(ActionModule, self).run(task_vars=task_vars)
+
+    # template: falseで読み込んだファイルの中身を引数に展開する
+    self._task.args.update(self._raw_contents)
+    timer.lap('module')
 
     #
     # モジュール実行後の後工程処理
     #
 
-    if self._task.args.get('running_config_path'):
-      config = self._task.args.get('running_config_path')
+    # snapshot_pathが指定されていたら、ios_config_snapshotでパース済みのhave_listを使う
+    if self._task.args.get('snapshot_path'):
+      try:
+        have_list, cache_stats = get_snapshot_have_list(
+          self._loader.path_dwim(self._task.args.get('snapshot_path')), 'ios_static_route', self.map_config_to_obj,
+          version=self.parser_version)
+      except SnapshotError as e:
+        return dict(failed=True, msg=to_text(e))
     else:
-      config = self._task.args.get('running_config')
-
-    have_list = self.map_config_to_obj(config)
+      if self._task.args.get('running_config_path'):
+        config = self._task.args.get('running_config_path')
+      else:
+        config = self._task.args.get('running_config')
+
+      # パース結果はキャッシュを使い回す(cache_dirがあればディスクにも保存する)
+      have_list, cache_stats = get_have_list(
+        'ios_static_route', config, self.map_config_to_obj,
+        cache_dir=self._task.args.get('cache_dir'), version=self.parser_version)
+    timer.lap('map_config_to_obj')
     if self._task.args.get('debug'):
       result['have'] = have_list
+      result['parse_cache'] = cache_stats
 
     want_list = self.map_params_to_obj()
+    timer.lap('map_params_to_obj')
     if self._task.args.get('debug'):
       result['want'] = want_list
 
     msg = self.validate(want_list)
+    timer.lap('validate')
     if msg:
       result['failed'] = True
       result['msg'] = msg
-      return result
+      return timer.update_result(result)
 
     commands = self.to_commands(want_list, have_list)
+    timer.lap('to_commands_list')
     result['commands'] = commands
 
     # for debug purpose
@@ -487,4 +603,8 @@ class ActionModule(_ActionModule):
       result['want'] = want_list
       result['have'] = have_list
 
-    return result
+    timer.count_config(self._task.args.get('running_config_path') or self._task.args.get('running_config'))
+    timer.count('haves', len(have_list))
+    timer.count('wants', len(want_list))
+    timer.count('commands', len(commands))
+    return timer.update_result(result)
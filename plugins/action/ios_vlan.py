@@ -5,12 +5,21 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 import os
-import re
 
 from ansible.module_utils.six.moves.urllib.parse import urlsplit
 from ansible.plugins.action.normal import ActionModule as _ActionModule
 from ansible.module_utils._text import to_text
-from ansible.module_utils.network.common.config import NetworkConfig
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible_collections.iida.local.plugins.module_utils.attribute_matcher import AttributeMatcher
+from ansible_collections.iida.local.plugins.module_utils.obj_index import index_obj_list
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import PARSE_CACHE, get_have_list
+from ansible_collections.iida.local.plugins.module_utils.path_loader import read_raw
+from ansible_collections.iida.local.plugins.module_utils.profiler import phase_timer
+from ansible_collections.iida.local.plugins.module_utils.snapshot import SnapshotError, get_snapshot_have_list
+from ansible_collections.iida.local.plugins.module_utils.template_cache import render_template
+from ansible_collections.iida.local.plugins.module_utils.validation import validate_args
+from ansible_collections.iida.local.plugins.module_utils.vlan_set import VlanSet
+from ansible_collections.iida.local.plugins.modules.ios_vlan import get_module_spec
 
 try:
   # pylint: disable=unused-import
@@ -25,84 +34,13 @@ class ActionModule(_ActionModule):
 
   supported_params = ('vlan_id', 'vlan_range', 'vlan_name')
 
+  # パース処理を変更したら上げる(ディスクキャッシュのキーに使う)
+  parser_version = 1
 
-  @staticmethod
-  def search_obj_in_list(vlan_id, lst):
-    if not isinstance(vlan_id, str):
-      vlan_id = str(vlan_id)
-
-    for o in lst:
-      if str(o.get('vlan_id')) == vlan_id:
-        return o
-    return None
-
-
-  @staticmethod
-  def vlan_str_to_list(vlan_str):
-    if vlan_str is None:
-      return None
-
-    if not isinstance(vlan_str, str):
-      vlan_str = str(vlan_str)
-
-    result = []
-    if vlan_str:
-      for part in vlan_str.split(','):
-        if part.lower() == 'none':
-          break
-        if '-' in part:
-          start, stop = (int(i) for i in part.split('-'))
-          result.extend(range(start, stop + 1))
-        else:
-          result.append(int(part))
-
-    return sorted(result)
-
-
-  @staticmethod
-  def vlan_list_to_str(vlan_list):
-    vlan_list = sorted(vlan_list)
-    results = []
-    start = None
-    stop = None
-
-    for item in vlan_list:
-      if not start:
-        start = item
-      else:
-        if not stop:
-          if item == start + 1:
-            stop = item
-          else:
-            results.append(str(start))
-            start = item
-        else:
-          if item == stop + 1:
-            stop = item
-          else:
-            results.append(str(start) + '-' + str(stop))
-            start = item
-            stop = None
-
-    if start and stop:
-      results.append(str(start) + '-' + str(stop))
-    elif start:
-      results.append(str(start))
-
-    return ','.join(results)
-
-
-  @staticmethod
-  def parse_config_argument(configobj, name, arg=None):
-
-    parent = 'vlan {}'.format(name)
-
-    cfg = configobj[parent]
-    cfg = '\n'.join(cfg.children)
-
-    match = re.search(r'{} (.+)$'.format(arg), cfg, re.M)
-    if match:
-      return match.group(1)
+  # running-configの子の行 -> パラメータ
+  CONFIG_ATTRIBUTES = AttributeMatcher([
+    ('name', 'vlan_name', 'rest')
+  ])
 
 
   def map_config_to_obj(self, config):
@@ -111,13 +49,13 @@ class ActionModule(_ActionModule):
 
     results = []
 
-    match = re.findall(r'^vlan (\d+\S*)', config, re.M)
+    # コンフィグを一度だけ走査して'vlan 数字'で始まる親を取り出す
+    index = PARSE_CACHE.get_index(config)
+    match = [name for name in index.find('vlan') if name[0].isdigit()]
     if not match:
       return results
 
-    configobj = NetworkConfig(indent=1, contents=config)
-
-    for item in set(match):
+    for item in match:
       item = str(item)
 
       vlan_id = None
@@ -127,7 +65,7 @@ class ActionModule(_ActionModule):
       else:
         vlan_range = item
 
-      vlan_name = self.parse_config_argument(configobj, item, 'name')
+      vlan_name = self.CONFIG_ATTRIBUTES.match(index.children('vlan {}'.format(item))).get('vlan_name')
 
       obj = {
         'vlan_id': vlan_id,
@@ -174,27 +112,24 @@ class ActionModule(_ActionModule):
   def to_commands_list(self, want_list, have_list):
     commands = []
 
-    want_present_list, want_absent_list = self.to_vlan_list(want_list)
-    have_present_list, _ = self.to_vlan_list(have_list)
+    want_present_vlans, want_absent_vlans = self.to_vlan_set(want_list)
+    have_present_vlans, _ = self.to_vlan_set(have_list)
 
     # add vlan
-    add_list = set(want_present_list).difference(have_present_list)
-    if add_list:
-      add_list = sorted(add_list)
-      add_vlan_str = self.vlan_list_to_str(add_list)
-      if add_vlan_str:
-        commands.append('vlan {}'.format(add_vlan_str))
-        commands.append('exit')
+    add_vlans = want_present_vlans - have_present_vlans
+    if add_vlans:
+      commands.append('vlan {}'.format(add_vlans))
+      commands.append('exit')
 
     # delete vlan
-    del_list = set(have_present_list).intersection(want_absent_list)
-    if del_list:
-      del_list = sorted(del_list)
-      del_vlan_str = self.vlan_list_to_str(del_list)
-      if del_vlan_str:
-        commands.append('no vlan {}'.format(del_vlan_str))
+    del_vlans = have_present_vlans & want_absent_vlans
+    if del_vlans:
+      commands.append('no vlan {}'.format(del_vlans))
 
     # change vlan_name
+    # vlan_idで引けるようにしておく(vlan_rangeのものは対象外)
+    have_index = index_obj_list(have_list, lambda o: str(o.get('vlan_id')) if o.get('vlan_id') else None)
+
     for want in want_list:
       if want.get('state') == 'absent':
         continue
@@ -207,7 +142,7 @@ class ActionModule(_ActionModule):
 
       want_vlan_name = want.get('vlan_name')
 
-      have = self.search_obj_in_list(vlan_id, have_list)
+      have = have_index.get(vlan_id)
       if have:
         have_vlan_name = have.get('vlan_name')
         if want_vlan_name != have_vlan_name:
@@ -244,37 +179,31 @@ class ActionModule(_ActionModule):
       if name and ' ' in name:
         return 'You can not include space as vlan_name, {}'.format(name)
 
-    present_list, absent_list = self.to_vlan_list(want_list)
-    common = set(present_list).intersection(set(absent_list))
+    try:
+      present_vlans, absent_vlans = self.to_vlan_set(want_list)
+    except ValueError as e:
+      return 'invalid vlan_id or vlan_range, {}'.format(to_text(e))
+
+    common = present_vlans & absent_vlans
     if common:
-      return 'You can not set present and absent on the same time, vlan {}'.format(str(common))
+      return 'You can not set present and absent on the same time, vlan {}'.format(common)
 
 
-  def to_vlan_list(self, obj_list):
-    present_vlans = []
-    absent_vlans = []
+  @staticmethod
+  def to_vlan_set(obj_list):
+    present_vlans = VlanSet()
+    absent_vlans = VlanSet()
 
     for item in obj_list:
-      if item.get('vlan_id'):
-        vlan_id = str(item.get('vlan_id'))
-        if item.get('state') == 'present':
-          present_vlans.append(vlan_id)
-        elif item.get('state') == 'absent':
-          absent_vlans.append(vlan_id)
-      elif item.get('vlan_range'):
-        vlan_range = item.get('vlan_range')
-        if item.get('state') == 'present':
-          present_vlans.append(vlan_range)
-        elif item.get('state') == 'absent':
-          absent_vlans.append(vlan_range)
-
-    present_vlans = sorted(present_vlans)
-    absent_vlans = sorted(absent_vlans)
-
-    present_list = self.vlan_str_to_list(','.join(present_vlans))
-    absent_list = self.vlan_str_to_list(','.join(absent_vlans))
+      vlans = VlanSet.parse(item.get('vlan_id') or item.get('vlan_range') or None)
+      if vlans is None:
+        continue
+      if item.get('state') == 'present':
+        present_vlans |= vlans
+      elif item.get('state') == 'absent':
+        absent_vlans |= vlans
 
-    return present_list, absent_list
+    return present_vlans, absent_vlans
 
 
   def _handle_template(self, key_path):
@@ -298,6 +227,15 @@ class ActionModule(_ActionModule):
     if not os.path.exists(source):
       raise ValueError('path specified in src not found')
 
+    # template: falseのときはJinja2を通さずにそのまま読み込む
+    # モジュールに転送しないように、中身はモジュールを実行した後で引数に展開する
+    if not boolean(self._task.args.get('template', True), strict=False):
+      try:
+        self._raw_contents[key_path] = read_raw(source)
+      except (IOError, OSError):
+        raise ValueError('unable to load file, {}'.format(src))
+      return
+
     try:
       with open(source, 'r') as f:
         template_data = to_text(f.read())
@@ -316,38 +254,72 @@ class ActionModule(_ActionModule):
             searchpath.append(role._role_path)
     searchpath.append(os.path.dirname(source))
     self._templar.environment.loader.searchpath = searchpath
-    self._task.args[key_path] = self._templar.template(template_data)
+
+    # テンプレートの記号がなければJinja2を通さず、テンプレートならコンパイル結果を使い回す
+    self._task.args[key_path] = render_template(
+      self._templar, source, template_data, cache_dir=self._task.args.get('cache_dir'))
 
 
   def run(self, tmp=None, task_vars=None):
     del tmp  # tmp no longer has any effect
 
+    # profile: trueのときはフェーズごとの所要時間と件数を記録する
+    timer = phase_timer(boolean(self._task.args.get('profile', False), strict=False))
+
     # ファイルへのパスを指定されていたらファイルの中身に展開する
+    self._raw_contents = {}
     try:
       self._handle_template('running_config_path')
     except ValueError as e:
       return dict(failed=True, msg=to_text(e))
+    timer.lap('template')
 
     # モジュールを実行する
     # ただし、このモジュールは何もしない
-    result = super(ActionModule, self).run(task_vars=task_vars)
+    # controller_onlyのときはモジュールを転送せず、引数の検査だけをここで行う
+    if boolean(self._task.args.get('controller_only', False), strict=False):
+      msg = validate_args(self._task.action, self._task.args, **get_module_spec())
+      if msg:
+        return dict(failed=True, msg=msg)
+      result = dict(changed=False)
+    else:
+      result = super(ActionModule, self).run(task_vars=task_vars)
+
+    # template: falseで読み込んだファイルの中身を引数に展開する
+    self._task.args.update(self._raw_contents)
+    timer.lap('module')
 
     #
     # モジュール実行後の後工程処理
     #
 
     # コンフィグ情報をオブジェクトにしてhave_listにする
-    if self._task.args.get('running_config_path'):
-      config = self._task.args.get('running_config_path')
+    # snapshot_pathが指定されていたら、ios_config_snapshotでパース済みのhave_listを使う
+    if self._task.args.get('snapshot_path'):
+      try:
+        have_list, cache_stats = get_snapshot_have_list(
+          self._loader.path_dwim(self._task.args.get('snapshot_path')), 'ios_vlan', self.map_config_to_obj,
+          version=self.parser_version)
+      except SnapshotError as e:
+        return dict(failed=True, msg=to_text(e))
     else:
-      config = self._task.args.get('running_config')
+      if self._task.args.get('running_config_path'):
+        config = self._task.args.get('running_config_path')
+      else:
+        config = self._task.args.get('running_config')
 
-    have_list = self.map_config_to_obj(config)
+      # パース結果はキャッシュを使い回す(cache_dirがあればディスクにも保存する)
+      have_list, cache_stats = get_have_list(
+        'ios_vlan', config, self.map_config_to_obj,
+        cache_dir=self._task.args.get('cache_dir'), version=self.parser_version)
+    timer.lap('map_config_to_obj')
     if self._task.args.get('debug'):
       result['have'] = have_list
+      result['parse_cache'] = cache_stats
 
     # モジュールに渡されたパラメータ情報をオブジェクトにする
     want_list = self.map_params_to_obj()
+    timer.lap('map_params_to_obj')
     if self._task.args.get('debug'):
       result['want'] = want_list
 
@@ -360,15 +332,22 @@ class ActionModule(_ActionModule):
     #
 
     msg = self.validate(want_list)
+    timer.lap('validate')
     if msg:
       result['msg'] = msg
       result['failed'] = True
+      return timer.update_result(result)
 
     #
     # 差分のコンフィグを作成する
     #
 
     commands = self.to_commands_list(want_list, have_list)
+    timer.lap('to_commands_list')
     result['commands'] = commands
 
-    return result
+    timer.count_config(self._task.args.get('running_config_path') or self._task.args.get('running_config'))
+    timer.count('haves', len(have_list))
+    timer.count('wants', len(want_list))
+    timer.count('commands', len(commands))
+    return timer.update_result(result)
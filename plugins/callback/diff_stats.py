@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    callback: iida.local.diff_stats
+    type: aggregate
+    short_description: aggregate parse and diff timings of iida.local.ios_* tasks
+    version_added: "2.9"
+    description:
+      - Collects timings and counts returned by iida.local.ios_* tasks run with profile true.
+      - Results of iida.local.ios_fleet_diff are counted per device.
+      - At the end of the playbook, prints p50/p95/p99 of parse and diff latency per module,
+        the slowest hosts with their config sizes, and writes the summary to a JSON file.
+    requirements:
+      - whitelisting in configuration
+      - profile true on iida.local.ios_* tasks
+    options:
+      top_hosts:
+        description: Number of slowest hosts to display
+        default: 20
+        type: int
+        env:
+          - name: IIDA_LOCAL_DIFF_STATS_TOP_HOSTS
+        ini:
+          - section: callback_diff_stats
+            key: top_hosts
+      summary_dir:
+        description: Directory to write the JSON summary, a file per run. Empty string disables it.
+        default: ~/.ansible/diff_stats
+        type: str
+        env:
+          - name: IIDA_LOCAL_DIFF_STATS_DIR
+        ini:
+          - section: callback_diff_stats
+            key: summary_dir
+'''
+
+EXAMPLES = '''
+example: >
+  To enable, add this to your ansible.cfg file in the defaults block
+    [defaults]
+    callback_whitelist = iida.local.diff_stats
+  and set profile true on iida.local.ios_* tasks.
+'''
+
+import json
+import os
+import time
+
+from collections import OrderedDict, defaultdict
+
+from ansible.module_utils._text import to_text
+from ansible.plugins.callback import CallbackBase
+
+# map_config_to_obj()など、既存の設定を読み取るフェーズ
+PARSE_PHASES = ('map_config_to_obj', 'map_show_interfaces_switchport_to_obj', 'map_show_vlan_to_obj')
+
+# 差分を計算するフェーズ
+DIFF_PHASES = ('map_params_to_obj', 'validate', 'to_commands_list')
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, p):
+  # nearest-rank法、valuesはソート済み
+  if not values:
+    return None
+  rank = max(int(-(-p * len(values) // 100)), 1)
+  return values[rank - 1]
+
+
+def summarize(values):
+  values = sorted(values)
+  summary = OrderedDict(('p{}'.format(p), percentile(values, p)) for p in PERCENTILES)
+  summary['max'] = values[-1] if values else None
+  return summary
+
+
+class CallbackModule(CallbackBase):
+
+  CALLBACK_VERSION = 2.0
+  CALLBACK_TYPE = 'aggregate'
+  CALLBACK_NAME = 'iida.local.diff_stats'
+  CALLBACK_NEEDS_WHITELIST = True
+
+  def __init__(self, display=None):
+    super(CallbackModule, self).__init__(display=display)
+
+    # モジュール名 -> [{'host', 'parse', 'diff', 'total'}]
+    self._samples = defaultdict(list)
+
+    # ホスト名 -> {'total', 'config_lines', 'tasks'}
+    self._hosts = OrderedDict()
+
+    self._start = time.time()
+
+
+  def _record(self, host, action, profile):
+    timings = profile.get('timings') or {}
+    counts = profile.get('counts') or {}
+
+    sample = {
+      'host': host,
+      'parse': sum(timings.get(k, 0.0) for k in PARSE_PHASES),
+      'diff': sum(timings.get(k, 0.0) for k in DIFF_PHASES),
+      'total': timings.get('total', 0.0)
+    }
+    self._samples[action].append(sample)
+
+    stats = self._hosts.setdefault(host, {'total': 0.0, 'config_lines': None, 'tasks': 0})
+    stats['total'] += sample['total']
+    stats['tasks'] += 1
+    if counts.get('config_lines') is not None:
+      stats['config_lines'] = max(stats['config_lines'] or 0, counts['config_lines'])
+
+
+  def _collect(self, result):
+    # pylint: disable=protected-access
+    action = result._task.action
+    if not action.startswith('iida.local.ios_'):
+      return
+
+    host = result._host.get_name()
+    res = result._result
+    action = action[len('iida.local.'):]
+
+    # ios_fleet_diffは装置ごとに、リソースごとのprofileのリストを持っている
+    if action == 'ios_fleet_diff':
+      for device, device_result in (res.get('hosts') or {}).items():
+        for name, profiles in ((device_result or {}).get('resources') or {}).items():
+          for profile in profiles or []:
+            self._record(device, 'ios_' + name, profile)
+      return
+
+    if 'timings' in res and 'counts' in res:
+      self._record(host, action, res)
+
+    # ios_intentはリソースごとのprofileを持っている
+    for name, resource in (res.get('resources') or {}).items():
+      if not isinstance(resource, dict):
+        continue
+      for profile in resource.get('profile') or []:
+        self._record(host, 'ios_' + name, profile)
+
+
+  def v2_runner_on_ok(self, result):
+    self._collect(result)
+
+
+  def v2_runner_on_failed(self, result, ignore_errors=False):
+    self._collect(result)
+
+
+  # loopのときは要素ごとの結果にtimingsが入っている
+  def v2_runner_item_on_ok(self, result):
+    self._collect(result)
+
+
+  def v2_runner_item_on_failed(self, result):
+    self._collect(result)
+
+
+  def summary(self):
+    plugins = OrderedDict()
+    for action in sorted(self._samples):
+      samples = self._samples[action]
+      plugins[action] = OrderedDict([
+        ('count', len(samples)),
+        ('parse', summarize([s['parse'] for s in samples])),
+        ('diff', summarize([s['diff'] for s in samples])),
+        ('total', summarize([s['total'] for s in samples]))
+      ])
+
+    hosts = sorted(self._hosts.items(), key=lambda item: item[1]['total'], reverse=True)
+    return OrderedDict([
+      ('started', self._start),
+      ('elapsed', time.time() - self._start),
+      ('plugins', plugins),
+      ('hosts', [dict(host=host, **stats) for host, stats in hosts])
+    ])
+
+
+  def _print_summary(self, summary, top_hosts):
+    self._display.banner('IIDA.LOCAL DIFF STATS')
+
+    def ms(value):
+      return '{:>9.1f}'.format(value * 1000) if value is not None else '{:>9}'.format('-')
+
+    header = '{:<24} {:>6}'.format('module', 'count')
+    for kind in ('parse', 'diff'):
+      for p in PERCENTILES:
+        header += ' {:>9}'.format('{} p{}'.format(kind, p))
+    self._display.display(header + '  (ms)')
+
+    for action, stats in summary['plugins'].items():
+      line = '{:<24} {:>6}'.format(action, stats['count'])
+      for kind in ('parse', 'diff'):
+        for p in PERCENTILES:
+          line += ' ' + ms(stats[kind]['p{}'.format(p)])
+      self._display.display(line)
+
+    self._display.display('')
+    self._display.display('{:<40} {:>10} {:>6} {:>12}'.format('slowest hosts', 'total ms', 'tasks', 'config lines'))
+    for stats in summary['hosts'][:top_hosts]:
+      config_lines = stats['config_lines'] if stats['config_lines'] is not None else '-'
+      self._display.display('{:<40} {} {:>6} {:>12}'.format(
+        stats['host'], ms(stats['total']).rjust(10), stats['tasks'], config_lines))
+
+
+  def _write_summary(self, summary, summary_dir):
+    summary_dir = os.path.expanduser(summary_dir)
+    try:
+      if not os.path.isdir(summary_dir):
+        os.makedirs(summary_dir)
+      path = os.path.join(summary_dir, 'diff_stats_{}.json'.format(time.strftime('%Y%m%dT%H%M%S', time.localtime(self._start))))
+      with open(path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    except (IOError, OSError) as e:
+      self._display.warning('unable to write diff stats summary: {}'.format(to_text(e)))
+      return
+    self._display.display('summary: {}'.format(path))
+
+
+  def v2_playbook_on_stats(self, stats):
+    if not self._samples:
+      return
+
+    summary = self.summary()
+    self._print_summary(summary, int(self.get_option('top_hosts')))
+
+    summary_dir = self.get_option('summary_dir')
+    if summary_dir:
+      self._write_summary(summary, summary_dir)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# 子の行をキーワードで分類して、セクション内の全パラメータを一度の走査で取り出す
+#
+# 表の書き方
+#   (キーワード, パラメータ名, 種類)
+#
+# 種類
+#   'rest'  最初に見つかった 'キーワード 値' の値(文字列)、なければNone
+#   'all'   すべての 'キーワード 値' の値をリストにしたもの、なければ[]
+#   'flag'  'キーワード' もしくは 'キーワード ...' があればTrue、なければFalse
+#
+# 行の先頭の単語で候補を絞り込み、候補の中では長いキーワードを優先する
+# 例えば 'authentication md5 key-string' と 'authentication' の両方があれば前者が勝つ
+# 同じキーワードを複数のパラメータに割り当ててもよい
+#
+# LazyHaveと組み合わせるときは、match_one()で一つのパラメータだけを取り出す
+#
+
+KINDS = ('rest', 'all', 'flag')
+
+
+class AttributeMatcher(object):
+
+  def __init__(self, table):
+    self.table = tuple(table)
+
+    # パラメータ名 -> 初期値
+    self.defaults = []
+
+    # 先頭の単語 -> [(キーワード, [(パラメータ名, 種類), ...]), ...] 長いキーワード順
+    self.dispatch = {}
+
+    targets = {}
+    for keyword, param, kind in self.table:
+      if kind not in KINDS:
+        raise ValueError('unknown kind {} for {}'.format(kind, keyword))
+      if param not in [p for p, _ in self.defaults]:
+        self.defaults.append((param, self.default_value(kind)))
+      if keyword not in targets:
+        targets[keyword] = []
+        self.dispatch.setdefault(keyword.split(' ', 1)[0], []).append(keyword)
+      targets[keyword].append((param, kind))
+
+    for first, keywords in self.dispatch.items():
+      keywords.sort(key=lambda k: len(k.split()), reverse=True)
+      self.dispatch[first] = [(k, targets[k]) for k in keywords]
+
+
+  @staticmethod
+  def default_value(kind):
+    if kind == 'all':
+      return []
+    if kind == 'flag':
+      return False
+    return None
+
+
+  def match(self, lines, params=None):
+    # paramsを指定したときはそのパラメータだけを取り出す
+    # 長いキーワードを優先するのは変わらないので、全部を取り出したときと同じ値になる
+    result = {}
+    for param, default in self.defaults:
+      if params is None or param in params:
+        result[param] = list(default) if isinstance(default, list) else default
+
+    # 'rest'は最初に見つかったものを採用する
+    found = set()
+
+    dispatch = self.dispatch
+    for line in lines:
+      candidates = dispatch.get(line.split(' ', 1)[0])
+      if candidates is None:
+        continue
+
+      for keyword, targets in candidates:
+        if line == keyword:
+          rest = None
+        elif line.startswith(keyword) and line[len(keyword)] == ' ':
+          rest = line[len(keyword) + 1:]
+        else:
+          continue
+
+        for param, kind in targets:
+          if params is not None and param not in params:
+            continue
+          if kind == 'flag':
+            result[param] = True
+          elif rest is None:
+            continue
+          elif kind == 'all':
+            result[param].append(rest.strip())
+          elif param not in found:
+            found.add(param)
+            result[param] = rest
+        break
+
+    return result
+
+
+  def match_one(self, lines, param):
+    # LazyHaveのloaderとして使う
+    return self.match(lines, (param,))
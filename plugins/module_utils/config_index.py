@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# running-configを一度だけ走査して、親の行 -> 子の行 の対応表を作る
+#
+# NetworkConfigは親を探すたびに全行を線形探索し、
+# さらに呼び出し側で'\n'.join(cfg.children)して正規表現を当てていたので、
+# インタフェース数 x パラメータ数 だけ全体をなめることになっていた
+#
+# scoped()は指定したセクションだけを探して読むので、数個のインタフェースだけを扱うときに使う
+#
+
+# NetworkConfigと同じコメント扱いのトークン
+COMMENT_TOKENS = ('#', '!', '/*', '*/', 'echo')
+
+
+def find_line(config, text):
+  # textで始まるトップレベルの行を探して、その位置を返す。なければ-1
+  # 'interface Serial0/0 point-to-point' のように後ろに続きがある行にも一致する
+  pos = config.find(text)
+  while pos >= 0:
+    end = pos + len(text)
+    if (pos == 0 or config[pos - 1] == '\n') and (end == len(config) or config[end] in ' \r\n'):
+      return pos
+    pos = config.find(text, end)
+  return -1
+
+
+def section_end(config, start):
+  # startの行から始まるセクションの終わり、すなわち次のトップレベルの行の位置を返す
+  pos = config.find('\n', start)
+  while pos >= 0:
+    line_start = pos + 1
+    pos = config.find('\n', line_start)
+    line = config[line_start:] if pos < 0 else config[line_start:pos]
+    if line and line[0] not in ' \t':
+      text = line.strip()
+      if text and not text.startswith(COMMENT_TOKENS):
+        return line_start
+  return len(config)
+
+
+class ConfigSection(object):
+
+  __slots__ = ('text', 'start', 'end', 'children')
+
+  def __init__(self, text, start, end=None, children=None):
+    # 親の行(前後の空白は除去済み)
+    self.text = text
+
+    # コンフィグ文字列の中でこのセクションが占める範囲 config[start:end]
+    self.start = start
+    self.end = start if end is None else end
+
+    # 直下の子の行(前後の空白は除去済み)、孫以下の行は含まない
+    self.children = [] if children is None else children
+
+  def __repr__(self):
+    return 'ConfigSection({!r}, {}, {})'.format(self.text, self.start, self.end)
+
+
+class ConfigIndex(object):
+
+  def __init__(self, config=None):
+    # 親の行 -> ConfigSection
+    self.sections = {}
+
+    # トップレベルの行を出現順に並べたもの
+    self.parents = []
+
+    # find()の結果を保存しておく
+    self._find_cache = {}
+
+    if config:
+      self.parse(config)
+
+  def __len__(self):
+    return len(self.parents)
+
+  def __contains__(self, parent):
+    return parent in self.sections
+
+  def dump(self):
+    # スナップショットに保存するため、組み込み型だけのリストにする
+    return [[s.text, s.start, s.end, s.children] for s in self.parents]
+
+  @classmethod
+  def load(cls, data):
+    # dump()の結果から作り直す
+    index = cls()
+    for text, start, end, children in data:
+      section = ConfigSection(text, start, end, children)
+      index.parents.append(section)
+      if text not in index.sections:
+        index.sections[text] = section
+    return index
+
+  @classmethod
+  def scoped(cls, config, parents):
+    # 指定した親の行のセクションだけを探して索引を作る
+    # 親の行の位置はstr.find()で探し、そのセクションの行だけをparse()する
+    index = cls()
+    for parent in parents:
+      start = find_line(config, parent)
+      if start >= 0:
+        index.parse(config, start, section_end(config, start))
+    return index
+
+  def parse(self, config, start=0, end=None):
+    # config[start:end]だけを読む、位置は元のコンフィグ文字列の中での位置
+    sections = self.sections
+    parents = self.parents
+
+    section = None
+    child_indent = None
+    pos = start
+
+    body = config if start == 0 and end is None else config[start:end]
+    for line in body.split('\n'):
+      start = pos
+      pos += len(line) + 1
+
+      text = line.strip()
+      if not text or text.startswith(COMMENT_TOKENS):
+        continue
+
+      indent = len(line) - len(line.lstrip())
+
+      # トップレベルの行
+      if indent == 0:
+        section = ConfigSection(text, start, start + len(line))
+        parents.append(section)
+        # 同じ親が複数ある場合はNetworkConfigと同じく最初のものを優先する
+        if text not in sections:
+          sections[text] = section
+        child_indent = None
+        continue
+
+      # トップレベルより前にある字下げされた行は無視する
+      if section is None:
+        continue
+
+      section.end = start + len(line)
+
+      # 最初に現れた字下げ幅を子の深さとし、それより深い行は孫以下なので取り込まない
+      if child_indent is None or indent < child_indent:
+        child_indent = indent
+      if indent == child_indent:
+        section.children.append(text)
+
+  def get(self, parent):
+    return self.sections.get(parent)
+
+  def children(self, parent):
+    section = self.sections.get(parent)
+    if section is None:
+      return []
+    return section.children
+
+  def section_text(self, config, parent):
+    # 元のコンフィグ文字列から該当セクションだけを切り出す
+    section = self.sections.get(parent)
+    if section is None:
+      return ''
+    return config[section.start:section.end]
+
+  def lines(self, prefix):
+    # prefixで始まるトップレベルの行を出現順に返す
+    return [s.text for s in self.parents if s.text.startswith(prefix)]
+
+  def find(self, keyword):
+    # 'interface GigabitEthernet1' のように keyword + 名前 で始まる親を探して
+    # その名前を出現順に返す
+    names = self._find_cache.get(keyword)
+    if names is not None:
+      return names
+
+    names = []
+    seen = set()
+    prefix = keyword + ' '
+    prefix_len = len(prefix)
+    for section in self.parents:
+      text = section.text
+      if not text.startswith(prefix):
+        continue
+      tokens = text[prefix_len:].split(None, 1)
+      if not tokens:
+        continue
+      name = tokens[0]
+      if name in seen:
+        continue
+      seen.add(name)
+      names.append(name)
+
+      # 'interface Serial0/0 point-to-point' のように名前の後ろに続きがある場合でも
+      # 'interface Serial0/0' で引けるようにしておく
+      if len(tokens) > 1:
+        self.sections.setdefault(prefix + name, section)
+
+    self._find_cache[keyword] = names
+    return names
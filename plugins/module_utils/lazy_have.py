@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# パラメータを読まれたときに初めてパースするhaveオブジェクト
+#
+# map_config_to_obj()はインタフェースの数だけhaveを作るが、
+# 差分を計算するpresent_XXX()/absent_XXX()が読むのはwantに書かれたインタフェースの、書かれたパラメータだけ
+# nameのように必ず使うものは最初から入れておき、それ以外はloader(パラメータ名)で必要になったときに取り出す
+# 取り出した値はそのまま保持するので、二度目以降はパースしない
+#
+# loader(key)はkeyを含むdictを返す
+# 同じ行から複数のパラメータが決まる場合は、まとめて返せばそれらも保持する
+#
+# 注意
+# pickleするとすべてのパラメータをパースして普通のdictになる(ディスクキャッシュ)
+# deepcopyは未パースのまま複製する(PARSE_CACHEから取り出すとき)
+#
+
+import copy
+
+
+class LazyHave(dict):
+
+  __slots__ = ('_loader', '_order', '_pending')
+
+  def __init__(self, values, loader, pending):
+    super(LazyHave, self).__init__(values)
+    self._loader = loader
+    # 全部を取り出すときはこの順番に並べる
+    self._order = pending
+    self._pending = set(k for k in pending if k not in values)
+
+
+  def _load(self, key):
+    if key not in self._pending:
+      return
+    for k, v in self._loader(key).items():
+      if k in self._pending:
+        self._pending.discard(k)
+        dict.__setitem__(self, k, v)
+    self._pending.discard(key)
+
+
+  def materialize(self):
+    if self._pending:
+      for key in self._order:
+        self._load(key)
+    return self
+
+
+  def __getitem__(self, key):
+    self._load(key)
+    return dict.__getitem__(self, key)
+
+
+  def get(self, key, default=None):
+    self._load(key)
+    return dict.get(self, key, default)
+
+
+  def __contains__(self, key):
+    return key in self._pending or dict.__contains__(self, key)
+
+
+  def __len__(self):
+    return dict.__len__(self) + len(self._pending)
+
+
+  def __iter__(self):
+    return dict.__iter__(self.materialize())
+
+
+  def keys(self):
+    return dict.keys(self.materialize())
+
+
+  def values(self):
+    return dict.values(self.materialize())
+
+
+  def items(self):
+    return dict.items(self.materialize())
+
+
+  def __setitem__(self, key, value):
+    self._pending.discard(key)
+    dict.__setitem__(self, key, value)
+
+
+  def __delitem__(self, key):
+    if key in self._pending and not dict.__contains__(self, key):
+      self._pending.discard(key)
+      return
+    self._pending.discard(key)
+    dict.__delitem__(self, key)
+
+
+  def pop(self, key, *args):
+    self._load(key)
+    return dict.pop(self, key, *args)
+
+
+  def setdefault(self, key, default=None):
+    self._load(key)
+    return dict.setdefault(self, key, default)
+
+
+  def update(self, *args, **kwargs):
+    for k, v in dict(*args, **kwargs).items():
+      self[k] = v
+
+
+  def _clone(self, values):
+    # 未パースのパラメータはloaderを共有したまま引き継ぐ
+    clone = LazyHave(values, self._loader, self._order)
+    clone._pending = set(self._pending)
+    return clone
+
+
+  def copy(self):
+    return self._clone(dict(dict.items(self)))
+
+  __copy__ = copy
+
+
+  def __deepcopy__(self, memo):
+    return self._clone(copy.deepcopy(dict(dict.items(self)), memo))
+
+
+  def __reduce_ex__(self, protocol):
+    return (dict, (dict(self.items()),))
+
+
+  def __eq__(self, other):
+    if isinstance(other, LazyHave):
+      other.materialize()
+    return dict.__eq__(self.materialize(), other)
+
+
+  def __ne__(self, other):
+    return not self == other
+
+  __hash__ = None
+
+
+  def __repr__(self):
+    return dict.__repr__(self.materialize())
+
+
+def materialize(obj_list):
+  # debugで出力するときなど、全パラメータをパースした普通のdictのリストにする
+  return [dict(o.items()) if isinstance(o, LazyHave) else o for o in obj_list]
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# have_listをキーで引ける辞書にする
+#
+# wantごとにhave_listを線形探索するとwant数 x have数の比較になるので、
+# 一度だけ辞書を作ってO(1)で引けるようにする
+# 線形探索と同じ結果になるように、同じキーは先に出てきたものを優先する
+#
+
+
+def index_obj_list(obj_list, key):
+  index = {}
+  for obj in obj_list:
+    k = key(obj)
+    if k is not None and k not in index:
+      index[k] = obj
+  return index
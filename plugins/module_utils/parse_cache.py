@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import copy
+import errno
+import hashlib
+import os
+import random
+import stat
+import tempfile
+
+from collections import OrderedDict
+
+from ansible.module_utils._text import to_bytes
+from ansible.module_utils.six.moves import cPickle as pickle
+from ansible_collections.iida.local.plugins.module_utils.config_index import ConfigIndex
+from ansible_collections.iida.local.plugins.module_utils.lazy_have import LazyHave
+
+#
+# 同じrunning_configを複数のアクションプラグインに渡したときに、
+# ConfigIndexと各プラグインのhave_listを使い回すためのキャッシュ
+#
+# キーはコンフィグ文字列のダイジェスト
+# エントリ数とコンフィグの合計サイズの両方で上限を設け、古いものからLRUで捨てる
+#
+# 注意
+# ansibleはタスクごとにワーカープロセスをforkするので、
+# このキャッシュはプロセス内(同じタスクの中)でしか共有されない
+# タスクやプレイブックの実行をまたいで使い回すにはDiskCacheを併用する
+#
+# LazyHaveのhave_list(ios_interfaceなど)はディスクに書かない
+# pickleするには全インタフェースの全パラメータをパースする必要があり、
+# 読まれたパラメータだけをパースするという目的と両立しないため
+# これらのプラグインではcache_dirを指定しても次の実行でパースを省略できないが、
+# パースするのは差分の計算で読んだパラメータだけになる
+#
+
+DEFAULT_MAX_ENTRIES = 16
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 256 * 1024 * 1024
+
+# DiskCacheの掃除はおよそmax_bytesのこの割合を書き込むごとに1回行う
+DISK_EVICT_RATIO = 16
+
+# scoped: trueでも、これより多くのセクションを読むときはコンフィグ全体をパースする
+SCOPED_MAX_SECTIONS = 64
+
+
+def is_lazy(have_list):
+  return any(isinstance(o, LazyHave) for o in have_list)
+
+
+class ParseCache(object):
+
+  def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+
+    # digest -> {'index': ConfigIndex, 'have': {name: have_list}, 'size': len(config)}
+    self._entries = OrderedDict()
+    self._size = 0
+
+    self.index_hits = 0
+    self.index_misses = 0
+    self.have_hits = 0
+    self.have_misses = 0
+    self.evictions = 0
+
+
+  def __len__(self):
+    return len(self._entries)
+
+
+  @staticmethod
+  def digest(config):
+    return hashlib.sha256(to_bytes(config, errors='surrogate_or_strict')).hexdigest()
+
+
+  def _get_entry(self, config):
+    key = self.digest(config)
+    entry = self._entries.get(key)
+    if entry is not None:
+      # 最近使ったものを末尾に移動する
+      del self._entries[key]
+      self._entries[key] = entry
+      return entry
+
+    entry = {'digest': key, 'index': None, 'have': {}, 'size': len(config)}
+    self._entries[key] = entry
+    self._size += entry['size']
+    self._evict()
+    return entry
+
+
+  def _evict(self):
+    # 追加したばかりのエントリ(末尾)は残す
+    while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+      _, entry = self._entries.popitem(last=False)
+      self._size -= entry['size']
+      self.evictions += 1
+
+
+  def get_index(self, config):
+    if not config:
+      return ConfigIndex(config)
+
+    entry = self._get_entry(config)
+    if entry['index'] is None:
+      self.index_misses += 1
+      entry['index'] = ConfigIndex(config)
+    else:
+      self.index_hits += 1
+    return entry['index']
+
+
+  def peek_index(self, config, count=True):
+    # パース済みのConfigIndexがあれば返す、なければパースせずにNoneを返す
+    # count=Falseのときは統計情報のヒット数に数えない(profileの件数を数えるときなど)
+    if not config:
+      return None
+
+    entry = self._entries.get(self.digest(config))
+    if entry is None or entry['index'] is None:
+      return None
+    if count:
+      self.index_hits += 1
+    return entry['index']
+
+
+  def put_index(self, config, index):
+    # ios_config_snapshotなどで作成済みのConfigIndexを登録する
+    if not config:
+      return
+
+    entry = self._get_entry(config)
+    if entry['index'] is None:
+      entry['index'] = index
+
+
+  def get_have_list(self, name, config, func, disk_cache=None, version=None):
+    # 呼び出し側がhave_listを書き換えても影響しないように、ミスでもヒットでもコピーを返す
+    # ios_interface_trunkはshow interfaces switchportの情報をhaveに書き込むので、
+    # キャッシュにあるものをそのまま渡すと、同じコンフィグの別の装置やリソースにその情報が残ってしまう
+    if not config:
+      return func(config)
+
+    entry = self._get_entry(config)
+    have_list = entry['have'].get(name)
+    if have_list is None:
+      self.have_misses += 1
+
+      # ディスクにあればパースしない
+      key = None
+      if disk_cache is not None:
+        key = disk_cache.make_key(name, version, entry['digest'])
+        have_list = disk_cache.get(key)
+
+      if have_list is None:
+        have_list = func(config)
+        # LazyHaveはpickleすると全パラメータをパースしてしまうので、ディスクには書かない
+        if key is not None and not is_lazy(have_list):
+          disk_cache.put(key, have_list)
+
+      entry['have'][name] = have_list
+    else:
+      self.have_hits += 1
+    return copy.deepcopy(have_list)
+
+
+  def stats(self):
+    return {
+      'entries': len(self._entries),
+      'bytes': self._size,
+      'index_hits': self.index_hits,
+      'index_misses': self.index_misses,
+      'have_hits': self.have_hits,
+      'have_misses': self.have_misses,
+      'evictions': self.evictions
+    }
+
+
+  def clear(self):
+    self._entries.clear()
+    self._size = 0
+
+
+class DiskCache(object):
+
+  #
+  # map_config_to_obj()の結果をpickleにしてディレクトリに保存する
+  #
+  # ファイル名は プラグイン名-パーサーのバージョン-sha256.pickle
+  # パーサーの実装を変えたらプラグイン側のparser_versionを上げれば古いファイルは使われなくなる
+  # 合計サイズがmax_bytesを超えたら、更新時刻が古いものから削除する
+  #
+  # 掃除はディレクトリの全ファイルをstatするので、書き込むたびには行わない
+  # タスクごとにプロセスが変わるので書き込んだ量を数えても引き継げない
+  # そこで書き込んだサイズに比例した確率で掃除する
+  # 平均するとmax_bytes/DISK_EVICT_RATIOを書き込むごとに1回になり、その分だけmax_bytesを超えることがある
+  #
+  # 注意
+  # pickleを読み込むことは任意のコードを実行することと同じ
+  # cache_dirは自分が所有し、他のユーザーが書き込めないディレクトリでなければ使わない
+  # ディレクトリを作るときは0700にする
+  #
+
+  SUFFIX = '.pickle'
+
+  def __init__(self, cache_dir, max_bytes=DEFAULT_DISK_MAX_BYTES):
+    self.cache_dir = os.path.expanduser(cache_dir)
+    self.max_bytes = max_bytes
+
+    self.hits = 0
+    self.misses = 0
+    self.writes = 0
+    self.evictions = 0
+    self.errors = 0
+
+    try:
+      os.makedirs(self.cache_dir, 0o700)
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise
+
+    self.check_private(self.cache_dir)
+
+
+  @staticmethod
+  def check_private(path):
+    # 他人が書き込めるディレクトリのファイルは読み込まない
+    st = os.stat(path)
+    if not stat.S_ISDIR(st.st_mode):
+      raise OSError(errno.ENOTDIR, 'cache_dir is not a directory', path)
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+      raise OSError(errno.EPERM, 'cache_dir is not owned by the current user', path)
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+      raise OSError(errno.EPERM, 'cache_dir is writable by group or others', path)
+
+
+  @classmethod
+  def make_key(cls, name, version, digest):
+    return '{}-{}-{}{}'.format(name, version, digest, cls.SUFFIX)
+
+
+  def get(self, key):
+    path = os.path.join(self.cache_dir, key)
+    try:
+      with open(path, 'rb') as f:
+        value = pickle.load(f)
+    except (IOError, OSError):
+      self.misses += 1
+      return None
+    except Exception:  # pylint: disable=broad-except
+      # 壊れたファイルは捨てる
+      self.errors += 1
+      self.misses += 1
+      self._remove(path)
+      return None
+
+    # 使ったファイルは更新時刻を新しくしてLRUにする
+    try:
+      os.utime(path, None)
+    except OSError:
+      pass
+
+    self.hits += 1
+    return value
+
+
+  def put(self, key, value):
+    # 書きかけのファイルを読まれないように、一時ファイルに書いてからrenameする
+    try:
+      fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+    except (IOError, OSError):
+      self.errors += 1
+      return
+
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        size = f.tell()
+      os.rename(tmp_path, os.path.join(self.cache_dir, key))
+    except Exception:  # pylint: disable=broad-except
+      self.errors += 1
+      self._remove(tmp_path)
+      return
+
+    self.writes += 1
+    if random.random() * self.max_bytes < size * DISK_EVICT_RATIO:
+      self.evict()
+
+
+  def evict(self):
+    files = []
+    total = 0
+    for name in os.listdir(self.cache_dir):
+      if not name.endswith(self.SUFFIX):
+        continue
+      path = os.path.join(self.cache_dir, name)
+      try:
+        st = os.stat(path)
+      except OSError:
+        continue
+      files.append((st.st_mtime, st.st_size, path))
+      total += st.st_size
+
+    if total <= self.max_bytes:
+      return
+
+    for _, size, path in sorted(files):
+      if total <= self.max_bytes:
+        break
+      if self._remove(path):
+        total -= size
+        self.evictions += 1
+
+
+  @staticmethod
+  def _remove(path):
+    try:
+      os.remove(path)
+    except OSError:
+      return False
+    return True
+
+
+  def stats(self):
+    return {
+      'cache_dir': self.cache_dir,
+      'hits': self.hits,
+      'misses': self.misses,
+      'writes': self.writes,
+      'evictions': self.evictions,
+      'errors': self.errors
+    }
+
+
+# プロセス内で共有するキャッシュ
+PARSE_CACHE = ParseCache()
+
+
+def get_have_list(name, config, func, cache_dir=None, version=None):
+  # アクションプラグインから呼ぶ入り口
+  # have_listとキャッシュの統計情報を返す
+
+  disk_cache = None
+  disk_error = None
+  if cache_dir:
+    try:
+      disk_cache = DiskCache(cache_dir)
+    except OSError as e:
+      # キャッシュが使えなくても処理は続ける
+      disk_error = str(e)
+
+  have_list = PARSE_CACHE.get_have_list(name, config, func, disk_cache=disk_cache, version=version)
+
+  stats = PARSE_CACHE.stats()
+  if disk_cache is not None:
+    stats['disk'] = disk_cache.stats()
+  elif disk_error:
+    stats['disk'] = {'cache_dir': cache_dir, 'error': disk_error}
+
+  return have_list, stats
+
+
+def get_scoped_index(config, keyword, names):
+  # scoped: trueのときの入り口
+  # 'keyword 名前'のセクションだけを索引にする
+  # 同じコンフィグをパース済みなら(ios_intentなど)それを使う
+  # セクションごとにコンフィグ全体をfind()するので、数が多ければ全体をパースした方が速い
+  index = PARSE_CACHE.peek_index(config)
+  if index is not None:
+    return index
+  if len(names) > SCOPED_MAX_SECTIONS:
+    return PARSE_CACHE.get_index(config)
+  return ConfigIndex.scoped(config or '', ['{} {}'.format(keyword, name) for name in names])
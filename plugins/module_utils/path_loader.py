@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# *_pathで指定されたファイルを読み込む
+#
+# template: falseのときはJinja2を通さないので、
+# ファイルをmmapしてマップした領域から直接デコードする
+# f.read()でbytesを作ってからデコードするよりコピーが1回少ない
+#
+
+import mmap
+
+from ansible.module_utils.six import PY3
+from ansible.module_utils._text import to_text
+
+
+def read_raw(path):
+  with open(path, 'rb') as f:
+    try:
+      mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      # 空のファイルはmmapできない
+      return u''
+
+  try:
+    if PY3:
+      with memoryview(mm) as buf:
+        return str(buf, 'utf-8', 'surrogateescape')
+    return to_text(mm[:], errors='surrogate_or_strict')
+  finally:
+    mm.close()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# profile: trueのときに、アクションプラグインのrun()のフェーズごとの所要時間と件数を記録する
+#
+# run()の各フェーズの終わりでlap()を呼ぶと、前のlap()からの経過時間をそのフェーズの時間にする
+# profileがfalseのときは何もしないNULL_TIMERを使うので、lap()を呼ぶだけのコストしかかからない
+#
+
+import time
+
+from collections import OrderedDict
+
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import PARSE_CACHE
+
+# python2にはmonotonic()がない
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class PhaseTimer(object):
+
+  def __init__(self):
+    self.start = self.last = monotonic()
+    self.timings = OrderedDict()
+    self.counts = OrderedDict()
+
+
+  def lap(self, phase):
+    now = monotonic()
+    self.timings[phase] = self.timings.get(phase, 0.0) + now - self.last
+    self.last = now
+
+
+  def count(self, name, value):
+    self.counts[name] = value
+
+
+  def count_config(self, config):
+    # パース済みのConfigIndexはPARSE_CACHEから取り出す
+    # scoped: trueで全体をパースしていなければ、そのためにパースはしない
+    # キャッシュの統計情報が変わらないように、ヒット数には数えない
+    if not config:
+      return
+    self.counts['config_lines'] = config.count('\n') + 1
+    index = PARSE_CACHE.peek_index(config, count=False)
+    if index is not None:
+      self.counts['sections'] = len(index)
+
+
+  def update_result(self, result):
+    self.timings['total'] = self.last - self.start
+    result['timings'] = self.timings
+    result['counts'] = self.counts
+    return result
+
+
+class NullTimer(object):
+
+  def lap(self, phase):
+    pass
+
+  def count(self, name, value):
+    pass
+
+  def count_config(self, config):
+    pass
+
+  def update_result(self, result):
+    return result
+
+
+NULL_TIMER = NullTimer()
+
+
+def phase_timer(enabled):
+  return PhaseTimer() if enabled else NULL_TIMER
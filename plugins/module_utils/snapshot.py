@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# パース済みのrunning-configをファイルに保存するスナップショット
+#
+# ios_config_snapshotでrunning-configを一度だけパースして、
+# コンフィグ本体、ConfigIndex(セクションの木とinterfaceの索引)、各リソースのhave_listを保存する
+# 各アクションプラグインはsnapshot_pathを受け取ると、自分のhave_listだけを取り出して使う
+#
+# ファイルの形式
+#   ヘッダ  MAGIC(8バイト) + 形式のバージョン(2バイト) + 本体のsha256(32バイト)
+#   本体    JSONのdict、各要素はそれぞれJSONにしてzlibで圧縮し、base64で文字列にしたもの
+#           必要な要素だけを展開すればよいので、ほかのリソースのhave_listは読み込まない
+#
+# 注意
+# 中身はJSONだけなので、読み込んでもコードが実行されることはない
+# ヘッダのsha256は壊れたファイルを見つけるためのもので、改ざんを防ぐものではない
+#
+
+import base64
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+import zlib
+
+from ansible.module_utils._text import to_bytes, to_text
+from ansible_collections.iida.local.plugins.module_utils.config_index import ConfigIndex
+from ansible_collections.iida.local.plugins.module_utils.lazy_have import materialize
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import PARSE_CACHE
+
+MAGIC = b'IIDASNAP'
+
+# 形式を変えたら上げる
+FORMAT_VERSION = 2
+
+HEADER = struct.Struct('>8sH32s')
+
+
+class SnapshotError(Exception):
+  pass
+
+
+def _pack(value):
+  data = zlib.compress(to_bytes(json.dumps(value, separators=(',', ':')), errors='surrogate_or_strict'))
+  return to_text(base64.b64encode(data))
+
+
+def _unpack(data):
+  return json.loads(to_text(zlib.decompress(base64.b64decode(data)), errors='surrogate_or_strict'))
+
+
+def config_digest(config):
+  return hashlib.sha256(to_bytes(config, errors='surrogate_or_strict')).hexdigest()
+
+
+def dump_snapshot(path, config, index, have):
+  """スナップショットをpathに書き込む
+
+  have は {プラグイン名: (parser_version, have_list)}
+  """
+  payload = to_bytes(json.dumps({
+    'config_digest': config_digest(config),
+    'created': time.time(),
+    'config': _pack(config),
+    'index': _pack(index.dump()),
+    'have': dict((name, (version, _pack(materialize(have_list)))) for name, (version, have_list) in have.items())
+  }))
+  header = HEADER.pack(MAGIC, FORMAT_VERSION, hashlib.sha256(payload).digest())
+
+  # 書きかけのファイルを読まれないように、一時ファイルに書いてからrenameする
+  dirname = os.path.dirname(os.path.abspath(path))
+  fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+  try:
+    with os.fdopen(fd, 'wb') as f:
+      f.write(header)
+      f.write(payload)
+    os.rename(tmp_path, path)
+  except Exception:
+    try:
+      os.remove(tmp_path)
+    except OSError:
+      pass
+    raise
+
+  return HEADER.size + len(payload)
+
+
+def load_snapshot(path):
+  """スナップショットを読み込んで、展開前の本体を返す"""
+  try:
+    with open(path, 'rb') as f:
+      data = f.read()
+  except (IOError, OSError) as e:
+    raise SnapshotError('unable to read snapshot {}: {}'.format(path, e))
+
+  if len(data) < HEADER.size:
+    raise SnapshotError('{} is not a config snapshot'.format(path))
+
+  magic, version, digest = HEADER.unpack_from(data)
+  if magic != MAGIC:
+    raise SnapshotError('{} is not a config snapshot'.format(path))
+  if version != FORMAT_VERSION:
+    raise SnapshotError('unsupported snapshot format version {} in {}, expected {}'.format(version, path, FORMAT_VERSION))
+
+  payload = data[HEADER.size:]
+  if hashlib.sha256(payload).digest() != digest:
+    raise SnapshotError('snapshot {} is corrupted, digest mismatch'.format(path))
+
+  try:
+    return json.loads(to_text(payload, errors='surrogate_or_strict'))
+  except Exception as e:  # pylint: disable=broad-except
+    raise SnapshotError('unable to load snapshot {}: {}'.format(path, e))
+
+
+def get_snapshot_have_list(path, name, func, version=None):
+  # アクションプラグインから呼ぶ入り口
+  # have_listと統計情報を返す
+  snapshot = load_snapshot(path)
+  stats = {'snapshot': path, 'config_digest': snapshot['config_digest']}
+
+  entry = snapshot['have'].get(name)
+  if entry is not None and entry[0] == version:
+    stats['have'] = 'snapshot'
+    return _unpack(entry[1]), stats
+
+  # スナップショットにないリソースや、パーサーのバージョンが違う場合は保存したコンフィグからパースし直す
+  # その場合もConfigIndexはスナップショットのものを使う
+  config = _unpack(snapshot['config'])
+  PARSE_CACHE.put_index(config, ConfigIndex.load(_unpack(snapshot['index'])))
+  stats['have'] = 'parsed'
+  return PARSE_CACHE.get_have_list(name, config, func, version=version), stats
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# *_pathで指定されたJinja2テンプレートのコンパイル結果を使い回すキャッシュ
+#
+# 同じテンプレートファイルをホストごと、プラグインごとに読み込むと、
+# そのたびにJinja2の字句解析、構文解析、Pythonコードへのコンパイルが走る
+# コンパイル結果(コードオブジェクト)を保存しておき、変数を埋め込むレンダリングだけを毎回行う
+#
+# テンプレートの記号を含まないファイルはそもそもJinja2を通さない
+#
+# ansibleが共有しているtemplar.environmentには手を入れない
+# overlay()で作った専用の環境をtemplarの複製に持たせて、その環境のcompile()だけがキャッシュを使う
+#
+# 注意
+# ansibleはタスクごとにワーカープロセスをforkするので、プロセス内のキャッシュはそのタスクの中でしか効かない
+# cache_dirを渡すとJinja2のFileSystemBytecodeCacheでcache_dirに保存し、タスクをまたいで使い回す
+# 保存されるのはmarshalしたコードオブジェクトで、読み込むことは実行することと同じなので、
+# 他人が書き込めるcache_dirは使わない(DiskCacheと同じ確認をする)
+#
+
+import copy
+import hashlib
+import os
+import sys
+
+from collections import OrderedDict
+
+from ansible.module_utils._text import to_bytes
+from ansible.release import __version__ as ANSIBLE_VERSION
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import DiskCache
+
+try:
+  from jinja2 import __version__ as JINJA2_VERSION
+  from jinja2.bccache import FileSystemBytecodeCache
+except ImportError:
+  JINJA2_VERSION = None
+  FileSystemBytecodeCache = None
+
+# ansible.templateと同じ、先頭にこれがあるとテンプレート側でJinja2の設定を変えられる
+JINJA2_OVERRIDE = '#jinja2:'
+
+DEFAULT_MAX_ENTRIES = 8
+
+
+def has_template_markers(data, environment):
+  # '{{', '{%', '{#'のどれも含まなければテンプレートではない
+  for marker in (environment.variable_start_string, environment.block_start_string, environment.comment_start_string):
+    if marker in data:
+      return True
+  return False
+
+
+def environment_signature(environment):
+  # コンパイル結果に影響するJinja2の設定
+  return (
+    environment.block_start_string,
+    environment.block_end_string,
+    environment.variable_start_string,
+    environment.variable_end_string,
+    environment.comment_start_string,
+    environment.comment_end_string,
+    environment.line_statement_prefix,
+    environment.line_comment_prefix,
+    environment.trim_blocks,
+    environment.lstrip_blocks,
+    environment.newline_sequence,
+    environment.keep_trailing_newline,
+    environment.optimized,
+    tuple(sorted(environment.extensions))
+  )
+
+
+class CachedCompileMixin(object):
+
+  #
+  # Jinja2の環境クラスに混ぜて、対象のテンプレートのcompile()だけをキャッシュから返す
+  # Templar.template()は内部でさらにoverlay()するが、overlay()はクラスと属性を引き継ぐので、
+  # ansibleのフィルタを追加した後の環境でもこのcompile()が呼ばれる
+  #
+  # レンダリング中のlookupなどが別の文字列をコンパイルするときは元のまま
+  #
+
+  template_cache = None
+  template_path = None
+  template_data = None
+
+  def compile(self, source, name=None, filename=None, raw=False, defer_init=False):
+    if raw or defer_init or self.template_cache is None or source != self.template_data:
+      return super(CachedCompileMixin, self).compile(source, name, filename, raw, defer_init)
+
+    def compile_source():
+      return super(CachedCompileMixin, self).compile(source, name, filename, raw, defer_init)
+
+    return self.template_cache.compile(self, self.template_path, source, compile_source)
+
+
+# 環境クラス -> CachedCompileMixinを混ぜたクラス
+_CACHED_CLASSES = {}
+
+
+def cached_class(cls):
+  if cls not in _CACHED_CLASSES:
+    _CACHED_CLASSES[cls] = type(str('Cached' + cls.__name__), (CachedCompileMixin, cls), {})
+  return _CACHED_CLASSES[cls]
+
+
+class TemplateCache(object):
+
+  def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+    self.max_entries = max_entries
+
+    # digest -> コードオブジェクト
+    self._entries = OrderedDict()
+
+    self.hits = 0
+    self.misses = 0
+    self.skipped = 0
+
+
+  @staticmethod
+  def signature_digest(environment):
+    key = (environment_signature(environment), sys.version_info[:3], JINJA2_VERSION, ANSIBLE_VERSION)
+    return hashlib.sha256(to_bytes(repr(key), errors='surrogate_or_strict')).hexdigest()
+
+
+  @classmethod
+  def digest(cls, path, environment):
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_mtime, st.st_size, cls.signature_digest(environment))
+    return hashlib.sha256(to_bytes(repr(key), errors='surrogate_or_strict')).hexdigest()
+
+
+  def compile(self, environment, path, source, compile_source):
+    # 環境にbytecode_cacheがあればJinja2のBytecodeCacheを使う
+    # ファイル名はパスと設定から決まり、中身が変わったかどうかはJinja2がソースのチェックサムで確かめる
+    bcc = environment.bytecode_cache
+    if bcc is not None:
+      bucket = bcc.get_bucket(environment, self.signature_digest(environment), os.path.realpath(path), source)
+      if bucket.code is not None:
+        self.hits += 1
+        return bucket.code
+      self.misses += 1
+      bucket.code = compile_source()
+      bcc.set_bucket(bucket)
+      return bucket.code
+
+    digest = self.digest(path, environment)
+    code = self._entries.get(digest)
+    if code is not None:
+      self.hits += 1
+      del self._entries[digest]
+      self._entries[digest] = code
+      return code
+
+    self.misses += 1
+    code = compile_source()
+    self._entries[digest] = code
+    while len(self._entries) > self.max_entries:
+      self._entries.popitem(last=False)
+    return code
+
+
+  def render(self, templar, path, data, bytecode_cache=None):
+    # テンプレートの記号がなければJinja2を通さない
+    if not has_template_markers(data, templar.environment):
+      self.skipped += 1
+      return data
+
+    # テンプレートの中でJinja2の設定を変えている場合はコンパイル結果が変わるので使わない
+    if data.startswith(JINJA2_OVERRIDE):
+      self.misses += 1
+      return templar.template(data)
+
+    # 専用の環境を作り、templarの複製に持たせる
+    # templarの複製は変数やローダーを元のものと共有する
+    myenv = templar.environment.overlay(bytecode_cache=bytecode_cache)
+    myenv.__class__ = cached_class(type(templar.environment))
+    myenv.template_cache = self
+    myenv.template_path = path
+    myenv.template_data = data
+
+    mytemplar = copy.copy(templar)
+    mytemplar.environment = myenv
+    return mytemplar.template(data)
+
+
+  def stats(self):
+    return {
+      'entries': len(self._entries),
+      'hits': self.hits,
+      'misses': self.misses,
+      'skipped': self.skipped
+    }
+
+
+# プロセス内で共有するキャッシュ
+TEMPLATE_CACHE = TemplateCache()
+
+
+def render_template(templar, path, data, cache_dir=None):
+  # アクションプラグインから呼ぶ入り口
+  bytecode_cache = None
+  if cache_dir and FileSystemBytecodeCache is not None:
+    try:
+      # ディレクトリの作成と、他人が書き込めないかの確認はDiskCacheに任せる
+      bytecode_cache = FileSystemBytecodeCache(DiskCache(cache_dir).cache_dir)
+    except OSError:
+      # キャッシュが使えなくても処理は続ける
+      bytecode_cache = None
+  return TEMPLATE_CACHE.render(templar, path, data, bytecode_cache=bytecode_cache)
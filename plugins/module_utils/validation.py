@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# AnsibleModuleと同じ順番で引数を検査する
+#
+# controller_onlyのときはモジュールを実行しないので、
+# モジュールが受け取るはずだった引数をアクションプラグインの中で検査する
+# 検査はコピーに対して行うので、呼び出し側のargsは書き換えない
+#
+# 注意
+# *_pathはアクションプラグインがファイルの中身(数MBのコンフィグ)に置き換えてから検査することがある
+# コピーするのはdictとlistだけで、文字列は元のものを共有する
+# typeがpathの引数はstrであることだけを確かめ、expanduser/expandvarsはしない
+# 変換した値は捨てるので、展開しても検査の結果は変わらない
+#
+
+from ansible.module_utils._text import to_native
+from ansible.module_utils.parsing.convert_bool import BOOLEANS_FALSE, BOOLEANS_TRUE
+from ansible.module_utils.common.validation import (
+  check_mutually_exclusive,
+  check_required_arguments,
+  check_required_one_of,
+  check_required_together,
+  check_type_bool,
+  check_type_dict,
+  check_type_float,
+  check_type_int,
+  check_type_list,
+  check_type_raw,
+  check_type_str
+)
+
+TYPE_CHECKERS = {
+  'str': check_type_str,
+  'list': check_type_list,
+  'dict': check_type_dict,
+  'bool': check_type_bool,
+  'int': check_type_int,
+  'float': check_type_float,
+  'path': check_type_str,
+  'raw': check_type_raw
+}
+
+
+class ArgumentSpecError(Exception):
+  pass
+
+
+def _fail(msg, context):
+  if context:
+    msg += ' found in %s' % ' -> '.join(context)
+  raise ArgumentSpecError(msg)
+
+
+def _check_terms(checker, terms, params, context):
+  if not terms:
+    return
+  try:
+    checker(terms, params)
+  except TypeError as e:
+    _fail(to_native(e), context)
+
+
+def _check_unsupported(name, spec, params, context):
+  unsupported = [k for k in params if k not in spec and not k.startswith('_ansible_')]
+  if unsupported:
+    msg = 'Unsupported parameters for (%s) module: %s' % (name, ', '.join(sorted(unsupported)))
+    if context:
+      msg += ' found in %s.' % ' -> '.join(context)
+    msg += ' Supported parameters include: %s' % ', '.join(sorted(spec.keys()))
+    raise ArgumentSpecError(msg)
+
+
+def _set_defaults(spec, params):
+  for k, v in spec.items():
+    default = v.get('default')
+    if k not in params and default is not None:
+      params[k] = default
+
+
+def _check_types(spec, params, context):
+  for k, v in spec.items():
+    value = params.get(k)
+    if value is None:
+      continue
+
+    wanted = v.get('type') or 'str'
+    checker = TYPE_CHECKERS.get(wanted)
+    if checker is None:
+      _fail('implementation error: unknown type %s requested for %s' % (wanted, k), context)
+
+    try:
+      params[k] = checker(value)
+      elements = v.get('elements')
+      if elements:
+        element_checker = TYPE_CHECKERS.get(elements, check_type_str)
+        params[k] = [element_checker(item) for item in params[k]]
+    except (TypeError, ValueError) as e:
+      _fail('argument %s is of type %s and we were unable to convert to %s: %s' % (k, type(value), wanted, to_native(e)), context)
+
+
+def _check_choices(spec, params, context):
+  for k, v in spec.items():
+    choices = v.get('choices')
+    if choices is None or k not in params:
+      continue
+
+    value = params[k]
+    if isinstance(value, list):
+      diff = [item for item in value if item not in choices]
+      if diff:
+        _fail('value of %s must be one or more of: %s. Got no match for: %s' % (
+          k, ', '.join([to_native(c) for c in choices]), ', '.join([to_native(d) for d in diff])), context)
+      continue
+
+    if value in choices:
+      continue
+
+    # yamlが'on'や'no'をboolにしてしまった場合は、選択肢から一意に戻せるなら戻す
+    if value == 'False':
+      overlap = BOOLEANS_FALSE.intersection(choices)
+      if len(overlap) == 1:
+        continue
+    if value == 'True':
+      overlap = BOOLEANS_TRUE.intersection(choices)
+      if len(overlap) == 1:
+        continue
+
+    _fail('value of %s must be one of: %s, got: %s' % (k, ', '.join([to_native(c) for c in choices]), value), context)
+
+
+def _validate(name, spec, params, context, mutually_exclusive=None, required_one_of=None, required_together=None):
+  _check_unsupported(name, spec, params, context)
+  _check_terms(check_mutually_exclusive, mutually_exclusive, params, context)
+  _set_defaults(spec, params)
+  try:
+    check_required_arguments(spec, params)
+  except TypeError as e:
+    _fail(to_native(e), context)
+  _check_types(spec, params, context)
+  _check_choices(spec, params, context)
+  _check_terms(check_required_together, required_together, params, context)
+  _check_terms(check_required_one_of, required_one_of, params, context)
+
+  # aggregateのようにoptionsを持つ引数は要素ごとに検査する
+  for k, v in spec.items():
+    options = v.get('options')
+    if not options or params.get(k) is None:
+      continue
+
+    elements = params[k] if isinstance(params[k], list) else [params[k]]
+    for item in elements:
+      if not isinstance(item, dict):
+        raise ArgumentSpecError('value of %s must be of type dict or list of dict' % k)
+      _validate(
+        name, options, item, context + [k],
+        mutually_exclusive=v.get('mutually_exclusive'),
+        required_one_of=v.get('required_one_of'),
+        required_together=v.get('required_together'))
+
+
+def _copy_params(value):
+  # 検査で書き換えるdictとlistだけを複製する
+  if isinstance(value, dict):
+    return dict((k, _copy_params(v)) for k, v in value.items())
+  if isinstance(value, list):
+    return [_copy_params(v) for v in value]
+  return value
+
+
+def validate_args(name, args, argument_spec, mutually_exclusive=None, required_one_of=None, required_together=None):
+  # タスクの引数をモジュールのargument_specで検査する
+  # 問題があればエラーメッセージを、なければNoneを返す
+  params = _copy_params(dict(args))
+  try:
+    _validate(
+      name, argument_spec, params, [],
+      mutually_exclusive=mutually_exclusive,
+      required_one_of=required_one_of,
+      required_together=required_together)
+  except ArgumentSpecError as e:
+    return to_native(e)
+  return None
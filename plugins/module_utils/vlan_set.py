@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# VLAN番号の集合を4096ビットのビットマップ(int)で持つ
+#
+# '1-4094'のような文字列を数字のリストに展開せずに扱えるので、
+# トランクが何千本あってもメモリとCPUを食わない
+#
+# 使い方
+#   VlanSet.parse('1-10,20')            文字列から作る
+#   a | b, a - b, a & b                和、差、積
+#   str(VlanSet.parse('1,2,3,5'))      -> '1-3,5'
+#   for start, stop in s.ranges()      連続した範囲ごとに取り出す
+#
+
+MAX_VLAN_ID = 4095
+
+
+class VlanSet(object):
+
+  __slots__ = ('bits',)
+
+  def __init__(self, vlans=None, bits=0):
+    if vlans:
+      for vlan in vlans:
+        bits |= 1 << self.check_id(vlan)
+    self.bits = bits
+
+
+  @staticmethod
+  def check_id(vlan):
+    try:
+      vlan = int(vlan)
+    except (TypeError, ValueError):
+      raise ValueError('vlan id should be number, {}'.format(vlan))
+    if vlan < 0 or vlan > MAX_VLAN_ID:
+      raise ValueError('vlan id out of range, {}'.format(vlan))
+    return vlan
+
+
+  @classmethod
+  def parse(cls, vlan_str):
+    """IOSの範囲表記('1-10,20', 'ALL', 'none')を読み込む、Noneを渡すとNoneを返す"""
+    if vlan_str is None:
+      return None
+
+    if not isinstance(vlan_str, str):
+      vlan_str = str(vlan_str)
+
+    # convert 'ALL' to 1-4094
+    if vlan_str.lower() == 'all':
+      vlan_str = '1-4094'
+
+    bits = 0
+    if vlan_str:
+      for part in vlan_str.split(','):
+        if part.strip().lower() == 'none':
+          break
+        start, _, stop = part.partition('-')
+        start = cls.check_id(start)
+        stop = cls.check_id(stop) if stop else start
+        if stop >= start:
+          # start..stopのビットをまとめて立てる
+          bits |= ((1 << (stop - start + 1)) - 1) << start
+
+    return cls(bits=bits)
+
+
+  def ranges(self):
+    """(start, stop)を小さい順に返す"""
+    bits = self.bits
+    while bits:
+      # 一番下の立っているビットの位置
+      start = (bits & -bits).bit_length() - 1
+      # そこから連続して立っているビットの数
+      run = bits >> start
+      length = (run ^ (run + 1)).bit_length() - 1
+      yield start, start + length - 1
+      bits &= ~(((1 << length) - 1) << start)
+
+
+  def __iter__(self):
+    for start, stop in self.ranges():
+      for vlan in range(start, stop + 1):
+        yield vlan
+
+
+  def __str__(self):
+    results = []
+    for start, stop in self.ranges():
+      if start == stop:
+        results.append(str(start))
+      else:
+        results.append('{}-{}'.format(start, stop))
+    return ','.join(results)
+
+
+  def __repr__(self):
+    return 'VlanSet({!r})'.format(str(self))
+
+
+  def __contains__(self, vlan):
+    try:
+      vlan = int(vlan)
+    except (TypeError, ValueError):
+      return False
+    return 0 <= vlan <= MAX_VLAN_ID and bool(self.bits >> vlan & 1)
+
+
+  def __len__(self):
+    return bin(self.bits).count('1')
+
+
+  def __bool__(self):
+    return self.bits != 0
+
+  __nonzero__ = __bool__
+
+
+  def __eq__(self, other):
+    if not isinstance(other, VlanSet):
+      return NotImplemented
+    return self.bits == other.bits
+
+
+  def __ne__(self, other):
+    if not isinstance(other, VlanSet):
+      return NotImplemented
+    return self.bits != other.bits
+
+
+  def __hash__(self):
+    return hash(self.bits)
+
+
+  def __or__(self, other):
+    return VlanSet(bits=self.bits | other.bits)
+
+
+  def __and__(self, other):
+    return VlanSet(bits=self.bits & other.bits)
+
+
+  def __sub__(self, other):
+    return VlanSet(bits=self.bits & ~other.bits)
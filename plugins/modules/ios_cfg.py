@@ -18,9 +18,51 @@ options:
       - The ordered set of commands that should be sent to the remote device.
     aliases: ['commands']
 
+  chunk_size:
+    description:
+      - Number of lines sent at a time.
+      - If greater than 0, lines are sent in chunks within one configure terminal session,
+        instead of all at once.
+    type: int
+    default: 0
+
+  chunk_pause:
+    description:
+      - Seconds to wait between chunks, used with chunk_size.
+    type: float
+    default: 0
+
+  defer:
+    description:
+      - If true, lines are not sent but queued in the host fact iida_local_ios_cfg_queue.
+    type: bool
+    default: false
+
+  flush:
+    description:
+      - If true, queued lines and lines of this task are sent in one configure terminal session, and the queue is cleared.
+      - Context lines entered again just after exit, such as interface X / exit / interface X, are coalesced.
+    type: bool
+    default: false
+
 """
 
 EXAMPLES = r"""
+- name: push large access-list 500 lines at a time
+  iida.local.ios_cfg:
+    lines: "{{ r.commands }}"
+    chunk_size: 500
+    chunk_pause: 0.5
+
+- name: queue commands of each resource
+  iida.local.ios_cfg:
+    lines: "{{ item.commands }}"
+    defer: true
+  loop: "{{ results }}"
+
+- name: push queued commands at once
+  iida.local.ios_cfg:
+    flush: true
 """
 
 RETURN = """
@@ -33,19 +75,80 @@ updates:
   description: The set of commands sent to the remote device
   returned: when commands was sent
   type: list
+
+chunks:
+  description: The number of lines and elapsed seconds of each chunk
+  returned: when commands was sent
+  type: list
+  sample: [{"lines": 500, "elapsed": 12.3}, {"lines": 120, "elapsed": 3.1}]
+
+queued:
+  description: The number of lines in the queue, before flush when flush is true
+  returned: when defer or flush is true
+  type: int
 """
 
-from ansible.module_utils.network.ios.ios import ios_argument_spec
+import time
+
+from ansible.module_utils._text import to_text
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.connection import ConnectionError
+from ansible.module_utils.network.ios.ios import ios_argument_spec
+from ansible.module_utils.network.ios.ios import get_connection
 from ansible.module_utils.network.ios.ios import load_config
 
 
+def to_chunks(lines, chunk_size):
+  """split lines into lists of chunk_size lines
+  """
+
+  # load_config()と同じく、endと!で始まる行は送らない
+  lines = [line for line in lines if line != 'end' and not line.startswith('!')]
+  return [lines[i:i + chunk_size] for i in range(0, len(lines), chunk_size)]
+
+
+def load_config_chunks(module, lines, chunk_size, chunk_pause):
+  """send lines chunk by chunk in one configure terminal session
+
+  returns the number of lines and elapsed time of each chunk
+  """
+
+  # load_config()は呼ぶたびにconfigure terminalからendまでを実行するので、
+  # チャンクごとに呼ぶとinterfaceなどのコンテキストがチャンクの境目で切れてしまう
+  # configure terminalに一度だけ入り、チャンクごとにrun_commandsで送る
+  connection = get_connection(module)
+  chunks = []
+
+  try:
+    connection.get('configure terminal')
+    for i, chunk in enumerate(to_chunks(lines, chunk_size)):
+      if i and chunk_pause:
+        time.sleep(chunk_pause)
+      start = time.time()
+      connection.run_commands(commands=chunk, check_rc=True)
+      chunks.append({'lines': len(chunk), 'elapsed': time.time() - start})
+    connection.get('end')
+  except ConnectionError as exc:
+    # 途中で失敗してもコンフィグモードからは抜けておく
+    try:
+      connection.get('end')
+    except ConnectionError:
+      pass
+    module.fail_json(msg=to_text(exc), chunks=chunks, failed_chunk=len(chunks))
+
+  return chunks
+
+
 def main():
   """main entry point for module execution
   """
 
   argument_spec = dict(
     lines=dict(type='list', aliases=['commands'], required=True),
+    chunk_size=dict(type='int', default=0),
+    chunk_pause=dict(type='float', default=0),
+    defer=dict(type='bool', default=False),
+    flush=dict(type='bool', default=False)
   )
 
   argument_spec.update(ios_argument_spec)
@@ -60,6 +163,13 @@ def main():
   }
 
   lines = module.params['lines']
+  chunk_size = module.params['chunk_size']
+  chunk_pause = module.params['chunk_pause']
+
+  if chunk_size < 0:
+    module.fail_json(msg='chunk_size must be 0 or greater')
+  if chunk_pause < 0:
+    module.fail_json(msg='chunk_pause must be 0 or greater')
 
   result.update({
     'commands': lines,
@@ -68,11 +178,17 @@ def main():
 
   if lines:
     if not module.check_mode:
-      load_config(module, lines)
+      if chunk_size:
+        chunks = load_config_chunks(module, lines, chunk_size, chunk_pause)
+      else:
+        start = time.time()
+        load_config(module, lines)
+        chunks = [{'lines': len(lines), 'elapsed': time.time() - start}]
 
       result.update({
         'changed': True,
-        'updates': lines
+        'updates': lines,
+        'chunks': chunks
       })
 
   module.exit_json(**result)
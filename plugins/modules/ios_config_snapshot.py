@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-module-docstring
+
+ANSIBLE_METADATA = {'metadata_version': '0.1', 'status': ['preview'], 'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: iida.local.ios_config_snapshot
+
+short_description: parse running-config once and save it as a snapshot file
+
+version_added: 2.9
+
+description:
+  - parse running-config once and write the section tree and have list of each resource module to a file.
+  - other modules of this collection accept the file as snapshot_path in place of running_config.
+
+notes:
+  - The snapshot is JSON compressed by zlib, loading it does not run any code.
+  - The sha256 in the header detects a broken file, it does not authenticate the file.
+
+options:
+
+  running_config:
+    description:
+      - show running-config output on the remote device
+
+  running_config_path:
+    description:
+      - file path to the running-config
+
+  snapshot_path:
+    description:
+      - file path to write the snapshot
+    required: True
+
+  resources:
+    description:
+      - list of resource modules whose have list is stored in the snapshot.
+      - Modules not listed here parse the config stored in the snapshot instead.
+    type: list
+    default: ['ios_hsrp', 'ios_interface', 'ios_interface_address', 'ios_interface_trunk', 'ios_linkagg', 'ios_static_route', 'ios_vlan']
+
+  cache_dir:
+    description:
+      - directory to store parsed running-config, keyed by sha256 of the config.
+      - If set, unchanged running-config is not parsed again on the next run.
+      - Compiled Jinja2 templates given by *_path arguments are also stored, using the bytecode cache of Jinja2.
+      - The directory must be owned by the current user and not writable by group or others, because cached files are loaded as code. Otherwise the cache is not used.
+
+  controller_only:
+    description:
+      - If true, the action plugin makes the snapshot on the controller and does not run this module.
+      - Arguments are still validated against this module's argument spec.
+    type: bool
+    default: false
+
+  template:
+    description:
+      - If false, files given by *_path arguments are loaded as is, without Jinja2 templating.
+      - The file is memory-mapped and decoded once, and its contents are not transferred to this module.
+    type: bool
+    default: true
+'''
+
+EXAMPLES = '''
+- name: playbook for module test
+  hosts: localhost
+  connection: local
+  gather_facts: false
+
+  tasks:
+    - name: parse running-config once
+      iida.local.ios_config_snapshot:
+        running_config_path: "{{ inventory_hostname }}.txt"
+        snapshot_path: "{{ inventory_hostname }}.snapshot"
+
+    - name: create config to be pushed
+      iida.local.ios_vlan:
+        snapshot_path: "{{ inventory_hostname }}.snapshot"
+        vlan_id: 2
+        vlan_name: inside
+      register: r
+
+    - debug:
+        var: r
+
+'''
+
+RETURN = '''
+snapshot_path:
+  description: file path of the snapshot
+  returned: always
+  type: str
+
+config_digest:
+  description: sha256 of the running-config stored in the snapshot
+  returned: always
+  type: str
+
+resources:
+  description: resource modules whose have list is stored in the snapshot
+  returned: always
+  type: list
+
+size:
+  description: size of the snapshot file in bytes
+  returned: when the snapshot was written
+  type: int
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+
+RESOURCES = ['ios_hsrp', 'ios_interface', 'ios_interface_address', 'ios_interface_trunk', 'ios_linkagg', 'ios_static_route', 'ios_vlan']
+
+
+def get_module_spec():
+  """argument spec of this module, also used by the action plugin
+  """
+
+  argument_spec = dict(
+    running_config=dict(type='str'),
+    running_config_path=dict(type='path'),
+    snapshot_path=dict(type='path', required=True),
+    resources=dict(type='list', elements='str', choices=RESOURCES, default=RESOURCES),
+    cache_dir=dict(type='path'),
+    controller_only=dict(type='bool', default=False),
+    template=dict(type='bool', default=True),
+    debug=dict(type='bool')
+  )
+
+  required_one_of = [
+    ('running_config', 'running_config_path')
+  ]
+
+  mutually_exclusive = [
+    ('running_config', 'running_config_path')
+  ]
+
+  return dict(
+    argument_spec=argument_spec,
+    required_one_of=required_one_of,
+    mutually_exclusive=mutually_exclusive
+  )
+
+
+def main():
+  """main entry point for module execution
+  """
+
+  module = AnsibleModule(supports_check_mode=True, **get_module_spec())
+
+  result = {'changed': False}
+
+  module.exit_json(**result)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,158 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-module-docstring
+
+ANSIBLE_METADATA = {'metadata_version': '0.1', 'status': ['preview'], 'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: iida.local.ios_fleet_diff
+
+short_description: IOS config generator for many devices in one task
+
+version_added: 2.9
+
+description:
+  - generate config of many devices from one task, like iida.local.ios_intent for each device.
+  - devices are processed by a pool of worker processes on the controller.
+
+author:
+  - Takamitsu IIDA (@takamitsu-iida)
+
+notes:
+  - Tested against Catalyst 3560G
+  - Files given by *_path arguments of each device are loaded as is, without Jinja2 templating.
+
+options:
+  hosts:
+    description:
+      - mapping of device name to its arguments.
+      - Each value takes running_config or running_config_path or snapshot_path,
+        show_vlan or show_vlan_path, show_interfaces_switchport or show_interfaces_switchport_path, and intent.
+      - intent is the same as the intent of iida.local.ios_intent.
+    type: dict
+    required: True
+
+  workers:
+    description:
+      - number of worker processes, 0 means the number of cores.
+    type: int
+    default: 0
+
+  max_tasks_per_worker:
+    description:
+      - number of devices a worker process handles before it is replaced by a new one, 0 means no limit.
+      - Set this to release memory held by parsed configs on a large fleet.
+    type: int
+    default: 0
+
+  output_dir:
+    description:
+      - directory to write the commands of each device to <device>.txt.
+      - If set, the commands are not returned, only the number of them and the file path,
+        so the size of the result does not grow with the fleet.
+      - When set, device names must consist of letters, digits, '_', '.' and '-', and must not start with '.' or '-'.
+        Devices with other names fail without being processed.
+
+  cache_dir:
+    description:
+      - directory to store parsed running-config, keyed by sha256 of the config.
+      - If set, unchanged running-config is not parsed again on the next run.
+      - The directory must be owned by the current user and not writable by group or others, because cached files are loaded as code. Otherwise the cache is not used.
+
+  controller_only:
+    description:
+      - If true, the action plugin makes the commands on the controller and does not run this module.
+      - Arguments are still validated against this module's argument spec.
+    type: bool
+    default: false
+
+  profile:
+    description:
+      - If true, timings of each resource are returned in each device.
+    type: bool
+    default: false
+'''
+
+EXAMPLES = '''
+- name: playbook for module test
+  hosts: localhost
+  connection: local
+  gather_facts: false
+
+  tasks:
+    - name: create config of all devices
+      iida.local.ios_fleet_diff:
+        hosts:
+          r1:
+            running_config_path: r1.txt
+            intent:
+              vlan:
+                vlans:
+                  - vlan_id: 2
+                    vlan_name: inside
+          r2:
+            running_config_path: r2.txt
+            intent: "{{ lookup('file', 'r2_intent.yml') | from_yaml }}"
+        workers: 4
+        output_dir: /tmp/commands
+      register: r
+
+    - debug:
+        var: r
+
+'''
+
+RETURN = '''
+hosts:
+  description: commands, or the number of them and the file path when output_dir is set, and elapsed time of each device
+  returned: always
+  type: dict
+
+counts:
+  description: number of devices, failed devices and commands
+  returned: always
+  type: dict
+
+timings:
+  description: elapsed time in seconds
+  returned: always
+  type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+
+
+def get_module_spec():
+  """argument spec of this module, also used by the action plugin
+  """
+
+  argument_spec = dict(
+    hosts=dict(type='dict', required=True),
+    workers=dict(type='int', default=0),
+    max_tasks_per_worker=dict(type='int', default=0),
+    output_dir=dict(type='path'),
+    cache_dir=dict(type='path'),
+    controller_only=dict(type='bool', default=False),
+    profile=dict(type='bool', default=False),
+    debug=dict(type='bool')
+  )
+
+  return dict(
+    argument_spec=argument_spec
+  )
+
+
+def main():
+  """main entry point for module execution
+  """
+
+  module = AnsibleModule(supports_check_mode=True, **get_module_spec())
+
+  result = {'changed': False}
+
+  module.exit_json(**result)
+
+
+if __name__ == '__main__':
+  main()
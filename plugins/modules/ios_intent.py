@@ -0,0 +1,220 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-module-docstring
+
+ANSIBLE_METADATA = {'metadata_version': '0.1', 'status': ['preview'], 'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: iida.local.ios_intent
+
+short_description: IOS config generator for several resources at once
+
+version_added: 2.9
+
+description:
+  - generate config of vlan, interface, linkagg, trunk, address, hsrp, static route and access-list from one intent document.
+  - running-config and show outputs are parsed once and shared by all resources.
+
+author:
+  - Takamitsu IIDA (@takamitsu-iida)
+
+notes:
+  - Tested against Catalyst 3560G
+
+options:
+  running_config:
+    description:
+      - show running-config output on the remote device
+
+  running_config_path:
+    description:
+      - file path to the running-config
+
+  snapshot_path:
+    description:
+      - file path to the snapshot written by iida.local.ios_config_snapshot.
+      - Used in place of running_config or running_config_path, the pre-parsed have list is loaded from it.
+
+  show_vlan:
+    description:
+      - show vlan output on the remote device, used by interface_trunk
+
+  show_vlan_path:
+    description:
+      - file path to the show vlan output
+
+  show_interfaces_switchport:
+    description:
+      - show interfaces switchport output on the remote device, used by interface_trunk
+
+  show_interfaces_switchport_path:
+    description:
+      - file path to the show interfaces switchport output
+
+  intent:
+    description:
+      - intent document, keyed by resource.
+      - Each value is the arguments of the resource module, or list of them.
+      - running_config, snapshot_path, show outputs and cache_dir given to this module are passed to each resource.
+      - C(parents) in the arguments is not passed to the module, the lines are put before the commands of the resource.
+    type: dict
+    required: True
+    suboptions:
+      vlan:
+        description: arguments of iida.local.ios_vlan
+      interface:
+        description: arguments of iida.local.ios_interface
+      linkagg:
+        description: arguments of iida.local.ios_linkagg
+      interface_trunk:
+        description: arguments of iida.local.ios_interface_trunk
+      interface_address:
+        description: arguments of iida.local.ios_interface_address
+      hsrp:
+        description: arguments of iida.local.ios_hsrp
+      static_route:
+        description: arguments of iida.local.ios_static_route
+      ip_acl:
+        description: arguments of iida.local.ios_ip_acl
+
+  cache_dir:
+    description:
+      - directory to store parsed running-config, keyed by sha256 of the config.
+      - If set, unchanged running-config is not parsed again on the next run.
+      - Compiled Jinja2 templates given by *_path arguments are also stored, using the bytecode cache of Jinja2.
+      - The directory must be owned by the current user and not writable by group or others, because cached files are loaded as code. Otherwise the cache is not used.
+
+  controller_only:
+    description:
+      - If true, the action plugin makes the commands on the controller and does not run this module.
+      - Arguments are still validated against this module's argument spec.
+    type: bool
+    default: false
+
+  template:
+    description:
+      - If false, files given by *_path arguments are loaded as is, without Jinja2 templating.
+      - The file is memory-mapped and decoded once, and its contents are not transferred to this module.
+    type: bool
+    default: true
+
+  scoped:
+    description:
+      - If true, passed to interface, interface_address and hsrp, which make have objects
+        only for the interfaces given in their arguments.
+    type: bool
+    default: false
+
+  profile:
+    description:
+      - If true, passed to each resource, and timings and counts of each resource are returned in resources.
+    type: bool
+    default: false
+'''
+
+EXAMPLES = '''
+- name: playbook for module test
+  hosts: localhost
+  connection: local
+  gather_facts: false
+
+  tasks:
+    - name: create config to be pushed
+      iida.local.ios_intent:
+        running_config_path: "{{ inventory_hostname }}.txt"
+        show_vlan_path: "{{ inventory_hostname }}_vlan.txt"
+        show_interfaces_switchport_path: "{{ inventory_hostname }}_switchport.txt"
+        intent:
+          vlan:
+            vlans:
+              - vlan_id: 2
+                vlan_name: inside
+          interface_trunk:
+            name: GigabitEthernet0/1
+            mode: trunk
+            trunk_vlans: 2
+          ip_acl:
+            parents: ip access-list extended TEST
+            show_access_list: ""
+            acl_cli:
+              - permit ip any any
+      register: r
+
+    - debug:
+        var: r
+
+'''
+
+RETURN = '''
+commands:
+  description: The list of configuration mode commands to send to the remotedevice, in the order of resources
+  returned: always
+  type: list
+
+resources:
+  description: commands and elapsed time of each resource
+  returned: always
+  type: dict
+
+timings:
+  description: elapsed time in seconds of parse, each resource and total
+  returned: always
+  type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+
+# 生成したコマンドを並べる順番
+# VLANを作ってからポートに割り当て、L2が揃ってからL3を設定する
+RESOURCES = ['vlan', 'interface', 'linkagg', 'interface_trunk', 'interface_address', 'hsrp', 'static_route', 'ip_acl']
+
+
+def get_module_spec():
+  """argument spec of this module, also used by the action plugin
+  """
+
+  intent_spec = dict((name, dict(type='raw')) for name in RESOURCES)
+
+  argument_spec = dict(
+    running_config=dict(type='str'),
+    running_config_path=dict(type='path'),
+    snapshot_path=dict(type='path'),
+    show_vlan=dict(type='str'),
+    show_vlan_path=dict(type='path'),
+    show_interfaces_switchport=dict(type='str'),
+    show_interfaces_switchport_path=dict(type='path'),
+    intent=dict(type='dict', required=True, options=intent_spec),
+    cache_dir=dict(type='path'),
+    controller_only=dict(type='bool', default=False),
+    template=dict(type='bool', default=True),
+    scoped=dict(type='bool', default=False),
+    profile=dict(type='bool', default=False),
+    debug=dict(type='bool')
+  )
+
+  mutually_exclusive = [
+    ('running_config', 'running_config_path', 'snapshot_path'),
+    ('show_vlan', 'show_vlan_path'),
+    ('show_interfaces_switchport', 'show_interfaces_switchport_path')
+  ]
+
+  return dict(
+    argument_spec=argument_spec,
+    mutually_exclusive=mutually_exclusive
+  )
+
+
+def main():
+  """main entry point for module execution
+  """
+
+  module = AnsibleModule(supports_check_mode=True, **get_module_spec())
+
+  result = {'changed': False}
+
+  module.exit_json(**result)
+
+
+if __name__ == '__main__':
+  main()
@@ -32,6 +32,38 @@ options:
       - file path to the running-config
     required: True
 
+  snapshot_path:
+    description:
+      - file path to the snapshot written by iida.local.ios_config_snapshot.
+      - Used in place of running_config or running_config_path, the pre-parsed have list is loaded from it.
+
+  cache_dir:
+    description:
+      - directory to store compiled Jinja2 templates given by *_path arguments, using the bytecode cache of Jinja2.
+      - Parsed running-config of this module is not stored, because each parameter is parsed only when it is read.
+      - The directory must be owned by the current user and not writable by group or others, because cached files are loaded as code. Otherwise the cache is not used.
+
+  controller_only:
+    description:
+      - If true, the action plugin makes the commands on the controller and does not run this module.
+      - Arguments are still validated against this module's argument spec.
+    type: bool
+    default: false
+
+  template:
+    description:
+      - If false, files given by *_path arguments are loaded as is, without Jinja2 templating.
+      - The file is memory-mapped and decoded once, and its contents are not transferred to this module.
+    type: bool
+    default: true
+
+  profile:
+    description:
+      - If true, elapsed time of each phase of the action plugin and counts of config lines, sections,
+        have and want objects and commands are returned in timings and counts.
+    type: bool
+    default: false
+
   show_vlan:
     description:
       - show vlan outut on the remote device
@@ -136,8 +168,8 @@ from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.network.common.utils import remove_default_spec
 
 
-def main():
-  """main entry point for module execution
+def get_module_spec():
+  """argument spec of this module, also used by the action plugin
   """
 
   element_spec = dict(
@@ -162,6 +194,11 @@ def main():
     interfaces=dict(type='list'),
     running_config=dict(type='str'),
     running_config_path=dict(type='path'),
+    snapshot_path=dict(type='path'),
+    cache_dir=dict(type='path'),
+    controller_only=dict(type='bool', default=False),
+    template=dict(type='bool', default=True),
+    profile=dict(type='bool', default=False),
     show_vlan=dict(type='str'),
     show_vlan_path=dict(type='path'),
     show_interfaces_switchport=dict(type='str'),
@@ -173,7 +210,7 @@ def main():
 
   required_one_of = [
     ('interfaces', 'name', 'aggregate'),
-    ('running_config', 'running_config_path'),
+    ('running_config', 'running_config_path', 'snapshot_path'),
     ('show_vlan', 'show_vlan_path'),
     ('show_interfaces_switchport', 'show_interfaces_switchport_path')
   ]
@@ -182,16 +219,23 @@ def main():
     ('name', 'aggregate'),
     ('access_vlan', 'trunk_vlans'),
     ('access_vlan', 'native_vlan'),
-    ('running_config', 'running_config_path'),
+    ('running_config', 'running_config_path', 'snapshot_path'),
     ('show_vlan', 'show_vlan_path'),
     ('show_interfaces_switchport', 'show_interfaces_switchport_path')
   ]
 
-  module = AnsibleModule(
+  return dict(
     argument_spec=argument_spec,
     required_one_of=required_one_of,
-    mutually_exclusive=mutually_exclusive,
-    supports_check_mode=True)
+    mutually_exclusive=mutually_exclusive
+  )
+
+
+def main():
+  """main entry point for module execution
+  """
+
+  module = AnsibleModule(supports_check_mode=True, **get_module_spec())
 
   result = {
     'changed': False
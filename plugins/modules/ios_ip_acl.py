@@ -31,6 +31,27 @@ options:
     description:
       - intent config of ip access-list
     required: True
+
+  controller_only:
+    description:
+      - If true, the action plugin makes the commands on the controller and does not run this module.
+      - Arguments are still validated against this module's argument spec.
+    type: bool
+    default: false
+
+  template:
+    description:
+      - If false, files given by *_path arguments are loaded as is, without Jinja2 templating.
+      - The file is memory-mapped and decoded once, and its contents are not transferred to this module.
+    type: bool
+    default: true
+
+  profile:
+    description:
+      - If true, elapsed time of each phase of the action plugin and counts of config lines, sections,
+        have and want objects and commands are returned in timings and counts.
+    type: bool
+    default: false
 '''
 
 EXAMPLES = '''
@@ -69,13 +90,16 @@ commands:
 from ansible.module_utils.basic import AnsibleModule
 
 
-def main():
-  """main entry point for module execution
+def get_module_spec():
+  """argument spec of this module, also used by the action plugin
   """
 
   argument_spec = dict(
     show_access_list=dict(type='str'),
     show_access_list_path=dict(type='path'),
+    controller_only=dict(type='bool', default=False),
+    template=dict(type='bool', default=True),
+    profile=dict(type='bool', default=False),
     acl_cli=dict(type='list', required=True),
     debug=dict(default=False, types='bool')
   )
@@ -88,11 +112,18 @@ def main():
     ('show_access_list', 'show_access_list_path')
   ]
 
-  module = AnsibleModule(
+  return dict(
     argument_spec=argument_spec,
     required_one_of=required_one_of,
-    mutually_exclusive=mutually_exclusive,
-    supports_check_mode=True)
+    mutually_exclusive=mutually_exclusive
+  )
+
+
+def main():
+  """main entry point for module execution
+  """
+
+  module = AnsibleModule(supports_check_mode=True, **get_module_spec())
 
   result = {
     'changed': False
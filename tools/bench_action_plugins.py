@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+"""benchmark of every action plugin against a generated large config
+
+drive map_config_to_obj, map_params_to_obj, validate and to_commands_list
+of each ActionModule offline, and report time and peak memory of each phase.
+
+usage: python -m tools.bench_action_plugins [-s scale] [-r repeat] [--resources vlan,hsrp] [--no-memory]
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import timeit
+
+from collections import OrderedDict
+
+try:
+  import tracemalloc
+except ImportError:
+  tracemalloc = None
+
+from tools import collection_path
+collection_path.setup()
+
+# pylint: disable=wrong-import-position
+from ansible.playbook.task import Task
+from ansible_collections.iida.local.plugins.module_utils.config_index import ConfigIndex
+from ansible_collections.iida.local.plugins.module_utils.parse_cache import PARSE_CACHE
+from ansible_collections.iida.local.plugins.action.ios_hsrp import ActionModule as HsrpAction
+from ansible_collections.iida.local.plugins.action.ios_interface import ActionModule as InterfaceAction
+from ansible_collections.iida.local.plugins.action.ios_interface_address import ActionModule as InterfaceAddressAction
+from ansible_collections.iida.local.plugins.action.ios_interface_trunk import ActionModule as InterfaceTrunkAction
+from ansible_collections.iida.local.plugins.action.ios_ip_acl import ActionModule as IpAclAction
+from ansible_collections.iida.local.plugins.action.ios_linkagg import ActionModule as LinkaggAction
+from ansible_collections.iida.local.plugins.action.ios_static_route import ActionModule as StaticRouteAction
+from ansible_collections.iida.local.plugins.action.ios_vlan import ActionModule as VlanAction
+from tools.generate_config import add_scale_arguments, generator_from_args
+
+
+#
+# リソースごとの各フェーズ
+# run()の中でモジュール実行後に行う処理と同じ順番で呼ぶ
+# 各関数は(アクションプラグイン, 入力と前のフェーズの結果のdict)を受け取る
+#
+
+def map_config(action, state):
+  return action.map_config_to_obj(state['running_config'])
+
+
+def map_params(action, state):
+  del state
+  return action.map_params_to_obj()
+
+
+def validate(action, state):
+  return action.validate(state['want'])
+
+
+def to_commands_list(action, state):
+  return action.to_commands_list(state['want'], state['have'])
+
+
+def trunk_map_config(action, state):
+  have_list = action.map_config_to_obj(state['running_config'])
+  switchport_list = action.map_show_interfaces_switchport_to_obj(state['show_interfaces_switchport'])
+  switchport_index = dict((o.get('name'), o) for o in switchport_list)
+  for item in have_list:
+    o = switchport_index.get(item.get('name'))
+    if o:
+      item.update(o)
+  state['vlan_list'] = action.map_show_vlan_to_obj(state['show_vlan'])
+  return have_list
+
+
+def trunk_validate(action, state):
+  return action.validate_list(state['want'], state['have'], state['vlan_list'])
+
+
+def static_route_to_commands(action, state):
+  return action.to_commands(state['want'], state['have'])
+
+
+def acl_map_config(action, state):
+  return action.parse_show_lines(action.sanitize(state['show_access_list'].splitlines()))
+
+
+def acl_map_params(action, state):
+  del state
+  return action._task.args.get('acl_cli')  # pylint: disable=protected-access
+
+
+def acl_validate(action, state):
+  return action.check_remark(state['want'])
+
+
+def acl_to_commands(action, state):
+  return action.edit_script(state['have'], state['want'])
+
+
+DEFAULT_PHASES = [
+  ('map_config_to_obj', map_config),
+  ('map_params_to_obj', map_params),
+  ('validate', validate),
+  ('to_commands_list', to_commands_list)
+]
+
+# intentのキー -> (モジュール名, アクションプラグイン, フェーズ)
+RESOURCES = OrderedDict([
+  ('vlan', ('iida.local.ios_vlan', VlanAction, DEFAULT_PHASES)),
+  ('interface', ('iida.local.ios_interface', InterfaceAction, DEFAULT_PHASES)),
+  ('linkagg', ('iida.local.ios_linkagg', LinkaggAction, DEFAULT_PHASES)),
+  ('interface_trunk', ('iida.local.ios_interface_trunk', InterfaceTrunkAction, [
+    ('map_config_to_obj', trunk_map_config),
+    ('map_params_to_obj', map_params),
+    ('validate', trunk_validate),
+    ('to_commands_list', to_commands_list)])),
+  ('interface_address', ('iida.local.ios_interface_address', InterfaceAddressAction, DEFAULT_PHASES)),
+  ('hsrp', ('iida.local.ios_hsrp', HsrpAction, DEFAULT_PHASES)),
+  ('static_route', ('iida.local.ios_static_route', StaticRouteAction, [
+    ('map_config_to_obj', map_config),
+    ('map_params_to_obj', map_params),
+    ('validate', validate),
+    ('to_commands', static_route_to_commands)])),
+  ('ip_acl', ('iida.local.ios_ip_acl', IpAclAction, [
+    ('map_config_to_obj', acl_map_config),
+    ('map_params_to_obj', acl_map_params),
+    ('validate', acl_validate),
+    ('to_commands_list', acl_to_commands)]))
+])
+
+# フェーズの結果を次のフェーズに渡すときの名前
+RESULT_KEYS = {'map_config_to_obj': 'have', 'map_params_to_obj': 'want'}
+
+
+def make_action(name, args):
+  # 装置に接続しないので、タスク以外は使わない
+  action, action_class, _ = RESOURCES[name]
+  task = Task()
+  task.action = action
+  task.args = args
+  return action_class(task, None, None, None, None, None)
+
+
+def measure(func, repeat, memory):
+  # 時間はtracemallocなしで計り、ピークメモリは別にもう一度実行して計る
+  result = [None]
+
+  def call():
+    result[0] = func()
+
+  elapsed = min(timeit.repeat(call, number=1, repeat=repeat))
+
+  peak = None
+  if memory and tracemalloc is not None:
+    tracemalloc.start()
+    try:
+      func()
+      _, peak = tracemalloc.get_traced_memory()
+    finally:
+      tracemalloc.stop()
+
+  return result[0], elapsed, peak
+
+
+def count(value):
+  if value is None or isinstance(value, bool):
+    return ''
+  if isinstance(value, (list, tuple, dict)):
+    return len(value)
+  return 1
+
+
+def print_row(resource, phase, elapsed, peak, num):
+  peak = '' if peak is None else '{:.1f}'.format(peak / 1024.0 / 1024.0)
+  print('{:<18} {:<18} {:>10.1f} {:>10} {:>10}'.format(resource, phase, elapsed * 1000, peak, num))
+
+
+def main():
+  parser = argparse.ArgumentParser(description='benchmark action plugins offline against a generated config')
+  add_scale_arguments(parser)
+  parser.add_argument('-r', '--repeat', type=int, default=3, help='number of repeats, best time is reported')
+  parser.add_argument('--resources', default=','.join(RESOURCES), help='comma separated resources to run')
+  parser.add_argument('--no-memory', dest='memory', action='store_false', help='do not measure peak memory')
+  args = parser.parse_args()
+
+  names = [name for name in args.resources.split(',') if name]
+  unknown = [name for name in names if name not in RESOURCES]
+  if unknown:
+    raise SystemExit('unknown resources: {}'.format(', '.join(unknown)))
+
+  generator = generator_from_args(args)
+  data = generator.generate()
+  print(', '.join('{}: {}'.format(k, v) for k, v in generator.scale.items()))
+  print('running-config: {} lines, {} bytes'.format(data['running_config'].count('\n'), len(data['running_config'])))
+  print('')
+  print('{:<18} {:<18} {:>10} {:>10} {:>10}'.format('resource', 'phase', 'ms', 'peak MB', 'count'))
+
+  # running-configのパースは全リソースで共有するので、キャッシュを通さずに計ってから
+  # 各リソースが使うPARSE_CACHEに入れておく
+  index, elapsed, peak = measure(lambda: ConfigIndex(data['running_config']), args.repeat, args.memory)
+  index.find('interface')
+  PARSE_CACHE.put_index(data['running_config'], index)
+  print_row('(shared)', 'config index', elapsed, peak, '')
+
+  for name in names:
+    action = make_action(name, data['intent'][name])
+    state = dict((k, v) for k, v in data.items() if k != 'intent')
+    total = 0.0
+    for phase, func in RESOURCES[name][2]:
+      result, elapsed, peak = measure(lambda f=func: f(action, state), args.repeat, args.memory)
+      if phase in RESULT_KEYS:
+        state[RESULT_KEYS[phase]] = result
+      total += elapsed
+      print_row(name, phase, elapsed, peak, count(result))
+      if phase == 'validate' and result:
+        print('  validate failed: {}'.format(str(result)[:200]))
+    print_row(name, 'total', total, None, '')
+
+
+if __name__ == '__main__':
+  main()
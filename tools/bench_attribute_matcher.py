@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+"""benchmark of the attribute matcher table
+
+compare the per-parameter scans with AttributeMatcher which classifies
+each child line once.
+
+usage: python -m tools.bench_attribute_matcher [-n interfaces] [-r repeat]
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import re
+import timeit
+
+from tools import collection_path
+collection_path.setup()
+
+# pylint: disable=wrong-import-position
+from ansible_collections.iida.local.plugins.module_utils.config_index import ConfigIndex
+from ansible_collections.iida.local.plugins.action.ios_interface import ActionModule as InterfaceAction
+
+
+def make_config(num_interfaces):
+  lines = ['!', 'hostname bench', '!']
+  for i in range(num_interfaces):
+    lines.extend([
+      'interface GigabitEthernet1/0/{}'.format(i + 1),
+      ' description port {}'.format(i + 1),
+      ' switchport access vlan {}'.format(i % 100 + 2),
+      ' switchport mode access',
+      ' ip mtu 1400',
+      ' speed 1000',
+      ' duplex full',
+      ' no negotiation auto',
+      ' spanning-tree portfast',
+      ' shutdown' if i % 3 == 0 else ' no shutdown',
+      '!'
+    ])
+  lines.append('end')
+  return '\n'.join(lines)
+
+
+#
+# 以前の実装: パラメータごとに正規表現を作ってセクション全体を検索する
+#
+
+def regex_scan(index, names):
+  results = []
+  for name in names:
+    cfg = '\n'.join(index.children('interface {}'.format(name)))
+    obj = {}
+    for arg in ('description', 'speed', 'duplex', 'mtu'):
+      match = re.search(r'^{} (.+)$'.format(arg), cfg, re.M)
+      obj[arg] = match.group(1) if match else None
+    obj['negotiation'] = bool(re.search(r'^negotiation auto', cfg, re.M))
+    obj['shutdown'] = bool(re.search(r'^shutdown', cfg, re.M))
+    results.append(obj)
+  return results
+
+
+#
+# 以前の実装: パラメータごとに子の行を先頭から走査する
+#
+
+def prefix_scan(index, names):
+  results = []
+  for name in names:
+    children = index.children('interface {}'.format(name))
+    obj = {}
+    for arg in ('description', 'speed', 'duplex', 'mtu'):
+      obj[arg] = None
+      prefix = arg + ' '
+      for line in children:
+        if line.startswith(prefix):
+          obj[arg] = line[len(prefix):]
+          break
+    obj['negotiation'] = any(line.startswith('negotiation auto') for line in children)
+    obj['shutdown'] = any(line.startswith('shutdown') for line in children)
+    results.append(obj)
+  return results
+
+
+#
+# AttributeMatcher: 子の行を一度だけ走査する
+#
+
+def matcher_scan(index, names):
+  matcher = InterfaceAction.CONFIG_ATTRIBUTES
+  return [matcher.match(index.children('interface {}'.format(name))) for name in names]
+
+
+def main():
+  parser = argparse.ArgumentParser(description='benchmark AttributeMatcher against per-parameter scans')
+  parser.add_argument('-n', '--interfaces', type=int, default=2000, help='number of interfaces')
+  parser.add_argument('-r', '--repeat', type=int, default=5, help='number of repeats, best time is reported')
+  args = parser.parse_args()
+
+  config = make_config(args.interfaces)
+  index = ConfigIndex(config)
+  names = index.find('interface')
+
+  expected = regex_scan(index, names)
+  funcs = [('regex per parameter', regex_scan), ('prefix per parameter', prefix_scan), ('attribute matcher', matcher_scan)]
+
+  print('interfaces: {}, config: {} bytes'.format(len(names), len(config)))
+  base = None
+  for label, func in funcs:
+    if func(index, names) != expected:
+      raise SystemExit('{} returned a different result'.format(label))
+    best = min(timeit.repeat(lambda f=func: f(index, names), number=1, repeat=args.repeat))
+    base = best if base is None else base
+    print('{:<22} {:>10.2f} ms  x{:.1f}'.format(label, best * 1000, base / best))
+
+
+if __name__ == '__main__':
+  main()
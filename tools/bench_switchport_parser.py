@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+"""benchmark of the show interfaces switchport parser
+
+compare the section split + per-field regex parser with the line-at-a-time
+parser of ios_interface_trunk.
+
+usage: python -m tools.bench_switchport_parser [-m members] [-p ports] [-r repeat]
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import re
+import timeit
+
+from tools import collection_path
+collection_path.setup()
+
+# pylint: disable=wrong-import-position
+from ansible_collections.iida.local.plugins.action.ios_interface_trunk import ActionModule as TrunkAction
+
+SECTION = '''Name: Gi{member}/0/{port}
+Switchport: Enabled
+Administrative Mode: {mode}
+Operational Mode: down
+Administrative Trunking Encapsulation: dot1q
+Negotiation of Trunking: {negotiation}
+Access Mode VLAN: {access} (VLAN{access:04d})
+Trunking Native Mode VLAN: 1 (default)
+Administrative Native VLAN tagging: enabled
+Voice VLAN: none
+Administrative private-vlan host-association: none
+Administrative private-vlan mapping: none
+Administrative private-vlan trunk native VLAN: none
+Administrative private-vlan trunk Native VLAN tagging: enabled
+Administrative private-vlan trunk encapsulation: dot1q
+Administrative private-vlan trunk normal VLANs: none
+Administrative private-vlan trunk associations: none
+Administrative private-vlan trunk mappings: none
+Operational private-vlan: none
+Trunking VLANs Enabled: {trunk}
+Pruning VLANs Enabled: 2-1001
+Capture Mode Disabled
+Capture VLANs Allowed: ALL
+Protected: false
+Unknown unicast blocked: disabled
+Unknown multicast blocked: disabled
+Appliance trust: none
+'''
+
+
+def make_output(members, ports):
+  sections = []
+  for member in range(1, members + 1):
+    for port in range(1, ports + 1):
+      trunk = 'ALL' if port % 2 else '{}-{},{}'.format(port + 1, port + 10, port + 100)
+      sections.append(SECTION.format(
+        member=member,
+        port=port,
+        mode='trunk' if port % 2 else 'dynamic auto',
+        negotiation='Off' if port % 3 == 0 else 'On',
+        access=port % 100 + 2,
+        trunk=trunk))
+  return '\n'.join(sections)
+
+
+#
+# 以前の実装: Name:ごとにセクションの文字列を作り、項目ごとに正規表現で検索する
+#
+
+def section_regex_parse(text):
+  sections = []
+  lines = []
+  for line in text.splitlines():
+    if line.strip() == '':
+      continue
+    if re.search(r'^Name:', line):
+      if lines:
+        sections.append('\n'.join(lines))
+        lines = []
+    lines.append(line)
+  if lines:
+    sections.append('\n'.join(lines))
+
+  results = []
+  for section in sections:
+    m = re.search(r'Name: (.*)$', section, re.M)
+    if not m:
+      continue
+    name = TrunkAction.normalize_name(m.group(1))
+    mode = re.search(r'Administrative Mode: (?:.* )?(\w+)$', section, re.M).group(1)
+    switchport = re.search(r'Switchport: (\S+)$', section, re.M).group(1)
+    access = re.search(r'Access Mode VLAN: (\d+)', section).group(1)
+    native = re.search(r'Trunking Native Mode VLAN: (\d+)', section).group(1)
+    trunk = re.search(r'Trunking VLANs Enabled: (.+)$', section, re.M).group(1)
+    negotiation = re.search(r'Negotiation of Trunking: (\S+)$', section, re.M).group(1)
+    results.append({
+      'name': name,
+      'mode': mode,
+      'switchport': switchport,
+      'nonegotiate': bool(negotiation == 'Off'),
+      'access_vlan': access,
+      'native_vlan': native,
+      'trunk_vlans': trunk
+    })
+  return results
+
+
+#
+# 1行ずつ読むパーサ
+#
+
+def streaming_parse(text):
+  results = []
+  for obj in TrunkAction.iter_show_interfaces_switchport(text):
+    obj['name'] = TrunkAction.normalize_name(obj['name'])
+    results.append(obj)
+  return results
+
+
+def main():
+  parser = argparse.ArgumentParser(description='benchmark show interfaces switchport parsers')
+  parser.add_argument('-m', '--members', type=int, default=9, help='number of stack members')
+  parser.add_argument('-p', '--ports', type=int, default=48, help='number of ports per member')
+  parser.add_argument('-r', '--repeat', type=int, default=5, help='number of repeats, best time is reported')
+  args = parser.parse_args()
+
+  text = make_output(args.members, args.ports)
+  num_lines = text.count('\n') + 1
+
+  expected = section_regex_parse(text)
+  funcs = [('section + regex', section_regex_parse), ('line-at-a-time', streaming_parse)]
+
+  print('interfaces: {}, lines: {}, output: {} bytes'.format(len(expected), num_lines, len(text)))
+  base = None
+  for label, func in funcs:
+    if func(text) != expected:
+      raise SystemExit('{} returned a different result'.format(label))
+    best = min(timeit.repeat(lambda f=func: f(text), number=1, repeat=args.repeat))
+    base = best if base is None else base
+    print('{:<16} {:>10.2f} ms  {:>10.0f} lines/s  x{:.1f}'.format(label, best * 1000, num_lines / best, base / best))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+#
+# チェックアウトしたディレクトリのままで
+# ansible_collections.iida.local.plugins... をimportできるようにする
+#
+# ~/.ansible/collections にインストールされていればそれは使わず、
+# 一時ディレクトリに ansible_collections/iida/local -> このリポジトリ のシンボリックリンクを作ってsys.pathに追加する
+#
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup():
+  if getattr(setup, 'done', False):
+    return
+  setup.done = True
+
+  tmp_dir = tempfile.mkdtemp(prefix='iida_local_')
+  atexit.register(shutil.rmtree, tmp_dir, True)
+
+  org_dir = os.path.join(tmp_dir, 'ansible_collections', 'iida')
+  os.makedirs(org_dir)
+  os.symlink(REPO_ROOT, os.path.join(org_dir, 'local'))
+
+  sys.path.insert(0, tmp_dir)
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+"""synthetic running-config and show outputs at configurable scale
+
+generate a Catalyst-like running-config, show vlan brief,
+show interfaces switchport and show access-lists outputs, and an intent
+document for ios_intent that differs from the config by --drift.
+
+usage: python -m tools.generate_config [-o dir] [-s scale] [--interfaces N] ...
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import json
+import os
+import random
+
+from collections import OrderedDict
+
+# 既定の規模
+DEFAULTS = OrderedDict([
+  ('interfaces', 10000),
+  ('vlans', 4094),
+  ('static_routes', 500000),
+  ('acl_entries', 20000),
+  ('hsrp_groups', 2000),
+  ('port_channels', 500)
+])
+
+PORTS_PER_MEMBER = 48
+
+# 作成できないVLAN
+RESERVED_VLANS = (1002, 1003, 1004, 1005)
+
+SWITCHPORT = '''Name: {name}
+Switchport: Enabled
+Administrative Mode: {mode}
+Operational Mode: down
+Administrative Trunking Encapsulation: dot1q
+Negotiation of Trunking: {negotiation}
+Access Mode VLAN: {access_vlan} (VLAN{access_vlan:04d})
+Trunking Native Mode VLAN: 1 (default)
+Administrative Native VLAN tagging: enabled
+Voice VLAN: none
+Operational private-vlan: none
+Trunking VLANs Enabled: {trunk_vlans}
+Pruning VLANs Enabled: 2-1001
+Capture Mode Disabled
+Capture VLANs Allowed: ALL
+Protected: false
+Appliance trust: none
+'''
+
+
+def int_to_ip(value):
+  return '{}.{}.{}.{}'.format((value >> 24) & 255, (value >> 16) & 255, (value >> 8) & 255, value & 255)
+
+
+def vlan_ids(count):
+  # 2から順に、予約済みを除いてcount個
+  results = []
+  vlan_id = 2
+  while len(results) < count and vlan_id <= 4094:
+    if vlan_id not in RESERVED_VLANS:
+      results.append(vlan_id)
+    vlan_id += 1
+  return results
+
+
+def interface_name(i, short=False):
+  member, port = divmod(i, PORTS_PER_MEMBER)
+  prefix = 'Gi' if short else 'GigabitEthernet'
+  return '{}{}/0/{}'.format(prefix, member + 1, port + 1)
+
+
+def svi_address(i):
+  # 172.16.0.0/12を/24ずつ使う
+  return int_to_ip((172 << 24) + (16 << 16) + (i << 8))
+
+
+def route_prefix(i):
+  # 10.0.0.0/8を/30ずつ使う
+  return int_to_ip((10 << 24) + i * 4)
+
+
+def acl_body(i):
+  return 'permit tcp {} 0.0.0.255 any eq {}'.format(int_to_ip((192 << 24) + (168 << 16) + ((i // 256) << 8)), 1024 + i % 256)
+
+
+class Generator(object):
+
+  def __init__(self, drift=0.1, seed=0, **scale):
+    self.scale = OrderedDict((k, scale.get(k, v)) for k, v in DEFAULTS.items())
+    self.drift = drift
+    self.rnd = random.Random(seed)
+
+    self.vlans = vlan_ids(self.scale['vlans'])
+    num_members = min(self.scale['port_channels'] * 2, self.scale['interfaces'])
+    self.port_channels = num_members // 2
+
+    # 物理インタフェース: 先頭からポートチャネルのメンバー、残りは偶数がaccess、奇数がtrunk
+    self.interfaces = []
+    for i in range(self.scale['interfaces']):
+      obj = {'name': interface_name(i), 'short': interface_name(i, short=True), 'description': 'port {}'.format(i + 1)}
+      if i < num_members:
+        obj['channel_group'] = i // 2 + 1
+      elif i % 2 == 0:
+        obj['mode'] = 'access'
+        obj['access_vlan'] = self.vlans[i % len(self.vlans)] if self.vlans else 1
+      else:
+        obj['mode'] = 'trunk'
+        obj['trunk_vlans'] = self.trunk_vlans(i)
+      self.interfaces.append(obj)
+
+    # HSRPはSVIに設定する
+    self.svis = []
+    for i, vlan_id in enumerate(self.vlans[:self.scale['hsrp_groups']]):
+      self.svis.append({'name': 'Vlan{}'.format(vlan_id), 'vlan_id': vlan_id, 'index': i})
+
+
+  def trunk_vlans(self, i):
+    if not self.vlans:
+      return '1'
+    start = i % len(self.vlans)
+    selected = self.vlans[start:start + 10]
+    return '{}-{}'.format(selected[0], selected[-1])
+
+
+  def drifted(self):
+    return self.rnd.random() < self.drift
+
+
+  #
+  # 既存の状態
+  #
+
+  def running_config(self):
+    lines = ['Building configuration...', '', 'Current configuration:', '!', 'hostname generated', '!']
+
+    for vlan_id in self.vlans:
+      lines.extend(['vlan {}'.format(vlan_id), ' name VLAN{:04d}'.format(vlan_id), '!'])
+
+    for group in range(1, self.port_channels + 1):
+      lines.extend(['interface Port-channel{}'.format(group), ' switchport mode trunk', '!'])
+
+    for obj in self.interfaces:
+      lines.append('interface {}'.format(obj['name']))
+      lines.append(' description {}'.format(obj['description']))
+      if obj.get('channel_group'):
+        lines.append(' channel-group {} mode active'.format(obj['channel_group']))
+      elif obj['mode'] == 'access':
+        lines.append(' switchport access vlan {}'.format(obj['access_vlan']))
+        lines.append(' switchport mode access')
+      else:
+        lines.append(' switchport trunk encapsulation dot1q')
+        lines.append(' switchport trunk allowed vlan {}'.format(obj['trunk_vlans']))
+        lines.append(' switchport mode trunk')
+      lines.append('!')
+
+    for svi in self.svis:
+      i = svi['index']
+      network = svi_address(i)
+      lines.extend([
+        'interface {}'.format(svi['name']),
+        ' ip address {} 255.255.255.0'.format(network[:-1] + '2'),
+        ' standby version 2',
+        ' standby {} ip {}'.format(i + 1, network[:-1] + '1'),
+        ' standby {} priority 110'.format(i + 1),
+        ' standby {} preempt'.format(i + 1),
+        '!'
+      ])
+
+    for i in range(self.scale['static_routes']):
+      lines.append('ip route {} 255.255.255.252 192.168.255.{}'.format(route_prefix(i), i % 254 + 1))
+    lines.append('!')
+
+    lines.append('ip access-list extended GENERATED')
+    for i in range(self.scale['acl_entries']):
+      lines.append(' {}'.format(acl_body(i)))
+    lines.extend(['!', 'end'])
+    return '\n'.join(lines) + '\n'
+
+
+  def show_vlan(self):
+    lines = [
+      'VLAN Name                             Status    Ports',
+      '---- -------------------------------- --------- -------------------------------',
+      '1    default                          active']
+    for vlan_id in self.vlans:
+      lines.append('{:<4} {:<32} active'.format(vlan_id, 'VLAN{:04d}'.format(vlan_id)))
+    for vlan_id, name in zip(RESERVED_VLANS, ('fddi-default', 'token-ring-default', 'fddinet-default', 'trnet-default')):
+      lines.append('{:<4} {:<32} act/unsup'.format(vlan_id, name))
+    return '\n'.join(lines) + '\n'
+
+
+  def show_interfaces_switchport(self):
+    sections = []
+    for obj in self.interfaces:
+      if obj.get('channel_group'):
+        mode, access_vlan, trunk_vlans = 'dynamic auto', 1, 'ALL'
+      elif obj['mode'] == 'access':
+        mode, access_vlan, trunk_vlans = 'static access', obj['access_vlan'], 'ALL'
+      else:
+        mode, access_vlan, trunk_vlans = 'trunk', 1, obj['trunk_vlans']
+      sections.append(SWITCHPORT.format(
+        name=obj['short'], mode=mode, negotiation='On', access_vlan=access_vlan, trunk_vlans=trunk_vlans))
+    return '\n'.join(sections)
+
+
+  def show_access_list(self):
+    # show access-lists GENERATED | include ^ +[1-9]
+    return '\n'.join('    {} {}'.format((i + 1) * 10, acl_body(i)) for i in range(self.scale['acl_entries'])) + '\n'
+
+
+  #
+  # 希望する状態、driftの割合だけ既存の状態と違う
+  #
+
+  def intent(self):
+    intent = OrderedDict()
+
+    vlans = []
+    for vlan_id in self.vlans:
+      name = 'VLAN{:04d}'.format(vlan_id)
+      vlans.append({'vlan_id': vlan_id, 'vlan_name': name.lower() if self.drifted() else name, 'state': 'present'})
+    intent['vlan'] = {'vlans': vlans}
+
+    interfaces = []
+    for obj in self.interfaces:
+      description = obj['description'] + (' changed' if self.drifted() else '')
+      interfaces.append({'name': obj['name'], 'description': description, 'state': 'present'})
+    intent['interface'] = {'interfaces': interfaces}
+
+    port_channels = []
+    for group in range(1, self.port_channels + 1):
+      members = [obj['name'] for obj in self.interfaces if obj.get('channel_group') == group]
+      port_channels.append({'group': group, 'mode': 'passive' if self.drifted() else 'active', 'members': members, 'state': 'present'})
+    intent['linkagg'] = {'port_channels': port_channels}
+
+    trunks = []
+    for obj in self.interfaces:
+      if obj.get('channel_group'):
+        continue
+      if obj['mode'] == 'access':
+        access_vlan = obj['access_vlan']
+        if self.drifted() and self.vlans:
+          access_vlan = self.vlans[(self.vlans.index(access_vlan) + 1) % len(self.vlans)]
+        trunks.append({'name': obj['name'], 'mode': 'access', 'access_vlan': access_vlan, 'state': 'present'})
+      else:
+        trunks.append({'name': obj['name'], 'mode': 'trunk', 'trunk_vlans': obj['trunk_vlans'], 'state': 'present'})
+    intent['interface_trunk'] = {'interfaces': trunks}
+
+    addresses = []
+    hsrp = []
+    for svi in self.svis:
+      i = svi['index']
+      network = svi_address(i)
+      host = '3' if self.drifted() else '2'
+      addresses.append({'name': svi['name'], 'ipv4': '{}/24'.format(network[:-1] + host), 'state': 'present'})
+      hsrp.append({
+        'name': svi['name'],
+        'group': str(i + 1),
+        'version': '2',
+        'vip': network[:-1] + '1',
+        'priority': '120' if self.drifted() else '110',
+        'preempt': 'enabled',
+        'state': 'present'})
+    intent['interface_address'] = {'interfaces': addresses}
+    intent['hsrp'] = {'interfaces': hsrp}
+
+    routes = []
+    for i in range(self.scale['static_routes']):
+      nh = i % 254 + 1
+      if self.drifted():
+        nh = nh % 254 + 1
+      routes.append({'prefix': route_prefix(i), 'netmask': '255.255.255.252', 'nh_addr': '192.168.255.{}'.format(nh), 'state': 'present'})
+    intent['static_route'] = {'static_routes': routes}
+
+    # 隣どうしを入れ替えたり、新しいエントリを挟んだりする
+    acl_cli = [acl_body(i) for i in range(self.scale['acl_entries'])]
+    for i in range(0, len(acl_cli) - 1, 2):
+      if self.drifted():
+        acl_cli[i], acl_cli[i + 1] = acl_cli[i + 1], acl_cli[i]
+    for i in range(len(acl_cli) - 1, 0, -1):
+      if self.drifted():
+        acl_cli.insert(i, 'deny udp any any eq {}'.format(10000 + i))
+    intent['ip_acl'] = {'parents': 'ip access-list extended GENERATED', 'acl_cli': acl_cli}
+
+    return intent
+
+
+  def generate(self):
+    return OrderedDict([
+      ('running_config', self.running_config()),
+      ('show_vlan', self.show_vlan()),
+      ('show_interfaces_switchport', self.show_interfaces_switchport()),
+      ('show_access_list', self.show_access_list()),
+      ('intent', self.intent())
+    ])
+
+
+def add_scale_arguments(parser):
+  parser.add_argument('-s', '--scale', type=float, default=1.0, help='multiply every size by this factor')
+  for key, value in DEFAULTS.items():
+    parser.add_argument('--' + key.replace('_', '-'), dest=key, type=int, default=value, help='default {}'.format(value))
+  parser.add_argument('--drift', type=float, default=0.1, help='ratio of intent items that differ from the config')
+  parser.add_argument('--seed', type=int, default=0, help='random seed of the drift')
+
+
+def generator_from_args(args):
+  scale = dict((key, int(getattr(args, key) * args.scale)) for key in DEFAULTS)
+  return Generator(drift=args.drift, seed=args.seed, **scale)
+
+
+def main():
+  parser = argparse.ArgumentParser(description='generate running-config, show outputs and intent at scale')
+  parser.add_argument('-o', '--output', default='generated', help='output directory')
+  add_scale_arguments(parser)
+  args = parser.parse_args()
+
+  data = generator_from_args(args).generate()
+
+  if not os.path.isdir(args.output):
+    os.makedirs(args.output)
+
+  for key, value in data.items():
+    if key == 'intent':
+      # jsonはyamlとしても読めるので、include_varsやvars_filesにそのまま渡せる
+      path = os.path.join(args.output, 'intent.json')
+      with open(path, 'w') as f:
+        json.dump({'intent': value}, f)
+    else:
+      path = os.path.join(args.output, key + '.txt')
+      with open(path, 'w') as f:
+        f.write(value)
+    print('{:<48} {:>12} bytes'.format(path, os.path.getsize(path)))
+
+
+if __name__ == '__main__':
+  main()
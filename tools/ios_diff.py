@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=missing-docstring
+
+"""offline diff of saved configs against intent, without ansible-playbook
+
+read a directory that has a sub directory per host,
+
+  <input>/<host>/running_config.txt
+  <input>/<host>/show_vlan.txt                   (optional)
+  <input>/<host>/show_interfaces_switchport.txt  (optional)
+  <input>/<host>/show_access_list.txt            (optional)
+  <input>/<host>/intent.yml                      (intent.yaml or intent.json)
+
+run the ios_intent action plugin of each host in a pool of processes,
+and write the commands to <output>/<host>.txt.
+
+each host is processed by diff_host() of the ios_fleet_diff action plugin,
+the files are read in the worker process.
+
+the file names are the same as those written by tools.generate_config.
+
+usage: python -m tools.ios_diff input_dir [-o output_dir] [-w workers] [--hosts h1,h2] [--profile]
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import time
+
+import yaml
+
+from tools import collection_path
+collection_path.setup()
+
+# pylint: disable=wrong-import-position
+from ansible_collections.iida.local.plugins.action.ios_fleet_diff import diff_host
+
+# ホストのディレクトリにある、ios_intentの引数になるファイル
+SHOW_FILES = ['running_config', 'show_vlan', 'show_interfaces_switchport']
+
+INTENT_FILES = ['intent.yml', 'intent.yaml', 'intent.json']
+
+
+def read_text(path):
+  with io.open(path, 'r', encoding='utf-8') as f:
+    return f.read()
+
+
+def find_hosts(input_dir):
+  # running_config.txtがあるディレクトリをホストとみなす
+  hosts = []
+  for name in sorted(os.listdir(input_dir)):
+    path = os.path.join(input_dir, name)
+    if os.path.isfile(os.path.join(path, 'running_config.txt')):
+      hosts.append((name, path))
+  return hosts
+
+
+def load_intent(host_dir):
+  for name in INTENT_FILES:
+    path = os.path.join(host_dir, name)
+    if not os.path.isfile(path):
+      continue
+    # jsonはyamlとしても読める
+    data = yaml.safe_load(read_text(path)) or {}
+    # include_varsに渡すファイルと同じく、intentキーの下にあってもよい
+    if isinstance(data, dict) and isinstance(data.get('intent'), dict):
+      return data['intent']
+    return data
+  raise ValueError('intent file not found, one of {}'.format(', '.join(INTENT_FILES)))
+
+
+def make_args(host_dir):
+  # ファイルはパスのまま渡し、ワーカーでios_fleet_diffのload_paths()に読み込ませる
+  args = {'intent': load_intent(host_dir)}
+  for key in SHOW_FILES:
+    path = os.path.join(host_dir, key + '.txt')
+    if os.path.isfile(path):
+      args[key + '_path'] = path
+
+  # show access-listsの出力はip_acl固有の引数なので、intentの側に入れる
+  path = os.path.join(host_dir, 'show_access_list.txt')
+  ip_acl = args['intent'].get('ip_acl')
+  if ip_acl and os.path.isfile(path):
+    for params in (ip_acl if isinstance(ip_acl, list) else [ip_acl]):
+      if isinstance(params, dict) and 'show_access_list' not in params and 'show_access_list_path' not in params:
+        params['show_access_list_path'] = path
+
+  return args
+
+
+def to_summary(host, result):
+  # ios_fleet_diffの装置ごとの結果を、表示とsummary.jsonの形にする
+  summary = {'host': host, 'commands': result.get('num_commands', 0), 'failed': bool(result.get('failed'))}
+  if result.get('failed'):
+    summary['msg'] = result.get('msg')
+  for key in ('timings', 'resources'):
+    if key in result:
+      summary[key] = result[key]
+  summary['elapsed'] = result.get('elapsed', 0)
+  return summary
+
+
+def main():
+  parser = argparse.ArgumentParser(description='diff saved configs against intent offline, in a pool of processes')
+  parser.add_argument('input', help='directory that has a sub directory per host')
+  parser.add_argument('-o', '--output', default='commands', help='directory to write <host>.txt')
+  parser.add_argument('-w', '--workers', type=int, default=0, help='number of processes, default number of cores')
+  parser.add_argument('--hosts', default='', help='comma separated hosts to run, default all')
+  parser.add_argument('--profile', action='store_true', help='write timings of each resource to summary.json')
+  args = parser.parse_args()
+
+  hosts = find_hosts(args.input)
+  if args.hosts:
+    names = [name for name in args.hosts.split(',') if name]
+    hosts = [(host, path) for host, path in hosts if host in names]
+  if not hosts:
+    raise SystemExit('no host directory with running_config.txt in {}'.format(args.input))
+
+  if not os.path.isdir(args.output):
+    os.makedirs(args.output)
+
+  # 大きなコンフィグから先に始めて、最後に一台だけ残るのを避ける
+  hosts.sort(key=lambda item: os.path.getsize(os.path.join(item[1], 'running_config.txt')), reverse=True)
+  options = {'output_dir': args.output, 'profile': args.profile}
+
+  start = time.time()
+  summaries = []
+  jobs = []
+  for host, path in hosts:
+    try:
+      jobs.append((host, make_args(path), options))
+    except Exception as e:  # pylint: disable=broad-except
+      summaries.append({'host': host, 'commands': 0, 'failed': True, 'msg': '{}: {}'.format(type(e).__name__, e), 'elapsed': 0})
+
+  for summary in summaries:
+    print('{:<32} {:>6}'.format(summary['host'], 'failed'))
+    print('  {}'.format(summary['msg']))
+
+  workers = min(args.workers or multiprocessing.cpu_count(), len(jobs)) or 1
+
+  pool = multiprocessing.Pool(processes=workers)
+  try:
+    for host, result in pool.imap_unordered(diff_host, jobs):
+      summary = to_summary(host, result)
+      summaries.append(summary)
+      status = 'failed' if summary['failed'] else 'ok'
+      print('{:<32} {:>6} {:>8} commands {:>10.1f} ms'.format(summary['host'], status, summary['commands'], summary['elapsed'] * 1000))
+      if summary['failed']:
+        print('  {}'.format(summary['msg']))
+  finally:
+    pool.close()
+    pool.join()
+  elapsed = time.time() - start
+
+  failed = [s['host'] for s in summaries if s['failed']]
+  print('')
+  print('{} hosts, {} failed, {} workers, {:.1f} s'.format(len(summaries), len(failed), workers, elapsed))
+
+  summaries.sort(key=lambda s: s['host'])
+  with open(os.path.join(args.output, 'summary.json'), 'w') as f:
+    json.dump({'elapsed': elapsed, 'workers': workers, 'hosts': summaries}, f, indent=2)
+
+  if failed:
+    raise SystemExit(1)
+
+
+if __name__ == '__main__':
+  main()